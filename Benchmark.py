@@ -0,0 +1,190 @@
+###################################################################
+# 
+# Some benchmarks for the btc package
+#
+# 
+# MIT license
+#
+# Copyright (c) 2018 christianb93
+# Permission is hereby granted, free of charge, to 
+# any person obtaining a copy of this software and 
+# associated documentation files (the "Software"), 
+# to deal in the Software without restriction, 
+# including without limitation the rights to use, 
+# copy, modify, merge, publish, distribute, 
+# sublicense, and/or sell copies of the Software, 
+# and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice 
+# shall be included in all copies or substantial 
+# portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY 
+# OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT 
+# LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. 
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS 
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, 
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, 
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE 
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+import argparse
+import random
+import time
+import tracemalloc
+
+import ecdsa
+
+import btc.txn
+import btc.block
+import btc.secp256k1
+
+
+#
+# A transaction with three P2PKH inputs and two outputs
+# (txid ed70b8c66a4b064cfe992a097b3406fa81ff09641fe55a709e4266167ef47891)
+#
+RAW_TXN = "0200000003620f7bc1087b0111f76978ef747001e3ae0a12f254cbfb858f028f891c40e5f6010000006a47304402207f5dfc2f7f7329b7cc731df605c83aa6f48ec2218495324bb4ab43376f313b840220020c769655e4bfcc54e55104f6adc723867d9d819266d27e755e098f646f689d0121038c2d1cbe4d731c69e67d16c52682e01cb70b046ead63e90bf793f52f541dafbdfefffffff15fe7d9e0815853738ce47deadee69339e027a1dfcfb6fa887cce3a72626e7b010000006a47304402203202e6c640c063989623fc782ac1c9dc3c6fcaed996d852ec876749ba63db63b02207ef86e262ad4b4bc9cebfadb609f52c35b0105e15d58a5ecbecc5e536d3a8cd8012103dc526ca188418ab128d998bf80942d66f1b3be585d0c89bd61c533bddbdaa729feffffff84e6431db86833897bab333d844486c183dd01e69862edea442e480c2d8cb549010000006a47304402200320bc83f35ceab4a7ef0f8181eedb5f54e3f617626826cc49c8c86efc9be0b302203705889d6aed50f716b81b0f3f5769d72d1b8a6b59d1b0b73bcf94245c283b8001210263591c21ce8ee0d96a617108d7c278e2e715ac6d8afd3fcd158bee472c590068feffffff02ca780a00000000001976a914811fb695e46e2386501bcd70e5c869fe6c0bb33988ac10f59600000000001976a9140f2408a811f6d24ab1833924d98d884c44ecee8888ac6fce0700"
+
+RAW_HEADER = "00000020df9e03f6f3b6089704150a0627841c9fb86adbf265fc8f31c95bb6b99e4a604c187d9b8d7dad469812834e9f4f72af649656b4179880d0102499118c7fd488d9bc69b65affff7f2003000000"
+
+
+#
+# Determine the average number of bytes allocated per
+# object when we create n objects with the function
+# create and keep them in memory
+#
+def measure(create, n):
+    tracemalloc.start()
+    objects = [create() for _ in range(n)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / n
+
+
+#
+# A single input and output taken from the transaction
+#
+RAW_TXIN = RAW_TXN[10:10 + 2*148]
+RAW_TXOUT = RAW_TXN[10 + 3*2*148 + 2:10 + 3*2*148 + 2 + 2*34]
+
+def createTxin():
+    _txin = btc.txn.txin()
+    _txin.deserialize(bytes.fromhex(RAW_TXIN))
+    return _txin
+
+def createTxout():
+    _txout = btc.txn.txout()
+    _txout.deserialize(bytes.fromhex(RAW_TXOUT))
+    return _txout
+
+def createTxn():
+    tx = btc.txn.txn()
+    tx.deserialize(bytes.fromhex(RAW_TXN))
+    return tx
+
+def createBlockHeader():
+    header = btc.block.blockHeader()
+    header.deserialize(bytes.fromhex(RAW_HEADER))
+    return header
+
+
+#
+# Memory footprint of the objects that make up a 
+# transaction or a block
+#
+def memory(n):
+    print("Bytes per object, averaged over", n, "objects")
+    print("txin (P2PKH):              ", round(measure(createTxin, n)))
+    print("txout (P2PKH):             ", round(measure(createTxout, n)))
+    print("txn (3 inputs, 2 outputs): ", round(measure(createTxn, n)), "(", len(RAW_TXN) // 2, "bytes serialized)")
+    print("blockHeader:               ", round(measure(createBlockHeader, n)))
+
+
+#
+# Determine the average time in microseconds for calling
+# f once for each of the given arguments
+#
+def timeit(f, args):
+    start = time.perf_counter()
+    for arg in args:
+        f(*arg)
+    return 1000000*(time.perf_counter() - start) / len(args)
+
+
+#
+# Elliptic curve operations, using the ecdsa package and btc.secp256k1
+#
+def ec(n):
+    start = time.perf_counter()
+    btc.secp256k1.getFixedBaseTable()
+    build = 1000*(time.perf_counter() - start)
+    G = ecdsa.curves.SECP256k1.generator
+    N = btc.secp256k1.N
+    rng = random.Random(1)
+    secrets = [rng.randrange(1, N) for _ in range(n)]
+    hashes = [rng.randrange(1, N) for _ in range(n)]
+    pubKeys = [btc.secp256k1.multiply(secret) for secret in secrets]
+    signatures = [btc.secp256k1.sign(hashes[i], secrets[i], rng.randrange(1, N)) for i in range(n)]
+    ecdsaPubKeys = [ecdsa.ecdsa.Public_key(G, ecdsa.ellipticcurve.Point(G.curve(), Q[0], Q[1])) for Q in pubKeys]
+    ecdsaSignatures = [ecdsa.ecdsa.Signature(r, s) for r, s in signatures]
+    print("Microseconds per operation, averaged over", n, "operations")
+    print("                        ecdsa    no GLV       GLV")
+    a = timeit(lambda k: G * k, [(k,) for k in secrets])
+    b = timeit(lambda k: btc.secp256k1.multiply(k, glv = False, fixedBase = False), [(k,) for k in secrets])
+    c = timeit(lambda k: btc.secp256k1.multiply(k, fixedBase = False), [(k,) for k in secrets])
+    print("k*G                 %9.1f %9.1f %9.1f" % (a, b, c))
+    a = timeit(lambda k, Q: Q.point * k, list(zip(secrets, ecdsaPubKeys)))
+    b = timeit(lambda k, Q: btc.secp256k1.multiply(k, Q, glv = False), list(zip(secrets, pubKeys)))
+    c = timeit(btc.secp256k1.multiply, list(zip(secrets, pubKeys)))
+    print("k*Q                 %9.1f %9.1f %9.1f" % (a, b, c))
+    a = timeit(lambda Q, h, sig: Q.verifies(h, sig), list(zip(ecdsaPubKeys, hashes, ecdsaSignatures)))
+    b = timeit(lambda Q, h, sig: btc.secp256k1.verify(h, sig[0], sig[1], Q, glv = False), list(zip(pubKeys, hashes, signatures)))
+    c = timeit(lambda Q, h, sig: btc.secp256k1.verify(h, sig[0], sig[1], Q), list(zip(pubKeys, hashes, signatures)))
+    print("verify              %9.1f %9.1f %9.1f" % (a, b, c))
+    a = timeit(btc.secp256k1.multiply, [(k,) for k in secrets])
+    print("k*G with fixed-base table: %.1f (building the table took %.0f ms)" % (a, build))
+    ecdsaPrivateKeys = [ecdsa.ecdsa.Private_key(Q, secret) for Q, secret in zip(ecdsaPubKeys, secrets)]
+    nonces = [rng.randrange(1, N) for _ in range(n)]
+    a = timeit(lambda key, h, k: key.sign(h, k), list(zip(ecdsaPrivateKeys, hashes, nonces)))
+    b = timeit(btc.secp256k1.sign, list(zip(hashes, secrets, nonces)))
+    print("sign: ecdsa %.1f, btc.secp256k1 with fixed-base table %.1f" % (a, b))
+    a = timeit(btc.secp256k1.batchMultiply, [(secrets,)]) / n
+    print("k*G in batches of %d:      %.1f" % (n, a))
+    a = timeit(btc.secp256k1.batchVerify, [(list(zip(hashes, [sig[0] for sig in signatures], 
+                                                      [sig[1] for sig in signatures], pubKeys)),)]) / n
+    print("verify in batches of %d:   %.1f" % (n, a))
+
+
+#
+# Parse arguments
+#        
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--benchmark",
+                    default="memory",
+                    choices=["memory", "ec"],
+                    help="Benchmark to run")
+    parser.add_argument("--n",
+                    default=10000,
+                    type=int,
+                    help="Number of iterations or objects")
+    args=parser.parse_args()
+    return args
+
+
+#######################################################################
+# 
+# Main
+#
+#######################################################################
+
+args = get_args()
+if args.benchmark == "memory":
+    memory(args.n)
+elif args.benchmark == "ec":
+    ec(args.n)
@@ -35,10 +35,9 @@
 
 import binascii
 import btc.utils
+import btc.secp256k1
 import hashlib
 
-import ecdsa
-
 def hash256(s):
     return hashlib.sha256(hashlib.sha256(s).digest()).digest()
 
@@ -85,13 +84,10 @@ print("Secret:          ", d)
 # Determine the public key from the 
 # secret d
 # 
-curve = ecdsa.curves.SECP256k1
-Q = d * curve.generator
+x, y = btc.secp256k1.multiply(d)
 #
 # and assemble the compressed representation
 #
-x = Q.x()
-y = Q.y()
 pubKey = x.to_bytes(length=32, byteorder="big")
 pubKey = binascii.hexlify(pubKey).decode('ascii')
 if 1 == (y % 2):
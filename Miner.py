@@ -53,7 +53,7 @@ def buildBlock(address):
     # First we get a block template from the local
     # bitcoind
     #
-    template =  btc.utils.rpcCall(method="getblocktemplate")
+    template =  btc.utils.rpcCall(method="getblocktemplate", params=[{"rules": ["segwit"]}])
     bits = int(template['bits'], 16)
     #
     # Next we build a list of the transactions
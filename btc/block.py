@@ -32,15 +32,25 @@
 ####################################################
 
 from . import serialize
-from . import script
 from . import utils
 from . import txn
-import binascii
 
 #
-# A bitcoin block header
+# Make sure that a hash in a block header has exactly 32 bytes, 
+# as struct would silently pad or truncate it
+#
+def checkHash(h, name):
+    if (h == None) or (len(h) != 32):
+        raise ValueError("Invalid %s - need 32 bytes" % name)
+    return h
+
+#
+# A bitcoin block header. The two hashes are stored as raw
+# bytes in the order in which they are serialized
 #
 class blockHeader:
+
+    __slots__ = ("version", "prevBlockIdBytes", "merkleRootBytes", "creationTime", "bits", "nonce")
     
     def __init__(self, version = 0x20000000, prevBlockId = None, merkleRoot = None, creationTime = 0, bits = 0, nonce=0):
         self.version = version
@@ -49,6 +59,37 @@ class blockHeader:
         self.creationTime = creationTime
         self.bits = bits
         self.nonce = nonce
+
+    #
+    # The hash of the previous block and the Merkle root
+    # as hex strings in big endian, converted from and
+    # to the raw bytes
+    #
+    @property
+    def prevBlockId(self):
+        if self.prevBlockIdBytes == None:
+            return None
+        return self.prevBlockIdBytes[::-1].hex()
+
+    @prevBlockId.setter
+    def prevBlockId(self, prevBlockId):
+        if prevBlockId == None:
+            self.prevBlockIdBytes = None
+        else:
+            self.prevBlockIdBytes = bytes.fromhex(prevBlockId)[::-1]
+
+    @property
+    def merkleRoot(self):
+        if self.merkleRootBytes == None:
+            return None
+        return self.merkleRootBytes[::-1].hex()
+
+    @merkleRoot.setter
+    def merkleRoot(self, merkleRoot):
+        if merkleRoot == None:
+            self.merkleRootBytes = None
+        else:
+            self.merkleRootBytes = bytes.fromhex(merkleRoot)[::-1]
         
     #
     # Get the version as integer
@@ -114,46 +155,72 @@ class blockHeader:
     # see primitives/block.h
     #
     def deserialize(self,raw):
-        self.version, raw = serialize.deserializeUint32(raw)
+        reader = serialize.getReader(raw)
         #
-        # We use our deserialization method, so we obtain a 
-        # representation of the previous block ID as a 
-        # big endian number
+        # The header has a fixed layout, so we decode it
+        # in one step
         #
-        self.prevBlockId, raw = serialize.deserializeString(raw, 32)
-        self.merkleRoot, raw = serialize.deserializeString(raw, 32)
-        self.creationTime, raw = serialize.deserializeUint32(raw)
-        self.bits, raw = serialize.deserializeUint32(raw)
-        self.nonce, raw = serialize.deserializeUint32(raw)
-        return raw
+        (self.version, 
+         self.prevBlockIdBytes, 
+         self.merkleRootBytes, 
+         self.creationTime, 
+         self.bits, 
+         self.nonce) = reader.readStruct(serialize.BLOCKHEADER)
+        return serialize.getRemainder(raw, reader)
         
         
     #
-    # Serialize a block header
+    # Create a block header by reading 80 bytes from
+    # a binary file-like object
+    #
+    @classmethod
+    def fromStream(cls, f):
+        header = cls()
+        header.deserialize(serialize.StreamReader(f))
+        return header
+        
+    #
+    # Serialize a block header into a serialize.ByteWriter
+    #
+    def serializeInto(self, writer):
+        writer.writeStruct(serialize.BLOCKHEADER, 
+                           self.version,
+                           checkHash(self.prevBlockIdBytes, "previous block ID"),
+                           checkHash(self.merkleRootBytes, "merkle root"),
+                           self.creationTime,
+                           self.bits,
+                           self.nonce)
+
+    #
+    # Serialize a block header and return bytes
+    #
+    def serializeBytes(self):
+        return serialize.BLOCKHEADER.pack(self.version,
+                                          checkHash(self.prevBlockIdBytes, "previous block ID"),
+                                          checkHash(self.merkleRootBytes, "merkle root"),
+                                          self.creationTime,
+                                          self.bits,
+                                          self.nonce)
+
+    #
+    # Serialize a block header and return a hex string
     #
     def serialize(self):
-        s = serialize.serializeUint32(self.version)
-        s += serialize.serializeString(self.prevBlockId, 32)
-        s += serialize.serializeString(self.merkleRoot, 32)
-        s += serialize.serializeUint32(self.creationTime)
-        s += serialize.serializeUint32(self.bits)
-        s += serialize.serializeUint32(self.nonce)
-        return s
+        return self.serializeBytes().hex()
         
     #
     # Derive the block hash
     #
     def getBlockHash(self, byteorder="big"):
-        h = utils.hash256(bytes.fromhex(self.serialize()))
-        s = binascii.hexlify(h).decode('ascii')
+        h = utils.hash256(self.serializeBytes())
         #
         # Reverse bytewise if big endian encoding
         # is requested
         # 
         if byteorder == "big":
-            return serialize.serializeString(s, 32)
+            return serialize.reverseBytes(h).hex()
         elif byteorder == "little":
-            return s
+            return h.hex()
         else:
             raise ValueError("Invalid byte order")
 
@@ -163,6 +230,8 @@ class blockHeader:
 # A block is a block header along with the underlying transactions
 #
 class block:
+
+    __slots__ = ("blockHeader", "tx")
         
     def __init__(self,blockHeader = None):
         self.blockHeader = blockHeader
@@ -176,19 +245,23 @@ class block:
         return self.tx
         
     #
-    # Deserialize a block 
+    # Deserialize a block. The input can be a hex string
+    # or a serialize.ByteReader. All transactions are read
+    # from the same reader, so the raw data is not copied
+    # once per transaction
     #    
     def deserialize(self, raw):
+        reader = serialize.getReader(raw)
         #
         # First do the block header
         # 
         self.blockHeader = blockHeader()
-        raw = self.blockHeader.deserialize(raw)
+        self.blockHeader.deserialize(reader)
         #
         # the next field is the number of 
         # transactions in the block - at least one
         #
-        noTx, raw = serialize.deserializeVarInt(raw)
+        noTx = reader.readVarInt()
         if noTx < 1:
             raise ValueError("Block needs to have at least one transaction")
         self.tx = []
@@ -197,29 +270,76 @@ class block:
         #
         for i in range(noTx):
             _tx = txn.txn()
-            raw = _tx.deserialize(raw)
+            _tx.deserialize(reader)
             self.tx.append(_tx)
+        return serialize.getRemainder(raw, reader)
+            
+    
+    #
+    # Create a block by reading it from a binary file-like 
+    # object, without ever holding the entire raw block
+    # in memory
+    #
+    @classmethod
+    def fromStream(cls, f):
+        _block = cls()
+        _block.deserialize(serialize.StreamReader(f))
+        return _block
             
     
     #
-    # Serialize a block 
+    # Serialize a block into a serialize.ByteWriter. All
+    # transactions are written into the same buffer
     #    
-    def serialize(self):
+    def serializeInto(self, writer):
         #
         # First do the block header
         # 
-        s = self.blockHeader.serialize()
+        self.blockHeader.serializeInto(writer)
         #
         # the next field is the number of 
         # transactions in the block - at least one
         #
-        s += serialize.serializeVarInt(len(self.tx))
+        writer.writeVarInt(len(self.tx))
         #
         # Serialize the individual transactions
         #
         for _tx in self.tx:
-            s += _tx.serialize()
-        return s    
+            _tx.serializeInto(writer)
+
+    #
+    # Serialize a block and return bytes
+    #
+    def serializeBytes(self):
+        writer = serialize.ByteWriter()
+        self.serializeInto(writer)
+        return writer.getBytes()
+
+    #
+    # Serialize a block and return a hex string
+    #
+    def serialize(self):
+        return self.serializeBytes().hex()
+        
+    #
+    # Get the size of the serialized block in bytes
+    #
+    def getSize(self):
+        size = 80 + serialize.varIntSize(len(self.tx))
+        for _tx in self.tx:
+            size += _tx.getSize()
+        return size
+
+    #
+    # Get the weight of the block (BIP141). Header and
+    # transaction count count four times, as they are
+    # part of the serialization without witnesses
+    #
+    def getWeight(self):
+        weight = 4*(80 + serialize.varIntSize(len(self.tx)))
+        for _tx in self.tx:
+            weight += _tx.getWeight()
+        return weight
         
     #
     # Calculate the Merkle root and updated
@@ -227,11 +347,11 @@ class block:
     #
     def updateMerkleRoot(self):
         #
-        # This will return the Merkle root as little
-        # endian so we need to convert it
+        # The header stores the Merkle root as raw hash, i.e.
+        # in little endian, so no conversion is needed
         #
-        merkleRoot = utils.blockMerkleRoot(self)
-        self.blockHeader.merkleRoot = serialize.serializeString(merkleRoot, 32)
+        leaves = [tx.getTxnIdBytes() for tx in self.tx]
+        self.blockHeader.merkleRootBytes = utils.merkleRootBytes(leaves)
         
     
     #
@@ -0,0 +1,908 @@
+####################################################
+# 
+# A script interpreter
+#
+# MIT license
+#
+# Copyright (c) 2018 christianb93
+# Permission is hereby granted, free of charge, to 
+# any person obtaining a copy of this software and 
+# associated documentation files (the "Software"), 
+# to deal in the Software without restriction, 
+# including without limitation the rights to use, 
+# copy, modify, merge, publish, distribute, 
+# sublicense, and/or sell copies of the Software, 
+# and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice 
+# shall be included in all copies or substantial 
+# portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY 
+# OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT 
+# LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. 
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS 
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, 
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, 
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE 
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+####################################################
+
+from . import script
+from . import utils
+
+import hashlib
+
+
+#
+# This module executes scripts on a stack machine, following
+# interpreter.cpp in the reference implementation. A script is 
+# processed as raw bytes, with the program counter being an 
+# index into the bytes. For every opcode, the table HANDLERS 
+# contains the function that executes it, so that we do not
+# need a long chain of if statements. 
+#
+# We assume that all soft forks up to segregated witness are 
+# active (P2SH, strict DER signatures, OP_CHECKLOCKTIMEVERIFY, 
+# OP_CHECKSEQUENCEVERIFY, NULLDUMMY, P2WPKH and P2WSH). The 
+# following is not supported:
+# - taproot (BIP341 / BIP342). As for a node that does not know 
+#   taproot, witness programs with a version other than 0 are
+#   accepted without any check, as required by BIP141
+# - policy rules (standardness) are not checked
+#
+
+
+OP_0 = 0x00
+OP_PUSHDATA1 = 0x4c
+OP_PUSHDATA2 = 0x4d
+OP_PUSHDATA4 = 0x4e
+OP_1NEGATE = 0x4f
+OP_1 = 0x51
+OP_16 = 0x60
+OP_NOP = 0x61
+OP_IF = 0x63
+OP_NOTIF = 0x64
+OP_VERIF = 0x65
+OP_VERNOTIF = 0x66
+OP_ELSE = 0x67
+OP_ENDIF = 0x68
+OP_VERIFY = 0x69
+OP_RETURN = 0x6a
+OP_TOALTSTACK = 0x6b
+OP_FROMALTSTACK = 0x6c
+OP_2DROP = 0x6d
+OP_2DUP = 0x6e
+OP_3DUP = 0x6f
+OP_2OVER = 0x70
+OP_2ROT = 0x71
+OP_2SWAP = 0x72
+OP_IFDUP = 0x73
+OP_DEPTH = 0x74
+OP_DROP = 0x75
+OP_DUP = 0x76
+OP_NIP = 0x77
+OP_OVER = 0x78
+OP_PICK = 0x79
+OP_ROLL = 0x7a
+OP_ROT = 0x7b
+OP_SWAP = 0x7c
+OP_TUCK = 0x7d
+OP_CAT = 0x7e
+OP_SUBSTR = 0x7f
+OP_LEFT = 0x80
+OP_RIGHT = 0x81
+OP_SIZE = 0x82
+OP_INVERT = 0x83
+OP_AND = 0x84
+OP_OR = 0x85
+OP_XOR = 0x86
+OP_EQUAL = 0x87
+OP_EQUALVERIFY = 0x88
+OP_1ADD = 0x8b
+OP_1SUB = 0x8c
+OP_2MUL = 0x8d
+OP_2DIV = 0x8e
+OP_NEGATE = 0x8f
+OP_ABS = 0x90
+OP_NOT = 0x91
+OP_0NOTEQUAL = 0x92
+OP_ADD = 0x93
+OP_SUB = 0x94
+OP_MUL = 0x95
+OP_DIV = 0x96
+OP_MOD = 0x97
+OP_LSHIFT = 0x98
+OP_RSHIFT = 0x99
+OP_BOOLAND = 0x9a
+OP_BOOLOR = 0x9b
+OP_NUMEQUAL = 0x9c
+OP_NUMEQUALVERIFY = 0x9d
+OP_NUMNOTEQUAL = 0x9e
+OP_LESSTHAN = 0x9f
+OP_GREATERTHAN = 0xa0
+OP_LESSTHANOREQUAL = 0xa1
+OP_GREATERTHANOREQUAL = 0xa2
+OP_MIN = 0xa3
+OP_MAX = 0xa4
+OP_WITHIN = 0xa5
+OP_RIPEMD160 = 0xa6
+OP_SHA1 = 0xa7
+OP_SHA256 = 0xa8
+OP_HASH160 = 0xa9
+OP_HASH256 = 0xaa
+OP_CODESEPARATOR = 0xab
+OP_CHECKSIG = 0xac
+OP_CHECKSIGVERIFY = 0xad
+OP_CHECKMULTISIG = 0xae
+OP_CHECKMULTISIGVERIFY = 0xaf
+OP_NOP1 = 0xb0
+OP_CHECKLOCKTIMEVERIFY = 0xb1
+OP_CHECKSEQUENCEVERIFY = 0xb2
+OP_NOP10 = 0xb9
+
+#
+# Opcodes that make a script fail even if they are not executed
+#
+DISABLED_OPCODES = frozenset([OP_CAT, OP_SUBSTR, OP_LEFT, OP_RIGHT, OP_INVERT, OP_AND, 
+                              OP_OR, OP_XOR, OP_2MUL, OP_2DIV, OP_MUL, OP_DIV, OP_MOD, 
+                              OP_LSHIFT, OP_RSHIFT])
+
+#
+# Limits, see script.h
+#
+MAX_SCRIPT_SIZE = 10000
+MAX_ELEMENT_SIZE = 520
+MAX_OPS = 201
+MAX_STACK_SIZE = 1000
+MAX_PUBKEYS = 20
+
+#
+# Lock times below this value are block heights, above
+# this value they are timestamps
+#
+LOCKTIME_THRESHOLD = 500000000
+
+#
+# The bits of a sequence number used by relative lock 
+# times (BIP68)
+#
+SEQUENCE_LOCKTIME_DISABLE_FLAG = 1 << 31
+SEQUENCE_LOCKTIME_TYPE_FLAG = 1 << 22
+SEQUENCE_LOCKTIME_MASK = 0x0000ffff
+SEQUENCE_FINAL = 0xffffffff
+
+#
+# The signature hash used by OP_CHECKSIG depends on 
+# whether the script comes from a witness or not
+#
+SIGVERSION_BASE = 0
+SIGVERSION_WITNESS_V0 = 1
+
+
+#
+# Numbers on the stack are encoded in little endian, with the 
+# most significant bit of the last byte being the sign. The 
+# number zero is the empty byte sequence
+#
+def decodeNumber(b, maxSize = 4):
+    if len(b) > maxSize:
+        raise ValueError("Number too long")
+    if len(b) == 0:
+        return 0
+    n = int.from_bytes(b, "little")
+    if b[-1] & 0x80:
+        return -(n & ~(0x80 << (8*(len(b) - 1))))
+    return n
+
+
+def encodeNumber(n):
+    if n == 0:
+        return b''
+    negative = n < 0
+    n = abs(n)
+    result = bytearray()
+    while n:
+        result.append(n & 0xff)
+        n >>= 8
+    if result[-1] & 0x80:
+        result.append(0x80 if negative else 0x00)
+    elif negative:
+        result[-1] |= 0x80
+    return bytes(result)
+
+
+#
+# A stack element is false if all bytes are zero, except that
+# the last byte can be 0x80 (negative zero)
+#
+def castToBool(b):
+    if len(b) == 0:
+        return False
+    if any(b[:-1]):
+        return True
+    return (b[-1] & 0x7f) != 0
+
+
+#
+# Read the operation at position pc of a script. Returns the 
+# opcode, the data for a push operation (None for all other 
+# operations) and the position of the next operation
+#
+def readOp(code, pc):
+    opcode = code[pc]
+    pc += 1
+    if opcode > OP_PUSHDATA4:
+        return opcode, None, pc
+    if opcode < OP_PUSHDATA1:
+        size = opcode
+    else:
+        width = 1 << (opcode - OP_PUSHDATA1)
+        if pc + width > len(code):
+            raise ValueError("Truncated push")
+        size = int.from_bytes(code[pc:pc + width], "little")
+        pc += width
+    if pc + size > len(code):
+        raise ValueError("Truncated push")
+    return opcode, code[pc:pc + size], pc + size
+
+
+#
+# Return the shortest script that pushes data
+#
+def pushBytes(data):
+    size = len(data)
+    if size < OP_PUSHDATA1:
+        return bytes([size]) + data
+    if size <= 0xff:
+        return bytes([OP_PUSHDATA1, size]) + data
+    if size <= 0xffff:
+        return bytes([OP_PUSHDATA2]) + size.to_bytes(2, "little") + data
+    return bytes([OP_PUSHDATA4]) + size.to_bytes(4, "little") + data
+
+
+#
+# Does a script only consist of push operations?
+#
+def isPushOnly(code):
+    pc = 0
+    try:
+        while pc < len(code):
+            opcode, _, pc = readOp(code, pc)
+            if opcode > OP_16:
+                return False
+    except ValueError:
+        return False
+    return True
+
+
+#
+# Is this script a P2SH script, i.e. OP_HASH160 <20 bytes> OP_EQUAL?
+#
+def isP2SH(code):
+    return (len(code) == 23) and (code[0] == OP_HASH160) and (code[1] == 20) and (code[22] == OP_EQUAL)
+
+
+#
+# If the script is a witness program, i.e. a version (OP_0 or 
+# OP_1 to OP_16) followed by a push of 2 to 40 bytes, return
+# the version and the program, otherwise return None
+#
+def witnessProgram(code):
+    if (len(code) < 4) or (len(code) > 42):
+        return None
+    if (code[0] != OP_0) and ((code[0] < OP_1) or (code[0] > OP_16)):
+        return None
+    if code[1] + 2 != len(code):
+        return None
+    version = 0 if code[0] == OP_0 else code[0] - OP_1 + 1
+    return version, code[2:]
+
+
+#
+# The script code that is signed in the legacy signature hash
+# is the script starting after the last OP_CODESEPARATOR, with
+# all pushes of the signatures and all OP_CODESEPARATORs removed
+# (see FindAndDelete in the reference implementation)
+#
+def legacyScriptCode(code, sigs):
+    patterns = set(pushBytes(sig) for sig in sigs)
+    result = bytearray()
+    pc = 0
+    while pc < len(code):
+        start = pc
+        try:
+            opcode, _, pc = readOp(code, pc)
+        except ValueError:
+            result += code[start:]
+            break
+        if (opcode == OP_CODESEPARATOR) or (code[start:pc] in patterns):
+            continue
+        result += code[start:pc]
+    return bytes(result)
+
+
+#
+# The checker verifies signatures for OP_CHECKSIG and 
+# OP_CHECKMULTISIG on behalf of an input of a transaction. 
+# Signatures are looked up in the signature cache, successful
+# checks are only added to it if store is True
+#
+class transactionChecker:
+
+    __slots__ = ("nInput", "context", "amount", "store")
+
+    def __init__(self, nInput, context, amount, store = True):
+        self.nInput = nInput
+        self.context = context
+        self.amount = amount
+        self.store = store
+
+    #
+    # Check a signature (including the hash type) and a public key,
+    # both as bytes. Returns False if the signature is invalid and 
+    # raises a ValueError if the signature is not strictly DER 
+    # encoded (BIP66), which makes the script fail
+    #
+    def checkSig(self, sig, pubKey, scriptCode, sigVersion):
+        if len(sig) == 0:
+            return False
+        decoded = utils.decodeDERSignature(sig)
+        if decoded == None:
+            raise ValueError("Signature is not DER encoded")
+        r, s, hashType = decoded
+        if sigVersion == SIGVERSION_BASE:
+            h = self.context.signatureHash(self.nInput, scriptCode, hashType)
+        else:
+            h = self.context.witnessSignatureHash(self.nInput, scriptCode, self.amount, hashType)
+        return script.verifySignatureCheckCached((int.from_bytes(h, "big"), r, s, pubKey.hex()), self.store)
+
+    #
+    # Check an absolute lock time against the lock time of the
+    # transaction, see CheckLockTime in interpreter.cpp (BIP65)
+    #
+    def checkLockTime(self, lockTime):
+        tx = self.context.tx
+        txLockTime = tx.getLocktime()
+        #
+        # Both lock times need to be of the same type, i.e. 
+        # either both heights or both timestamps
+        #
+        if (lockTime < LOCKTIME_THRESHOLD) != (txLockTime < LOCKTIME_THRESHOLD):
+            return False
+        if lockTime > txLockTime:
+            return False
+        #
+        # The lock time of the transaction is ignored if the 
+        # input is final
+        #
+        return tx.getInputs()[self.nInput].getSequence() != SEQUENCE_FINAL
+
+    #
+    # Check a relative lock time against the sequence number of
+    # the input, see CheckSequence in interpreter.cpp (BIP112)
+    #
+    def checkSequence(self, sequence):
+        tx = self.context.tx
+        txSequence = tx.getInputs()[self.nInput].getSequence()
+        if tx.getVersion() < 2:
+            return False
+        if txSequence & SEQUENCE_LOCKTIME_DISABLE_FLAG:
+            return False
+        mask = SEQUENCE_LOCKTIME_TYPE_FLAG | SEQUENCE_LOCKTIME_MASK
+        if (sequence & SEQUENCE_LOCKTIME_TYPE_FLAG) != (txSequence & SEQUENCE_LOCKTIME_TYPE_FLAG):
+            return False
+        return (sequence & mask) <= (txSequence & mask)
+
+
+#
+# The state of the machine while a script is executed
+#
+class stackMachine:
+
+    __slots__ = ("stack", "altStack", "conditions", "falses", "checker", "sigVersion", 
+                 "code", "codeStart", "opCount")
+
+    def __init__(self, stack, checker, sigVersion):
+        self.stack = stack
+        self.altStack = []
+        self.checker = checker
+        self.sigVersion = sigVersion
+        #
+        # The values of the enclosing OP_IF / OP_NOTIF blocks 
+        # and the number of them which are false. We only execute
+        # operations if this number is zero
+        #
+        self.conditions = []
+        self.falses = 0
+        self.opCount = 0
+
+    def pop(self):
+        if len(self.stack) == 0:
+            raise ValueError("Stack is empty")
+        return self.stack.pop()
+
+    #
+    # Get the element at position -i, i.e. the top element for i = 1
+    #
+    def top(self, i):
+        if len(self.stack) < i:
+            raise ValueError("Stack too small")
+        return self.stack[-i]
+
+    #
+    # The script code for the signature hash
+    #
+    def scriptCode(self, sigs):
+        code = self.code[self.codeStart:]
+        if self.sigVersion == SIGVERSION_BASE:
+            return legacyScriptCode(code, sigs)
+        return code
+
+    #
+    # Run a script and return the resulting stack. Raises a 
+    # ValueError if the script fails
+    #
+    def run(self, code):
+        if len(code) > MAX_SCRIPT_SIZE:
+            raise ValueError("Script too long")
+        self.code = code
+        self.codeStart = 0
+        end = len(code)
+        pc = 0
+        while pc < end:
+            opcode, data, pc = readOp(code, pc)
+            if data != None:
+                if len(data) > MAX_ELEMENT_SIZE:
+                    raise ValueError("Push too long")
+                if self.falses == 0:
+                    self.stack.append(data)
+            else:
+                if opcode > OP_16:
+                    self.opCount += 1
+                    if self.opCount > MAX_OPS:
+                        raise ValueError("Too many operations")
+                if opcode in DISABLED_OPCODES:
+                    raise ValueError("Disabled opcode")
+                if (self.falses == 0) or (OP_IF <= opcode <= OP_ENDIF):
+                    handler = HANDLERS[opcode]
+                    if handler == None:
+                        raise ValueError("Invalid opcode")
+                    handler(self, opcode, pc)
+            if len(self.stack) + len(self.altStack) > MAX_STACK_SIZE:
+                raise ValueError("Stack too large")
+        if len(self.conditions) > 0:
+            raise ValueError("Unbalanced conditional")
+        return self.stack
+
+
+#
+# The handlers. Each handler is called with the machine, the 
+# opcode and the position after the opcode
+#
+def opPushNumber(m, opcode, pc):
+    if opcode == OP_1NEGATE:
+        m.stack.append(encodeNumber(-1))
+    else:
+        m.stack.append(encodeNumber(opcode - OP_1 + 1))
+
+def opNop(m, opcode, pc):
+    pass
+
+def opIf(m, opcode, pc):
+    value = False
+    if m.falses == 0:
+        value = castToBool(m.pop())
+        if opcode == OP_NOTIF:
+            value = not value
+    m.conditions.append(value)
+    if not value:
+        m.falses += 1
+
+def opElse(m, opcode, pc):
+    if len(m.conditions) == 0:
+        raise ValueError("OP_ELSE without OP_IF")
+    if m.conditions[-1]:
+        m.falses += 1
+    else:
+        m.falses -= 1
+    m.conditions[-1] = not m.conditions[-1]
+
+def opEndif(m, opcode, pc):
+    if len(m.conditions) == 0:
+        raise ValueError("OP_ENDIF without OP_IF")
+    if not m.conditions.pop():
+        m.falses -= 1
+
+def opVerify(m, opcode, pc):
+    if not castToBool(m.pop()):
+        raise ValueError("OP_VERIFY failed")
+
+def opReturn(m, opcode, pc):
+    raise ValueError("OP_RETURN")
+
+def opToAltStack(m, opcode, pc):
+    m.altStack.append(m.pop())
+
+def opFromAltStack(m, opcode, pc):
+    if len(m.altStack) == 0:
+        raise ValueError("Alternative stack is empty")
+    m.stack.append(m.altStack.pop())
+
+def op2Drop(m, opcode, pc):
+    m.top(2)
+    del m.stack[-2:]
+
+def op2Dup(m, opcode, pc):
+    m.top(2)
+    m.stack.extend(m.stack[-2:])
+
+def op3Dup(m, opcode, pc):
+    m.top(3)
+    m.stack.extend(m.stack[-3:])
+
+def op2Over(m, opcode, pc):
+    m.top(4)
+    m.stack.extend(m.stack[-4:-2])
+
+def op2Rot(m, opcode, pc):
+    m.top(6)
+    items = m.stack[-6:-4]
+    del m.stack[-6:-4]
+    m.stack.extend(items)
+
+def op2Swap(m, opcode, pc):
+    m.top(4)
+    m.stack[-4:] = m.stack[-2:] + m.stack[-4:-2]
+
+def opIfDup(m, opcode, pc):
+    if castToBool(m.top(1)):
+        m.stack.append(m.top(1))
+
+def opDepth(m, opcode, pc):
+    m.stack.append(encodeNumber(len(m.stack)))
+
+def opDrop(m, opcode, pc):
+    m.pop()
+
+def opDup(m, opcode, pc):
+    m.stack.append(m.top(1))
+
+def opNip(m, opcode, pc):
+    m.top(2)
+    del m.stack[-2]
+
+def opOver(m, opcode, pc):
+    m.stack.append(m.top(2))
+
+def opPick(m, opcode, pc):
+    n = decodeNumber(m.pop())
+    if (n < 0) or (n >= len(m.stack)):
+        raise ValueError("Invalid index")
+    item = m.stack[-n - 1]
+    if opcode == OP_ROLL:
+        del m.stack[-n - 1]
+    m.stack.append(item)
+
+def opRot(m, opcode, pc):
+    m.top(3)
+    m.stack.append(m.stack.pop(-3))
+
+def opSwap(m, opcode, pc):
+    m.top(2)
+    m.stack[-2], m.stack[-1] = m.stack[-1], m.stack[-2]
+
+def opTuck(m, opcode, pc):
+    m.top(2)
+    m.stack.insert(-2, m.stack[-1])
+
+def opSize(m, opcode, pc):
+    m.stack.append(encodeNumber(len(m.top(1))))
+
+def opEqual(m, opcode, pc):
+    equal = m.pop() == m.pop()
+    if opcode == OP_EQUALVERIFY:
+        if not equal:
+            raise ValueError("OP_EQUALVERIFY failed")
+    else:
+        m.stack.append(b'\x01' if equal else b'')
+
+UNARY = {
+    OP_1ADD : lambda a: a + 1,
+    OP_1SUB : lambda a: a - 1,
+    OP_NEGATE : lambda a: -a,
+    OP_ABS : lambda a: abs(a),
+    OP_NOT : lambda a: int(a == 0),
+    OP_0NOTEQUAL : lambda a: int(a != 0)
+}
+
+def opUnary(m, opcode, pc):
+    m.stack.append(encodeNumber(UNARY[opcode](decodeNumber(m.pop()))))
+
+BINARY = {
+    OP_ADD : lambda a, b: a + b,
+    OP_SUB : lambda a, b: a - b,
+    OP_BOOLAND : lambda a, b: int((a != 0) and (b != 0)),
+    OP_BOOLOR : lambda a, b: int((a != 0) or (b != 0)),
+    OP_NUMEQUAL : lambda a, b: int(a == b),
+    OP_NUMEQUALVERIFY : lambda a, b: int(a == b),
+    OP_NUMNOTEQUAL : lambda a, b: int(a != b),
+    OP_LESSTHAN : lambda a, b: int(a < b),
+    OP_GREATERTHAN : lambda a, b: int(a > b),
+    OP_LESSTHANOREQUAL : lambda a, b: int(a <= b),
+    OP_GREATERTHANOREQUAL : lambda a, b: int(a >= b),
+    OP_MIN : lambda a, b: min(a, b),
+    OP_MAX : lambda a, b: max(a, b)
+}
+
+def opBinary(m, opcode, pc):
+    b = decodeNumber(m.pop())
+    a = decodeNumber(m.pop())
+    result = BINARY[opcode](a, b)
+    if opcode == OP_NUMEQUALVERIFY:
+        if not result:
+            raise ValueError("OP_NUMEQUALVERIFY failed")
+    else:
+        m.stack.append(encodeNumber(result))
+
+def opWithin(m, opcode, pc):
+    maximum = decodeNumber(m.pop())
+    minimum = decodeNumber(m.pop())
+    x = decodeNumber(m.pop())
+    m.stack.append(encodeNumber(int(minimum <= x < maximum)))
+
+HASHES = {
+    OP_RIPEMD160 : lambda b: hashlib.new("ripemd160", b).digest(),
+    OP_SHA1 : lambda b: hashlib.sha1(b).digest(),
+    OP_SHA256 : lambda b: hashlib.sha256(b).digest(),
+    OP_HASH160 : utils.hash160,
+    OP_HASH256 : utils.hash256
+}
+
+def opHash(m, opcode, pc):
+    m.stack.append(HASHES[opcode](m.pop()))
+
+#
+# OP_CHECKLOCKTIMEVERIFY and OP_CHECKSEQUENCEVERIFY leave the 
+# lock time on the stack. Lock times can have up to five bytes
+#
+def opCheckLockTime(m, opcode, pc):
+    lockTime = decodeNumber(m.top(1), 5)
+    if lockTime < 0:
+        raise ValueError("Negative lock time")
+    if not m.checker.checkLockTime(lockTime):
+        raise ValueError("Lock time not satisfied")
+
+def opCheckSequence(m, opcode, pc):
+    sequence = decodeNumber(m.top(1), 5)
+    if sequence < 0:
+        raise ValueError("Negative sequence number")
+    #
+    # If the disable flag is set, this behaves like a NOP
+    #
+    if sequence & SEQUENCE_LOCKTIME_DISABLE_FLAG:
+        return
+    if not m.checker.checkSequence(sequence):
+        raise ValueError("Relative lock time not satisfied")
+
+def opCodeSeparator(m, opcode, pc):
+    m.codeStart = pc
+
+def opCheckSig(m, opcode, pc):
+    pubKey = m.pop()
+    sig = m.pop()
+    valid = m.checker.checkSig(sig, pubKey, m.scriptCode([sig]), m.sigVersion)
+    if opcode == OP_CHECKSIGVERIFY:
+        if not valid:
+            raise ValueError("OP_CHECKSIGVERIFY failed")
+    else:
+        m.stack.append(b'\x01' if valid else b'')
+
+#
+# The stack contains a dummy element, the m signatures, m, the n 
+# public keys and n. As in the reference implementation, we walk 
+# through the signatures and keys starting at the top, and 
+# signatures need to appear in the same order as their keys
+#
+def opCheckMultiSig(m, opcode, pc):
+    nKeys = decodeNumber(m.pop())
+    if (nKeys < 0) or (nKeys > MAX_PUBKEYS):
+        raise ValueError("Invalid number of public keys")
+    m.opCount += nKeys
+    if m.opCount > MAX_OPS:
+        raise ValueError("Too many operations")
+    keys = [m.pop() for _ in range(nKeys)]
+    nSigs = decodeNumber(m.pop())
+    if (nSigs < 0) or (nSigs > nKeys):
+        raise ValueError("Invalid number of signatures")
+    sigs = [m.pop() for _ in range(nSigs)]
+    #
+    # The dummy element needs to be empty (BIP147)
+    #
+    if len(m.pop()) != 0:
+        raise ValueError("Dummy element not empty")
+    scriptCode = m.scriptCode(sigs)
+    iSig = 0
+    iKey = 0
+    valid = True
+    while valid and (iSig < nSigs):
+        if m.checker.checkSig(sigs[iSig], keys[iKey], scriptCode, m.sigVersion):
+            iSig += 1
+        iKey += 1
+        if nSigs - iSig > nKeys - iKey:
+            valid = False
+    if opcode == OP_CHECKMULTISIGVERIFY:
+        if not valid:
+            raise ValueError("OP_CHECKMULTISIGVERIFY failed")
+    else:
+        m.stack.append(b'\x01' if valid else b'')
+
+
+#
+# The dispatch table
+#
+HANDLERS = [None]*256
+HANDLERS[OP_1NEGATE] = opPushNumber
+for _opcode in range(OP_1, OP_16 + 1):
+    HANDLERS[_opcode] = opPushNumber
+for _opcode in [OP_NOP] + list(range(OP_NOP1, OP_NOP10 + 1)):
+    HANDLERS[_opcode] = opNop
+for _opcode in UNARY:
+    HANDLERS[_opcode] = opUnary
+for _opcode in BINARY:
+    HANDLERS[_opcode] = opBinary
+for _opcode in HASHES:
+    HANDLERS[_opcode] = opHash
+HANDLERS[OP_IF] = opIf
+HANDLERS[OP_NOTIF] = opIf
+HANDLERS[OP_ELSE] = opElse
+HANDLERS[OP_ENDIF] = opEndif
+HANDLERS[OP_VERIFY] = opVerify
+HANDLERS[OP_RETURN] = opReturn
+HANDLERS[OP_TOALTSTACK] = opToAltStack
+HANDLERS[OP_FROMALTSTACK] = opFromAltStack
+HANDLERS[OP_2DROP] = op2Drop
+HANDLERS[OP_2DUP] = op2Dup
+HANDLERS[OP_3DUP] = op3Dup
+HANDLERS[OP_2OVER] = op2Over
+HANDLERS[OP_2ROT] = op2Rot
+HANDLERS[OP_2SWAP] = op2Swap
+HANDLERS[OP_IFDUP] = opIfDup
+HANDLERS[OP_DEPTH] = opDepth
+HANDLERS[OP_DROP] = opDrop
+HANDLERS[OP_DUP] = opDup
+HANDLERS[OP_NIP] = opNip
+HANDLERS[OP_OVER] = opOver
+HANDLERS[OP_PICK] = opPick
+HANDLERS[OP_ROLL] = opPick
+HANDLERS[OP_ROT] = opRot
+HANDLERS[OP_SWAP] = opSwap
+HANDLERS[OP_TUCK] = opTuck
+HANDLERS[OP_SIZE] = opSize
+HANDLERS[OP_EQUAL] = opEqual
+HANDLERS[OP_EQUALVERIFY] = opEqual
+HANDLERS[OP_WITHIN] = opWithin
+HANDLERS[OP_CHECKLOCKTIMEVERIFY] = opCheckLockTime
+HANDLERS[OP_CHECKSEQUENCEVERIFY] = opCheckSequence
+HANDLERS[OP_CODESEPARATOR] = opCodeSeparator
+HANDLERS[OP_CHECKSIG] = opCheckSig
+HANDLERS[OP_CHECKSIGVERIFY] = opCheckSig
+HANDLERS[OP_CHECKMULTISIG] = opCheckMultiSig
+HANDLERS[OP_CHECKMULTISIGVERIFY] = opCheckMultiSig
+
+
+#
+# Run a script on a stack and return the resulting stack
+#
+def evalScript(code, stack, checker, sigVersion = SIGVERSION_BASE):
+    return stackMachine(stack, checker, sigVersion).run(code)
+
+
+#
+# Verify a witness program. We can only verify version 0 (P2WPKH
+# or P2WSH). Following BIP141, programs with other versions are 
+# reserved for future soft forks and succeed
+#
+def verifyWitnessProgram(version, program, witness, checker):
+    if version != 0:
+        return True
+    if len(program) == 20:
+        if len(witness) != 2:
+            return False
+        code = bytes([OP_DUP, OP_HASH160, 20]) + program + bytes([OP_EQUALVERIFY, OP_CHECKSIG])
+        stack = list(witness)
+    elif len(program) == 32:
+        if len(witness) == 0:
+            return False
+        code = witness[-1]
+        if hashlib.sha256(code).digest() != program:
+            return False
+        stack = list(witness[:-1])
+    else:
+        return False
+    for item in stack:
+        if len(item) > MAX_ELEMENT_SIZE:
+            return False
+    stack = evalScript(code, stack, checker, SIGVERSION_WITNESS_V0)
+    return (len(stack) == 1) and castToBool(stack[0])
+
+
+#
+# Verify that a signature script, together with a witness (a 
+# list of byte sequences), satisfies a public key script, see
+# VerifyScript in interpreter.cpp. Returns True or False
+#
+def verifyScript(scriptSig, scriptPubKey, witness, checker):
+    try:
+        return _verifyScript(scriptSig, scriptPubKey, witness, checker)
+    except ValueError:
+        return False
+
+
+def _verifyScript(scriptSig, scriptPubKey, witness, checker):
+    p2sh = isP2SH(scriptPubKey)
+    if p2sh and not isPushOnly(scriptSig):
+        return False
+    stack = evalScript(scriptSig, [], checker)
+    saved = list(stack)
+    stack = evalScript(scriptPubKey, stack, checker)
+    if (len(stack) == 0) or not castToBool(stack[-1]):
+        return False
+    witnessUsed = False
+    program = witnessProgram(scriptPubKey)
+    if program != None:
+        #
+        # Native witness program, the signature script 
+        # needs to be empty
+        #
+        witnessUsed = True
+        if len(scriptSig) != 0:
+            return False
+        if not verifyWitnessProgram(program[0], program[1], witness, checker):
+            return False
+    if p2sh:
+        #
+        # The last element pushed by the signature script is the 
+        # redeem script which is run on the remaining elements
+        #
+        stack = saved
+        if len(stack) == 0:
+            return False
+        redeemScript = stack.pop()
+        stack = evalScript(redeemScript, stack, checker)
+        if (len(stack) == 0) or not castToBool(stack[-1]):
+            return False
+        program = witnessProgram(redeemScript)
+        if program != None:
+            #
+            # Witness program nested in P2SH, the signature script
+            # must consist of the push of the redeem script only
+            #
+            witnessUsed = True
+            if scriptSig != pushBytes(redeemScript):
+                return False
+            if not verifyWitnessProgram(program[0], program[1], witness, checker):
+                return False
+    if (len(witness) > 0) and not witnessUsed:
+        return False
+    return True
+
+
+#
+# Verify the input nInput of the transaction tx which spends 
+# the output spentOutput, optionally using a sighashContext
+# for tx. If store is False, the signatures are not added to
+# the signature cache
+#
+def verifyInput(tx, nInput, spentOutput, context = None, store = True):
+    if context == None:
+        context = script.sighashContext(tx)
+    txin = tx.getInputs()[nInput]
+    scriptSig = txin.scriptSigBytes
+    if scriptSig == None:
+        scriptSig = b''
+    checker = transactionChecker(nInput, context, spentOutput.getValue(), store)
+    return verifyScript(bytes(scriptSig), script.scriptPubKeyBytes(spentOutput), txin.getWitness(), checker)
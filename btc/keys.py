@@ -32,6 +32,7 @@
 ##################################################################
 
 from . import utils
+from . import secp256k1
 import base64
 import binascii
 import hashlib
@@ -253,6 +254,22 @@ def ecPointCompress(X,Y):
 def ecPointCompressHex(X,Y):
     return binascii.hexlify(ecPointCompress(X,Y)).decode('ascii')
     
+#
+# Given a private key as a number, determine the 
+# public key in compressed representation as hex
+#
+def ecPublicKeyHex(secret):
+    X, Y = secp256k1.multiply(secret)
+    return ecPointCompressHex(X, Y)
+
+#
+# Same as ecPublicKeyHex, but for a list of private keys. 
+# This is faster than deriving the keys one by one, as 
+# only one modular inversion is needed for all keys
+#
+def ecPublicKeysHex(secrets):
+    return [ecPointCompressHex(X, Y) for X, Y in secp256k1.batchMultiply(secrets)]
+    
 #
 # Given a hex representation of a public key,
 # determine the address in base58 check encoding
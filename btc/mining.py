@@ -104,7 +104,7 @@ def checkBlock(block, currentLastBlock):
     # Check Merkle root
     #
     merkleRoot = utils.blockMerkleRoot(block)
-    if merkleRoot != serialize.serializeString(block.getBlockHeader().getMerkleRoot(), 32):
+    if merkleRoot != serialize.reverseHex(block.getBlockHeader().getMerkleRoot()):
         return False
         
     return True
@@ -185,8 +185,34 @@ def createNewBlock(address, currentLastBlockHash, currentHeight, coinbasevalue,
     for _tx in tx:
         _block.addTxn(_tx)
         assert(False == _tx.isCoinbase())
+    #
+    # If any of the transactions has a witness, we need
+    # to commit to the witnesses in the coinbase transaction
+    #
+    for _tx in tx:
+        if _tx.hasWitness():
+            addWitnessCommitment(_block)
+            break
     _block.updateMerkleRoot()
     return _block
+
+
+#
+# Add a witness commitment as defined in BIP141 to the 
+# coinbase transaction of a block. This is an additional 
+# output with value zero and a locking script 
+# OP_RETURN 0x24 0xaa21a9ed hash256(witness root | reserved value)
+# where the reserved value is the witness of the coinbase input
+#
+def addWitnessCommitment(_block):
+    coinbase = _block.getTx()[0]
+    reserved = bytes(32)
+    coinbase.getInputs()[0].setWitness([reserved])
+    witnessRoot = bytes.fromhex(utils.blockWitnessMerkleRoot(_block))
+    commitment = utils.hash256(witnessRoot + reserved)
+    txout = txn.txout(value = 0)
+    txout.scriptPubKeyHex = "6a24aa21a9ed" + commitment.hex()
+    coinbase.addOutput(txout)
     
     
 
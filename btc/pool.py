@@ -0,0 +1,130 @@
+####################################################
+# 
+# A pool of worker processes shared by signing and verification
+#
+# MIT license
+#
+# Copyright (c) 2018 christianb93
+# Permission is hereby granted, free of charge, to 
+# any person obtaining a copy of this software and 
+# associated documentation files (the "Software"), 
+# to deal in the Software without restriction, 
+# including without limitation the rights to use, 
+# copy, modify, merge, publish, distribute, 
+# sublicense, and/or sell copies of the Software, 
+# and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice 
+# shall be included in all copies or substantial 
+# portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY 
+# OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT 
+# LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. 
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS 
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, 
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, 
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE 
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+####################################################
+
+from . import secp256k1
+
+import concurrent.futures
+import os
+
+
+#
+# The pool of worker processes used if the caller does not provide 
+# an executor. It is created when it is first needed and then kept,
+# so that we pay the start of the workers only once. If the 
+# fixed-base table of secp256k1 has been loaded from a file, each
+# worker maps the same file when it starts instead of building 
+# the table itself
+#
+POOL = None
+POOL_WORKERS = 0
+POOL_TABLE_FILE = None
+
+def getPool(workers):
+    global POOL, POOL_WORKERS, POOL_TABLE_FILE
+    tableFile = secp256k1.FIXED_BASE_TABLE_FILE
+    if (POOL == None) or (POOL_WORKERS != workers) or (POOL_TABLE_FILE != tableFile):
+        if POOL != None:
+            POOL.shutdown(wait = False)
+        if tableFile == None:
+            POOL = concurrent.futures.ProcessPoolExecutor(max_workers = workers)
+        else:
+            POOL = concurrent.futures.ProcessPoolExecutor(max_workers = workers, 
+                                                          initializer = secp256k1.loadFixedBaseTable,
+                                                          initargs = (tableFile,))
+        POOL_WORKERS = workers
+        POOL_TABLE_FILE = tableFile
+    return POOL
+
+
+#
+# Return the number of workers to use, which defaults to 
+# the number of CPUs
+#
+def workerCount(workers = None):
+    if workers == None:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+#
+# Apply function to a list of items and return the list of results,
+# where function takes a list of items and returns one result per item.
+# Parameters:
+# - workers - the number of worker processes, defaults to the number of CPUs.
+#             If this is 1, everything is done in the calling process
+# - executor - an existing concurrent.futures.Executor to use instead of 
+#              the pool POOL of this module
+# - chunksPerWorker - the items are submitted in chunks, so that we do not
+#                     pay the overhead of a submission for every item. More
+#                     chunks per worker allow us to stop earlier
+# - stopOnFalse - if a result is False, the chunks after it are cancelled.
+#                 We still need the results of the chunks before it, the
+#                 results after the first False are None
+#
+def runChunks(function, items, workers = None, executor = None, chunksPerWorker = 1, stopOnFalse = False):
+    workers = workerCount(workers)
+    if (executor == None) and (workers <= 1):
+        return function(items)
+    if len(items) == 0:
+        return []
+    pool = executor
+    if pool == None:
+        pool = getPool(workers)
+    chunkSize = max(1, -(-len(items) // (chunksPerWorker*workers)))
+    results = [None]*len(items)
+    futures = {}
+    try:
+        for start in range(0, len(items), chunkSize):
+            futures[pool.submit(function, items[start:start + chunkSize])] = start
+        first = len(items)
+        for future in concurrent.futures.as_completed(futures):
+            start = futures[future]
+            chunkResults = future.result()
+            results[start:start + len(chunkResults)] = chunkResults
+            if stopOnFalse and (False in chunkResults):
+                first = start + chunkResults.index(False)
+                break
+        if first < len(items):
+            for future, start in futures.items():
+                if start > first:
+                    future.cancel()
+                elif start < first:
+                    chunkResults = future.result()
+                    results[start:start + len(chunkResults)] = chunkResults
+    finally:
+        for future in futures:
+            future.cancel()
+    if stopOnFalse and (False in results):
+        first = results.index(False)
+        results[first + 1:] = [None]*(len(results) - first - 1)
+    return results
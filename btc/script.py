@@ -36,26 +36,125 @@ from . import script
 from . import txn
 from . import utils
 from . import keys
+from . import secp256k1
+from . import interpreter
 
-import binascii
-import ecdsa
+import functools
+import hashlib
+import mmap
+import os
 import random
 
 
+OP_0 = 0x00
 OP_PUSHDATA1 = 0x4c
 OP_DUP = 0x76
 OP_CHECKSIG = 0xac
 OP_HASH160 = 0xa9
 OP_EQUALVERIFY = 0x88
+OP_EQUAL = 0x87
+OP_RETURN = 0x6a
+OP_1 = 0x51
 
 
 SCRIPTTYPE_P2PKH = "P2PKH"
 SCRIPTTYPE_P2PK = "P2PK"
+SCRIPTTYPE_P2WPKH = "P2WPKH"
+SCRIPTTYPE_P2SH = "P2SH"
+SCRIPTTYPE_P2WSH = "P2WSH"
+SCRIPTTYPE_P2TR = "P2TR"
+SCRIPTTYPE_NULLDATA = "NULLDATA"
 SCRIPTTYPE_OTHER = "OTHER"
 
 SIGHASHTYPE_ALL = 1
+SIGHASHTYPE_NONE = 2
+SIGHASHTYPE_SINGLE = 3
+SIGHASHTYPE_ANYONECANPAY = 0x80
+
+#
+# The type of signature script that spends each of the
+# standard output types
+#
+STANDARD_SPENDS = {SCRIPTTYPE_P2PK : SCRIPTTYPE_P2PK, 
+                   SCRIPTTYPE_P2PKH : SCRIPTTYPE_P2PKH, 
+                   SCRIPTTYPE_P2WPKH : SCRIPTTYPE_P2PKH}
+
+#
+# Templates for the standard public key scripts. For each length,
+# we list the prefix, the suffix, the type and the offset of the 
+# payload (public key, hash or output key), so that a script can 
+# be classified by comparing a few bytes at fixed positions
+#
+SCRIPT_TEMPLATES = {
+    25 : [(bytes([OP_DUP, OP_HASH160, 20]), bytes([OP_EQUALVERIFY, OP_CHECKSIG]), SCRIPTTYPE_P2PKH, 3)],
+    23 : [(bytes([OP_HASH160, 20]), bytes([OP_EQUAL]), SCRIPTTYPE_P2SH, 2)],
+    22 : [(bytes([OP_0, 20]), b'', SCRIPTTYPE_P2WPKH, 2)],
+    34 : [(bytes([OP_0, 32]), b'', SCRIPTTYPE_P2WSH, 2), 
+          (bytes([OP_1, 32]), b'', SCRIPTTYPE_P2TR, 2)],
+    35 : [(bytes([33, 0x02]), bytes([OP_CHECKSIG]), SCRIPTTYPE_P2PK, 1),
+          (bytes([33, 0x03]), bytes([OP_CHECKSIG]), SCRIPTTYPE_P2PK, 1)],
+    67 : [(bytes([65, 0x04]), bytes([OP_CHECKSIG]), SCRIPTTYPE_P2PK, 1)]
+}
+
+#
+# Prefix and suffix for the types where the prefix does not 
+# contain parts of the payload
+#
+TEMPLATE_PARTS = {scriptType : (prefix, suffix) 
+                  for templates in SCRIPT_TEMPLATES.values() 
+                  for prefix, suffix, scriptType, start in templates 
+                  if start == len(prefix)}
+
+#
+# The script types for which scriptPubKey stores data
+#
+DATA_SCRIPTTYPES = (SCRIPTTYPE_P2SH, SCRIPTTYPE_P2WSH, SCRIPTTYPE_P2TR, SCRIPTTYPE_NULLDATA)
+
+
+#
+# Classify a public key script, given as bytes. Returns the type 
+# and the payload, i.e. the public key for P2PK, the hash for P2PKH, 
+# P2SH, P2WPKH and P2WSH, the output key for P2TR and everything after 
+# OP_RETURN for NULLDATA. The payload is None for other scripts
+#
+def _classifyScript(b):
+    for prefix, suffix, scriptType, start in SCRIPT_TEMPLATES.get(len(b), ()):
+        if b.startswith(prefix) and b.endswith(suffix):
+            return scriptType, b[start:len(b) - len(suffix)]
+    if (len(b) > 0) and (b[0] == OP_RETURN) and interpreter.isPushOnly(b[1:]):
+        return SCRIPTTYPE_NULLDATA, b[1:]
+    return SCRIPTTYPE_OTHER, None
+
+#
+# Many outputs use the same script, for instance when they pay 
+# to the same address, so we remember the last results
+#
+CLASSIFY_CACHE_SIZE = 1024
+
+CLASSIFY_CACHE = functools.lru_cache(maxsize = CLASSIFY_CACHE_SIZE)(_classifyScript)
+
+def classifyScript(b):
+    return CLASSIFY_CACHE(bytes(b))
+
+
+#
+# Get the length of the signature that a signature script s (as
+# bytes) pushes first, or 0 if the script does not start with 
+# a push of at most OP_PUSHDATA1 - 1 bytes. The signature starts
+# at offset 1
+#
+def pushedSignatureLength(s):
+    if len(s) == 0:
+        return 0
+    sigLength = s[0]
+    if (sigLength >= OP_PUSHDATA1) or (1 + sigLength > len(s)):
+        return 0
+    return sigLength
+
 
 class scriptSig:
+
+    __slots__ = ("scriptType", "r", "s", "pubKeyHex", "hashType", "data", "owner")
     
     def __init__(self, scriptType = SCRIPTTYPE_OTHER, r = None, s = None, pubKeyHex = None, hashType = 1):
         self.scriptType = scriptType
@@ -64,6 +163,11 @@ class scriptSig:
         self.pubKeyHex = pubKeyHex
         self.hashType = hashType
         self.data = ""
+        #
+        # The transaction input to which this script has been 
+        # assigned, if any, see txn.txin
+        #
+        self.owner = None
         if scriptType == SCRIPTTYPE_P2PKH:
             if (pubKeyHex == None):
                 raise ValueError("Need to provide public key for this script type")
@@ -109,89 +213,57 @@ class scriptSig:
         if 1 == (l % 2):
             raise ValueError("Input must have even length")
         self.data += serialize.serializeChar(l // 2) + s
+        if self.owner != None:
+            self.owner.scriptSigChanged(self)
     
     
+    #
+    # Deserialize a signature script, given as hex string 
+    # or as bytes. The script is kept as data, so that a
+    # script which does not follow one of the standard 
+    # patterns serializes to itself and data can be pushed
+    # onto it
+    #
     def deserialize(self, s):
-        opcode, s = serialize.deserializeChar(s)
-        if (opcode >= OP_PUSHDATA1):
-            self.scriptType = SCRIPTTYPE_OTHER
-            return
-        #
-        # Opcode < OP_PUSHDATA1, so it is the length of data
-        # that we need to push to the stack
-        # 
-        der_signature = s[0:2*opcode]
-        s = s[2*opcode:]
-        #
-        # We expect this to be a DER signature
+        if isinstance(s, str):
+            s = bytes.fromhex(s)
         #
-        if der_signature[0:2] != "30":
-            self.scriptType = SCRIPTTYPE_OTHER
-            return
-        der_signature = der_signature[2:]
-        #
-        # The next byte should be the byte length of the entire
-        # array, excluding the byte that we just read and excluding
-        # the hash type
-        #
-        l, der_signature = serialize.deserializeChar(der_signature)
-        #
-        # Next byte should be 02 for integer
-        #
-        if der_signature[0:2] != "02":
-            self.scriptType = SCRIPTTYPE_OTHER
-            return
-        der_signature = der_signature[2:]
-        #
-        # Read length and r (which is a big endian which is DER standard)
-        #
-        l, der_signature = serialize.deserializeChar(der_signature)
-        sign_r = der_signature[0:l*2]
-        sign_r_int = int.from_bytes(bytes.fromhex(sign_r), 'big')
-        der_signature = der_signature[2*l:]
-        #
-        # Next byte should be 02 for integer
-        #
-        if der_signature[0:2] != "02":
-            self.scriptType = SCRIPTTYPE_OTHER
-            return
-        der_signature = der_signature[2:]    
-        l, der_signature = serialize.deserializeChar(der_signature)
-        sign_s = der_signature[0:2*l]
-        sign_s_int = int.from_bytes(bytes.fromhex(sign_s), 'big')
-        der_signature = der_signature[2*l:]
-        #
-        # last byte is the hash type - see 
+        # The first opcode should be a push (opcode < OP_PUSHDATA1) 
+        # of a DER signature followed by the hash type, see
         # TransactionSignatureCreator::CreateSig
         #
-        if len(der_signature) != 2:
-            self.scriptType = SCRIPTTYPE_OTHER
+        sigLength = pushedSignatureLength(s)
+        self.deserializeDecoded(s, sigLength, utils.decodeDERSignatureAt(s, 1, sigLength))
+
+    #
+    # Deserialize a signature script given as bytes when the 
+    # signature that it pushes first has already been decoded,
+    # for instance by txn.parseScriptSigs. sigLength is the 
+    # length of this signature and decoded the result of 
+    # utils.decodeDERSignatureAt for it
+    #
+    def deserializeDecoded(self, s, sigLength, decoded):
+        self.scriptType = SCRIPTTYPE_OTHER
+        self.data = s.hex()
+        if decoded == None:
             return
-        self.hashType = int.from_bytes(bytes.fromhex(der_signature), "big")
-        if s == "":
+        rest = s[1 + sigLength:]
+        if len(rest) == 0:
             #
             # Output was a Pay-to-public-key so there is no
             # public key here
+            #
             self.scriptType = SCRIPTTYPE_P2PK
         else:
             #
-            # Now the remaining part should start with an opcode again
-            # 
-            opcode, s = serialize.deserializeChar(s)
-            if (opcode >= 0x4c):
-                self.scriptType = SCRIPTTYPE_OTHER
-                return    
+            # Remaining part should be the push of a compressed
+            # or uncompressed public key
             #
-            # Remaining part is compressed pub key
-            #
-            if len(s) != 66:
-                self.scriptType = SCRIPTTYPE_OTHER
-                return   
+            if ((rest[0] != 33) and (rest[0] != 65)) or (len(rest) != 1 + rest[0]):
+                return
             self.scriptType = SCRIPTTYPE_P2PKH
-            self.pubKeyHex = s
-            
-        self.r = sign_r_int
-        self.s = sign_s_int
+            self.pubKeyHex = rest[1:].hex()
+        self.r, self.s, self.hashType = decoded
         
         
     def serialize(self):
@@ -200,76 +272,51 @@ class scriptSig:
             # Only return data has explicitly been pushed
             #
             return self.data
-        scriptSig = ""
-        #
-        # First opcode is the length - so we do this
-        # not now but when we are done with everything else
-        # First we create a DER representation of the private key
-        # R and S are both represented by 02 - the DER code for an integer -
-        # followed by their values in big endian encoding
-        #
-        r_str = serialize.serializeNumber(self.r, order="big")
-        s_str = serialize.serializeNumber(self.s, order="big")
-        #
-        # DER requires that the first byte has its highest bit not set, as otherwise
-        # this would be interpreted as an integer. So if this is the case, we would 
-        # have to append a leading zero byte
-        #
-        r_first = int(r_str[0:2], 16)
-        s_first = int(s_str[0:2], 16)
-        if r_first & 0x80:
-            r_str = "00" + r_str
-        if s_first & 0x80:  
-            s_str = "00" + s_str            
-        scriptSig = "02" + serialize.serializeChar(int(len(r_str) / 2)) + r_str
-        scriptSig = scriptSig + "02" + serialize.serializeChar(int(len(s_str) / 2)) + s_str
-        #
-        # Now add length and 0x30 - the DER type code for a sequence. We have not yet added
-        # the hashtype, so the length we need to decode is the current length in bytes
-        #
-        scriptSig = "30" + serialize.serializeChar(int(len(scriptSig) / 2)) + scriptSig
-        #
-        # Add hashtype
-        #
-        scriptSig = scriptSig + serialize.serializeChar(self.hashType)
         #
-        # finally add opcode for push data which is simply the length
+        # Push the DER representation of the signature 
+        # followed by the hash type
         #
-        scriptSig = serialize.serializeChar(int(len(scriptSig) / 2)) + scriptSig
+        sig = utils.encodeDERSignature(self.r, self.s, self.hashType)
+        scriptSig = bytes([len(sig)]) + sig
         #
-        # Now we are done with the first push operation. If this is a P2PK 
-        # script we are done
+        # If this is a P2PK script we are done, otherwise
+        # we need to push the pub key
         # 
-        if (self.scriptType == SCRIPTTYPE_P2PK):
-            return scriptSig
-        #
-        # Otherwise we need to push the pub key
-        # 
-        scriptSig = scriptSig + serialize.serializeChar(int(len(self.pubKeyHex) / 2))
-        scriptSig = scriptSig + self.pubKeyHex
-        return scriptSig
+        if self.scriptType == SCRIPTTYPE_P2PKH:
+            scriptSig = scriptSig + bytes([len(self.pubKeyHex) // 2]) + bytes.fromhex(self.pubKeyHex)
+        return scriptSig.hex()
             
         
         
         
 class scriptPubKey():
+
+    __slots__ = ("scriptType", "pubKeyHex", "pubKeyHash", "data")
     
-    def __init__(self, scriptType = SCRIPTTYPE_OTHER, pubKeyHex = None, pubKeyHash = None):
+    def __init__(self, scriptType = SCRIPTTYPE_OTHER, pubKeyHex = None, pubKeyHash = None, data = None):
         self.scriptType = scriptType
         self.pubKeyHex = pubKeyHex
         self.pubKeyHash = pubKeyHash
+        self.data = data
         if scriptType == SCRIPTTYPE_P2PK:
             #
             # for P2PK, we need a pubKey
             #
             if pubKeyHex == None:
                 raise ValueError("Need public key for this script type")
-        if scriptType == SCRIPTTYPE_P2PKH:
+        if (scriptType == SCRIPTTYPE_P2PKH) or (scriptType == SCRIPTTYPE_P2WPKH):
             #
-            # for P2PKH, we need a pubKey hash
+            # for P2PKH and P2WPKH, we need a pubKey hash
             #
             if pubKeyHash == None:
                 raise ValueError("Need public key hash for this script type")
+        if scriptType in DATA_SCRIPTTYPES:
+            #
+            # for the other templates, we need the script hash,
+            # the output key or the data after OP_RETURN
+            #
+            if data == None:
+                raise ValueError("Need data for this script type")
                 
     #
     # Get the script type
@@ -291,69 +338,40 @@ class scriptPubKey():
     # Get the public key hash as hex string (
     #
     def getPubKeyHash(self):
-        if self.scriptType != SCRIPTTYPE_P2PKH:
-            raise TypeError("No P2PKH script")
+        if (self.scriptType != SCRIPTTYPE_P2PKH) and (self.scriptType != SCRIPTTYPE_P2WPKH):
+            raise TypeError("No P2PKH or P2WPKH script")
         return self.pubKeyHash
+
+    #
+    # Get the data as hex string. This is the script hash for P2SH 
+    # and P2WSH, the output key for P2TR and everything after 
+    # OP_RETURN for NULLDATA
+    #
+    def getData(self):
+        if self.scriptType not in DATA_SCRIPTTYPES:
+            raise TypeError("No P2SH, P2WSH, P2TR or NULLDATA script")
+        return self.data
         
         
     
-    def deserialize(self,s):
-        opcode, s = serialize.deserializeChar(s)
-        if opcode == 33:
-            #
-            # Could be a P2PK script
-            #
-            pubKeyHex = s[:66]
-            s = s[66:]
-            #
-            # the next opcode should then be OP_CHECKSIG
-            # 
-            opcode, s = serialize.deserializeChar(s)
-            if opcode != OP_CHECKSIG:
-                self.scriptType = SCRIPTTYPE_OTHER
-                return
-            self.scriptType = SCRIPTTYPE_P2PK
-            self.pubKeyHex = pubKeyHex
-            return
-        if opcode != OP_DUP:
-            #
-            # Give up if this is not OP_DUP
-            #
-            self.scriptType = SCRIPTTYPE_OTHER
-            return
-        #
-        # Now we expect OP_HASH160
-        # 
-        opcode, s = serialize.deserializeChar(s)
-        if opcode != OP_HASH160:
-            self.scriptType = SCRIPTTYPE_OTHER
-            return
-        #
-        # Next we should push the pubkey hash on the stack,
-        # which has 20 bytes
-        # 
-        opcode, s = serialize.deserializeChar(s)
-        if opcode != 20:
-            self.scriptType = SCRIPTTYPE_OTHER
-            return
-        pubKeyHash = s[0:40]
-        s = s[40:]
-        #
-        # Now there should be OP_EQUALVERIFY
-        #
-        opcode, s = serialize.deserializeChar(s)
-        if opcode != OP_EQUALVERIFY:
-            self.scriptType = SCRIPTTYPE_OTHER
-            return
-        #
-        # and OP_CHECKSIG
-        #
-        opcode, s = serialize.deserializeChar(s)
-        if opcode != OP_CHECKSIG:
-            self.scriptType = SCRIPTTYPE_OTHER
+    #
+    # Deserialize a script, given as hex string or as bytes
+    #
+    def deserialize(self, s):
+        if isinstance(s, str):
+            s = bytes.fromhex(s)
+        self.scriptType, payload = classifyScript(s)
+        self.pubKeyHex = None
+        self.pubKeyHash = None
+        self.data = None
+        if payload == None:
             return
-        self.scriptType = SCRIPTTYPE_P2PKH
-        self.pubKeyHash = pubKeyHash
+        if self.scriptType == SCRIPTTYPE_P2PK:
+            self.pubKeyHex = payload.hex()
+        elif (self.scriptType == SCRIPTTYPE_P2PKH) or (self.scriptType == SCRIPTTYPE_P2WPKH):
+            self.pubKeyHash = payload.hex()
+        else:
+            self.data = payload.hex()
     
     #
     # Serialize the script
@@ -364,42 +382,26 @@ class scriptPubKey():
         #
         if self.scriptType == SCRIPTTYPE_OTHER:
             return ""
-        #
-        # If this is a P2K script, simply push
-        # the public key
-        #
         if self.scriptType == SCRIPTTYPE_P2PK:
-            s = serialize.serializeChar(33)
-            s = s + self.pubKeyHex
-        else:
-            
-            #
-            # P2KH. First op is OP_DUP
-            #
-            s = serialize.serializeChar(script.OP_DUP)
-            #
-            # Now we need OP_HASH160
-            # 
-            s = s + serialize.serializeChar(script.OP_HASH160)
             #
-            # Next we should push the pubkey hash on the stack,
-            # which has 20 bytes
-            # 
-            s = s + serialize.serializeChar(20)
-            s = s + self.pubKeyHash
+            # Push the public key, followed by OP_CHECKSIG
             #
-            # Now there should be OP_EQUALVERIFY
-            #
-            s = s + serialize.serializeChar(script.OP_EQUALVERIFY)
+            return serialize.serializeChar(len(self.pubKeyHex) // 2) + self.pubKeyHex + serialize.serializeChar(OP_CHECKSIG)
+        if self.scriptType == SCRIPTTYPE_NULLDATA:
+            return serialize.serializeChar(OP_RETURN) + self.data
         #
-        # Finally there is OP_CHECKSIG
+        # All other types consist of a prefix, the hash or key and
+        # possibly a suffix, see SCRIPT_TEMPLATES
         #
-        s = s + serialize.serializeChar(script.OP_CHECKSIG)
-        return s
+        prefix, suffix = TEMPLATE_PARTS[self.scriptType]
+        if self.data != None:
+            payload = self.data
+        else:
+            payload = self.pubKeyHash
+        return prefix.hex() + payload + suffix.hex()
     
     
 
-
 #
 # Given a transaction, determine the string that will be hashed and
 # signed to obtain a signature for a specific transaction input. Note
@@ -412,88 +414,381 @@ class scriptPubKey():
 # scriptPubKey - the public key script of the output to which this 
 #                input refers
 def serializeForSigning(tx, nInput, scriptPubKey):
+    return serializeForSigningBytes(tx, nInput, scriptPubKey).hex()
+
+
+#
+# Same as serializeForSigning, but return bytes
+#
+def serializeForSigningBytes(tx, nInput, scriptPubKey):
     if not isinstance(tx, txn.txn):
         raise  TypeError("Expecting transaction")
     if not isinstance(nInput, int):
         raise TypeError("Expecting integer")
     if not isinstance(scriptPubKey, script.scriptPubKey):
         raise TypeError("Need public key script here")        
+    writer = serialize.ByteWriter()
     #
     # Version
     #
-    s = serialize.serializeUint32(tx.getVersion())
+    writer.writeUint32(tx.getVersion())
     #
     # Number of input transactions
     #
-    s = s + serialize.serializeVarInt(len(tx.getInputs()))
+    writer.writeVarInt(len(tx.getInputs()))
     #
-    # Each individual input transaction
+    # Each individual input transaction. We serialize
+    # the public key script only once
     #
+    scriptPubKeyBytes = bytes.fromhex(scriptPubKey.serialize())
     i = 0
     for txin in tx.getInputs():
-        s = s + serializeTxinForSigning(txin, nInput, i, scriptPubKey) 
+        serializeTxinForSigningInto(writer, txin, nInput, i, scriptPubKeyBytes)
         i += 1
     #
     # Now do the outputs
     #
-    s = s + serialize.serializeVarInt(len(tx.getOutputs()))
+    writer.writeVarInt(len(tx.getOutputs()))
     for txout in tx.getOutputs():
-        s = s + txout.serialize()
+        txout.serializeInto(writer)
     #
     # and the locktime
     #
-    s = s + serialize.serializeUint32(tx.getLocktime())
+    writer.writeUint32(tx.getLocktime())
     #
     # plus SIGHASH_ALL
     #
-    s = s + serialize.serializeUint32(SIGHASHTYPE_ALL)    
-    return s
+    writer.writeUint32(SIGHASHTYPE_ALL)    
+    return writer.getBytes()
     
     
 def serializeTxinForSigning(txin, nInput, index, scriptPubKey):
-    s = ""
+    writer = serialize.ByteWriter()
+    serializeTxinForSigningInto(writer, txin, nInput, index, 
+                                bytes.fromhex(scriptPubKey.serialize()))
+    return writer.getHex()
+
+
+def serializeTxinForSigningInto(writer, txin, nInput, index, scriptPubKeyBytes):
     #
     # Previous transaction id
     #
-    prev_txid = txin.getPrevTxId()
-    s = s + serialize.serializeString(prev_txid, 32)
+    writer.writeString(txin.getPrevTxId(), 32)
     #
     # and its index
     #
-    vout = txin.getVout()
-    s = s + serialize.serializeUint32(vout)
+    writer.writeUint32(txin.getVout())
     #
     # Now we use serialized pubKeyScript
     # of the corresponding output if nInput = index and
     # a blank otherwise
     #
     if nInput == index:
-        scriptPubKeyHex = scriptPubKey.serialize()
+        writer.writeVarInt(len(scriptPubKeyBytes))
+        writer.writeBytes(scriptPubKeyBytes)
     else:
-        scriptPubKeyHex = ""
-    s = s + serialize.serializeChar(int(len(scriptPubKeyHex) / 2)) + scriptPubKeyHex
+        writer.writeVarInt(0)
     #
     # finally the sequence
     #
-    s = s + serialize.serializeUint32(txin.getSequence())
-    return s
+    writer.writeUint32(txin.getSequence())
+
+
+#
+# The data that is hashed to sign an input is the same for all
+# inputs, except for the script of the input that is signed, which
+# is replaced by the public key script of the spent output (see
+# serializeForSigning). A sighashContext serializes the transaction
+# once with blank scripts and then builds the data for each input
+# from these pieces, so that signing all inputs of a transaction does
+# not require us to serialize the transaction once per input
+#
+# For inputs spending segregated witness outputs, the hash is 
+# defined in BIP143. Here the data for each input contains hashes of
+# all outpoints, all sequence numbers and all outputs, which the 
+# context computes only once
+#
+# As neither the scripts nor the witnesses of the inputs are part 
+# of the data, a context remains valid when the inputs are signed, 
+# but it needs to be rebuilt if anything else in the transaction 
+# changes
+#
+class sighashContext:
+
+    __slots__ = ("tx", "data", "inputsOffset", "suffixOffset", "prefixHash", "prefixInput",
+                 "hashPrevouts", "hashSequence", "hashOutputs")
+
+    #
+    # Each blank input consists of the previous transaction ID (32 bytes),
+    # the index (4 bytes), an empty script (1 byte) and the sequence number
+    # (4 bytes)
+    #
+    BLANK_TXIN_SIZE = 41
+
+    def __init__(self, tx):
+        if not isinstance(tx, txn.txn):
+            raise  TypeError("Expecting transaction")
+        for txin in tx.getInputs():
+            if (txin.prevTxidBytes == None) or (len(txin.prevTxidBytes) != 32):
+                raise ValueError("Invalid previous transaction id")
+        self.tx = tx
+        #
+        # The pieces for the legacy hash and the BIP143 hashes
+        # are only built when they are needed for the first time
+        #
+        self.data = None
+        self.hashPrevouts = None
+        self.hashSequence = None
+        self.hashOutputs = None
+
+    #
+    # Serialize the transaction with blank scripts
+    #
+    def prepareLegacy(self):
+        tx = self.tx
+        writer = serialize.ByteWriter()
+        writer.writeUint32(tx.getVersion())
+        writer.writeVarInt(len(tx.getInputs()))
+        self.inputsOffset = writer.getLength()
+        for txin in tx.getInputs():
+            writer.writeBytes(txin.prevTxidBytes)
+            writer.writeUint32(txin.getVout())
+            writer.writeVarInt(0)
+            writer.writeUint32(txin.getSequence())
+        self.suffixOffset = writer.getLength()
+        writer.writeVarInt(len(tx.getOutputs()))
+        for txout in tx.getOutputs():
+            txout.serializeInto(writer)
+        writer.writeUint32(tx.getLocktime())
+        writer.writeUint32(SIGHASHTYPE_ALL)
+        self.data = writer.getBytes()
+        #
+        # The hash state after processing everything up to the 
+        # input prefixInput. As inputs are usually signed in order, 
+        # we advance this state instead of hashing the common 
+        # prefix again for every input
+        #
+        self.prefixHash = hashlib.sha256(memoryview(self.data)[:self.inputsOffset])
+        self.prefixInput = 0
+
+    #
+    # Compute the hashes of all outpoints, sequence numbers 
+    # and outputs used by BIP143
+    #
+    def prepareWitness(self):
+        tx = self.tx
+        prevouts = serialize.ByteWriter()
+        sequences = serialize.ByteWriter()
+        for txin in tx.getInputs():
+            prevouts.writeBytes(txin.prevTxidBytes)
+            prevouts.writeUint32(txin.getVout())
+            sequences.writeUint32(txin.getSequence())
+        outputs = serialize.ByteWriter()
+        for txout in tx.getOutputs():
+            txout.serializeInto(outputs)
+        self.hashPrevouts = utils.hash256(prevouts.getBytes())
+        self.hashSequence = utils.hash256(sequences.getBytes())
+        self.hashOutputs = utils.hash256(outputs.getBytes())
+
+    #
+    # Return the hash that is signed for the input nInput, given
+    # the serialized public key script of the spent output and
+    # the hash type. Only SIGHASH_ALL uses the prepared data
+    #
+    def signatureHash(self, nInput, scriptPubKeyBytes, hashType = SIGHASHTYPE_ALL):
+        if hashType != SIGHASHTYPE_ALL:
+            return self.otherSignatureHash(nInput, scriptPubKeyBytes, hashType)
+        if self.data == None:
+            self.prepareLegacy()
+        if (nInput < 0) or (self.inputsOffset + nInput*self.BLANK_TXIN_SIZE >= self.suffixOffset):
+            raise ValueError("Invalid input index")
+        view = memoryview(self.data)
+        start = self.inputsOffset + nInput*self.BLANK_TXIN_SIZE
+        if nInput < self.prefixInput:
+            h = hashlib.sha256(view[:start])
+        else:
+            self.prefixHash.update(view[self.inputsOffset + self.prefixInput*self.BLANK_TXIN_SIZE:start])
+            self.prefixInput = nInput
+            h = self.prefixHash.copy()
+        #
+        # Previous transaction ID and index, followed by
+        # the public key script instead of the blank
+        #
+        h.update(view[start:start+36])
+        length = bytearray(9)
+        h.update(length[:serialize.packVarInt(length, 0, len(scriptPubKeyBytes))])
+        h.update(scriptPubKeyBytes)
+        #
+        # and then sequence number, the remaining inputs and
+        # everything else
+        #
+        h.update(view[start+37:])
+        return hashlib.sha256(h.digest()).digest()
+
+    #
+    # The legacy signature hash for hash types other than SIGHASH_ALL,
+    # see SignatureHash in interpreter.cpp. With SIGHASH_NONE, no outputs
+    # are signed, with SIGHASH_SINGLE only the output with the same 
+    # index as the input, and in both cases the sequence numbers of
+    # the other inputs are blanked. With SIGHASH_ANYONECANPAY, only
+    # the signed input is included
+    #
+    def otherSignatureHash(self, nInput, scriptPubKeyBytes, hashType):
+        tx = self.tx
+        inputs = tx.getInputs()
+        outputs = tx.getOutputs()
+        if (nInput < 0) or (nInput >= len(inputs)):
+            raise ValueError("Invalid input index")
+        baseType = hashType & 0x1f
+        if (baseType == SIGHASHTYPE_SINGLE) and (nInput >= len(outputs)):
+            #
+            # The reference implementation returns the number 
+            # one in this case
+            #
+            return b'\x01' + bytes(31)
+        writer = serialize.ByteWriter()
+        writer.writeUint32(tx.getVersion())
+        if hashType & SIGHASHTYPE_ANYONECANPAY:
+            indices = [nInput]
+        else:
+            indices = range(len(inputs))
+        writer.writeVarInt(len(indices))
+        for i in indices:
+            txin = inputs[i]
+            writer.writeBytes(txin.prevTxidBytes)
+            writer.writeUint32(txin.getVout())
+            if i == nInput:
+                writer.writeVarInt(len(scriptPubKeyBytes))
+                writer.writeBytes(scriptPubKeyBytes)
+                writer.writeUint32(txin.getSequence())
+            else:
+                writer.writeVarInt(0)
+                if (baseType == SIGHASHTYPE_NONE) or (baseType == SIGHASHTYPE_SINGLE):
+                    writer.writeUint32(0)
+                else:
+                    writer.writeUint32(txin.getSequence())
+        if baseType == SIGHASHTYPE_NONE:
+            writer.writeVarInt(0)
+        elif baseType == SIGHASHTYPE_SINGLE:
+            writer.writeVarInt(nInput + 1)
+            for _ in range(nInput):
+                writer.writeUint64(0xFFFFFFFFFFFFFFFF)
+                writer.writeVarInt(0)
+            outputs[nInput].serializeInto(writer)
+        else:
+            writer.writeVarInt(len(outputs))
+            for txout in outputs:
+                txout.serializeInto(writer)
+        writer.writeUint32(tx.getLocktime())
+        writer.writeUint32(hashType)
+        return utils.hash256(writer.getBytes())
+
+    #
+    # Return the hash that is signed for the input nInput
+    # according to BIP143, given the script code, the
+    # amount of the spent output in satoshi and the hash type.
+    # Depending on the hash type, some of the hashes are 
+    # replaced by zeros
+    #
+    def witnessSignatureHash(self, nInput, scriptCodeBytes, amount, hashType = SIGHASHTYPE_ALL):
+        if self.hashPrevouts == None:
+            self.prepareWitness()
+        if (nInput < 0) or (nInput >= len(self.tx.getInputs())):
+            raise ValueError("Invalid input index")
+        txin = self.tx.getInputs()[nInput]
+        baseType = hashType & 0x1f
+        hashPrevouts = self.hashPrevouts
+        hashSequence = self.hashSequence
+        hashOutputs = self.hashOutputs
+        if hashType & SIGHASHTYPE_ANYONECANPAY:
+            hashPrevouts = bytes(32)
+        if (hashType & SIGHASHTYPE_ANYONECANPAY) or (baseType == SIGHASHTYPE_SINGLE) or (baseType == SIGHASHTYPE_NONE):
+            hashSequence = bytes(32)
+        if baseType == SIGHASHTYPE_SINGLE:
+            hashOutputs = bytes(32)
+            if nInput < len(self.tx.getOutputs()):
+                hashOutputs = utils.hash256(self.tx.getOutputs()[nInput].serializeBytes())
+        elif baseType == SIGHASHTYPE_NONE:
+            hashOutputs = bytes(32)
+        writer = serialize.ByteWriter()
+        writer.writeUint32(self.tx.getVersion())
+        writer.writeBytes(hashPrevouts)
+        writer.writeBytes(hashSequence)
+        writer.writeBytes(txin.prevTxidBytes)
+        writer.writeUint32(txin.getVout())
+        writer.writeVarInt(len(scriptCodeBytes))
+        writer.writeBytes(scriptCodeBytes)
+        writer.writeUint64(amount)
+        writer.writeUint32(txin.getSequence())
+        writer.writeBytes(hashOutputs)
+        writer.writeUint32(self.tx.getLocktime())
+        writer.writeUint32(hashType)
+        return utils.hash256(writer.getBytes())
+
+
+#
+# Get the serialized public key script of an output
+#
+def scriptPubKeyBytes(spentOutput):
+    if spentOutput.scriptPubKeyBytes != None:
+        return spentOutput.scriptPubKeyBytes
+    return bytes.fromhex(spentOutput.getScriptPubKey().serialize())
+
 
 #
 # Build a hash value for a transaction tx which 
 # can be used to sign the input with index nInput
 # The third argument should be the transaction output
-# that is spent with this input
+# that is spent with this input. If the hashes for
+# several inputs of the same transaction are needed,
+# pass a sighashContext for this transaction
 #
-def signatureHash(tx, nInput, spentOutput):
+def signatureHash(tx, nInput, spentOutput, context = None):
     if not isinstance(tx, txn.txn):
         raise  TypeError("Expecting transaction")
     if not isinstance(nInput, int):
         raise TypeError("Expecting integer")
     if not isinstance(spentOutput, txn.txout):
         raise  TypeError("Expecting transaction output")
-    
-    h = serializeForSigning(tx, nInput, spentOutput.getScriptPubKey())
-    return utils.hash256(bytes.fromhex(h))
+    if context == None:
+        context = sighashContext(tx)
+    scriptPubKey = spentOutput.getScriptPubKey()
+    if scriptPubKey.getScriptType() == SCRIPTTYPE_P2WPKH:
+        #
+        # For P2WPKH, BIP143 uses the corresponding P2PKH 
+        # script as script code
+        #
+        scriptCode = script.scriptPubKey(scriptType = SCRIPTTYPE_P2PKH, 
+                                         pubKeyHash = scriptPubKey.getPubKeyHash())
+        return context.witnessSignatureHash(nInput, 
+                                            bytes.fromhex(scriptCode.serialize()),
+                                            spentOutput.getValue())
+    return context.signatureHash(nInput, scriptPubKeyBytes(spentOutput))
+
+
+#
+# The witness of an input spending a P2WPKH output has the 
+# same items as the signature script of an input spending a 
+# P2PKH output, i.e. the signature and the public key. These
+# functions convert between both representations
+#
+def witnessFromScriptSig(scriptSig):
+    raw = bytes.fromhex(scriptSig.serialize())
+    sigLength = raw[0]
+    return [raw[1:1+sigLength], raw[2+sigLength:]]
+
+
+def scriptSigFromWitness(witness):
+    if len(witness) != 2:
+        return None
+    if (len(witness[0]) >= OP_PUSHDATA1) or (len(witness[1]) >= OP_PUSHDATA1):
+        return None
+    raw = bytes([len(witness[0])]) + witness[0] + bytes([len(witness[1])]) + witness[1]
+    _scriptSig = script.scriptSig()
+    _scriptSig.deserialize(raw.hex())
+    if _scriptSig.getScriptType() != SCRIPTTYPE_P2PKH:
+        return None
+    return _scriptSig
     
 
 #
@@ -502,62 +797,343 @@ def signatureHash(tx, nInput, spentOutput):
 # tx - the transaction that we want to verify
 # nInput - the index of the input that we want to verify
 # spentOutput - the output spent by this input
+# context - optionally, a sighashContext for tx
+#
+# Standard inputs (P2PK, P2PKH and P2WPKH) are checked directly,
+# all other inputs are verified by running the scripts with
+# the interpreter
+#
+def verifySignature(tx, nInput, spentOutput, context = None):
+    check = signatureCheck(tx, nInput, spentOutput, context)
+    if check == None:
+        return interpreter.verifyInput(tx, nInput, spentOutput, context)
+    return verifySignatureCheckCached(check)
+
+
+#
+# Same as verifySignatureCheck, but using the signature cache. 
+# If store is False, a successful check is not added to the cache
 #
-def verifySignature(tx, nInput, spentOutput):
+def verifySignatureCheckCached(check, store = True):
+    if SIGNATURE_CACHE.contains(check):
+        return True
+    if not verifySignatureCheck(check):
+        return False
+    if store:
+        SIGNATURE_CACHE.add(check)
+    return True
+
+
+#
+# Collect everything that is needed to verify the signature of a
+# transaction input, i.e. the hash, the signature and the public key. 
+# The result is a tuple (h, r, s, pubKey) of integers and a hex 
+# string that can be passed to verifySignatureCheck, possibly 
+# in a different process. Returns None if the input does not
+# match one of the standard patterns, then it needs to be 
+# verified with the interpreter
+#
+def signatureCheck(tx, nInput, spentOutput, context = None):
     if not isinstance(tx, txn.txn):
         raise  TypeError("Expecting transaction")
     if not isinstance(nInput, int):
         raise TypeError("Expecting integer")
     if not isinstance(spentOutput, txn.txout):
         raise  TypeError("Expecting transaction output")
-
+    scriptType = spentOutput.getScriptPubKey().getScriptType()
+    if scriptType not in STANDARD_SPENDS:
+        return None
     #
     # Determine hash256 and interpret it as a big endian integer (according to the
     # standards, for instance SEC1, section 2.3.7, a hash string is converted to 
     # a number using big endian encoding)
     #
-    h = int.from_bytes(signatureHash(tx, nInput, spentOutput), "big")
+    h = int.from_bytes(signatureHash(tx, nInput, spentOutput, context), "big")
     #
-    # Get signature
+    # Get signature. For P2WPKH, the signature and the 
+    # public key are in the witness and the public key needs
+    # to match the hash in the spent output
     #
     txin = tx.getInputs()[nInput]
-    r = txin.getScriptSig().getSignatureR()
-    s = txin.getScriptSig().getSignatureS()
-    #
-    # Get standard curve and generator
-    #
-    curve = ecdsa.curves.SECP256k1
-    G = curve.generator
-    p = curve.curve.p()
+    if scriptType == SCRIPTTYPE_P2WPKH:
+        if (txin.scriptSigBytes != None) and (len(txin.scriptSigBytes) > 0):
+            return None
+        _scriptSig = scriptSigFromWitness(txin.getWitness())
+        if _scriptSig == None:
+            return None
+    else:
+        _scriptSig = txin.getScriptSig()
+        if (_scriptSig == None) or (txin.hasWitness()):
+            return None
+    if _scriptSig.getScriptType() != STANDARD_SPENDS[scriptType]:
+        return None
+    if _scriptSig.getHashType() != SIGHASHTYPE_ALL:
+        return None
+    r = _scriptSig.getSignatureR()
+    s = _scriptSig.getSignatureS()
     #
-    # Determine the x and y coordinate of the public key
+    # Determine the public key
     #
-    if txin.getScriptSig().getScriptType() == "P2PKH":
-        pubKey = txin.getScriptSig().getPubKeyHex()
+    if _scriptSig.getScriptType() == "P2PKH":
+        pubKey = _scriptSig.getPubKeyHex()
+        pubKeyHash = utils.hash160(bytes.fromhex(pubKey)).hex()
+        if pubKeyHash != spentOutput.getScriptPubKey().getPubKeyHash():
+            return None
     else:
         #
         # use previous output and extract from there
         #
         pubKey = spentOutput.getScriptPubKey().getPubKeyHex()
-    x = int.from_bytes(bytes.fromhex(pubKey[2:66]), 'big')
-    y = ecdsa.numbertheory.square_root_mod_prime((x**3 +7) % p , p)
-    if pubKey[0:2] == "02":
+    return (h, r, s, pubKey)
+
+
+#
+# Do the actual ECDSA verification for a tuple returned
+# by signatureCheck. The public key in the tuple can also
+# be replaced by the decoded point
+#
+def verifySignatureCheck(check):
+    h, r, s, pubKey = check
+    #
+    # Determine the x and y coordinate of the public key, unless
+    # this has already been done by the caller
+    #
+    if isinstance(pubKey, str):
+        try:
+            pubKey = secp256k1.decodePointCached(bytes.fromhex(pubKey))
+        except ValueError:
+            return False
+    return secp256k1.verify(h, r, s, pubKey)
+
+
+#
+# A cache of signature checks that have been successful, so that
+# a transaction which has been verified when it was received does not
+# need to be verified again when it shows up in a block.
+#
+# For each check, we store the SHA256 hash of a random salt, the
+# signature hash, the public key and the signature. The salt is chosen
+# when the cache is created and makes sure that an attacker cannot 
+# predict the entries. 
+#
+# To keep the memory used by the cache at maxBytes, we do not use
+# Python objects per entry (a bytes object and its slots in a 
+# dictionary and a list cost about 150 bytes instead of 32). Instead, 
+# the entries are stored in one anonymous memory map of maxBytes, so
+# that the entries use exactly this amount of memory once the cache 
+# has filled up (and less before). The map is divided into buckets
+# of BUCKET_SIZE slots of 32 bytes each, and an entry can only be
+# stored in the bucket determined by its first bytes. As the entries
+# are hashes, they are distributed evenly across the buckets. If the
+# bucket of a new entry is full, a randomly chosen entry of the bucket
+# is evicted. An empty slot contains zeros only
+#
+class signatureCache:
+
+    __slots__ = ("salt", "buckets", "table", "count", "hits", "misses")
+
+    ENTRY_SIZE = 32
+    BUCKET_SIZE = 4
+    EMPTY = bytes(32)
+
+    def __init__(self, maxBytes = 32*1024*1024):
+        self.salt = os.urandom(32)
+        self.buckets = maxBytes // (signatureCache.ENTRY_SIZE * signatureCache.BUCKET_SIZE)
+        self.table = None
+        if self.buckets > 0:
+            self.table = mmap.mmap(-1, self.buckets * signatureCache.BUCKET_SIZE * signatureCache.ENTRY_SIZE)
+        self.count = 0
+        self.hits = 0
+        self.misses = 0
+
+    #
+    # The entry for a check as returned by signatureCheck
+    #
+    def entry(self, check):
+        h, r, s, pubKey = check
+        data = (self.salt + h.to_bytes(32, "big") + bytes.fromhex(pubKey) 
+                + r.to_bytes(32, "big") + s.to_bytes(32, "big"))
+        return hashlib.sha256(data).digest()
+
+    #
+    # The offset of the bucket for the entry e
+    #
+    def bucket(self, e):
+        return (int.from_bytes(e[:8], "little") % self.buckets) * signatureCache.ENTRY_SIZE * signatureCache.BUCKET_SIZE
+
+    #
+    # Return the offset of the slot in the bucket of e that contains
+    # the given value, or -1 if there is no such slot
+    #
+    def find(self, e, value):
+        size = signatureCache.ENTRY_SIZE
+        start = self.bucket(e)
+        for offset in range(start, start + size * signatureCache.BUCKET_SIZE, size):
+            if self.table[offset:offset + size] == value:
+                return offset
+        return -1
+
+    #
+    # Return True if the check has been successful before
+    #
+    def contains(self, check):
+        found = False
+        if self.table != None:
+            try:
+                e = self.entry(check)
+                found = self.find(e, e) >= 0
+            except (ValueError, OverflowError):
+                found = False
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    #
+    # Add a successful check
+    #
+    def add(self, check):
+        if self.table == None:
+            return
+        e = self.entry(check)
+        if self.find(e, e) >= 0:
+            return
+        offset = self.find(e, signatureCache.EMPTY)
+        if offset < 0:
+            offset = self.bucket(e) + random.randrange(signatureCache.BUCKET_SIZE) * signatureCache.ENTRY_SIZE
+        else:
+            self.count += 1
+        self.table[offset:offset + signatureCache.ENTRY_SIZE] = e
+
+    def __len__(self):
+        return self.count
+
+    def getMaxBytes(self):
+        return self.buckets * signatureCache.BUCKET_SIZE * signatureCache.ENTRY_SIZE
+
+
+SIGNATURE_CACHE = signatureCache()
+
+#
+# Clear the signature cache and limit its memory to maxBytes
+#
+def resetSignatureCache(maxBytes = 32*1024*1024):
+    global SIGNATURE_CACHE
+    SIGNATURE_CACHE = signatureCache(maxBytes)
+
+#
+# The types of spent outputs that we can sign
+#
+SIGNABLE_SCRIPTTYPES = (SCRIPTTYPE_P2PKH, SCRIPTTYPE_P2PK, SCRIPTTYPE_P2WPKH)
+
+
+#
+# Determine the hashes (as integers) that need to be signed to 
+# spend the outputs txos with the inputs of the transaction 
+# txn. Raises a ValueError if we cannot sign one of the outputs
+#
+def signingHashes(txn, txos):
+    for spentOutput in txos[:len(txn.getInputs())]:
+        if spentOutput.getScriptPubKey().getScriptType() not in SIGNABLE_SCRIPTTYPES:
+            raise ValueError("Cannot sign this type of script")
+    #
+    # The hashes that we sign do not depend on the 
+    # signature scripts, so we can use the same context
+    # for all inputs
+    #
+    context = script.sighashContext(txn)
+    return [int.from_bytes(script.signatureHash(txn, nInput, txos[nInput], context), "big") 
+            for nInput in range(len(txn.getInputs()))]
+
+
+#
+# Determine the public keys in compressed hex format for a list
+# of private keys. If the same key appears more than once, it
+# is only derived once
+#
+def publicKeys(privateKeys):
+    distinct = list(dict.fromkeys(privateKeys))
+    pubKeys = dict(zip(distinct, keys.ecPublicKeysHex(distinct)))
+    return [pubKeys[secret] for secret in privateKeys]
+
+
+#
+# Determine the nonces for signing a list of hashes with the
+# corresponding private keys. If rng is None, the nonces are
+# derived deterministically from the key and the hash according 
+# to RFC 6979, otherwise they are drawn from rng
+#
+def signingNonces(hashes, privateKeys, rng = None):
+    if rng != None:
+        return [rng.randrange(1, secp256k1.N) for _ in hashes]
+    generators = {}
+    nonces = []
+    for h, secret in zip(hashes, privateKeys):
+        if secret not in generators:
+            generators[secret] = secp256k1.nonceGenerator(secret)
+        nonces.append(generators[secret].nonce(h))
+    return nonces
+
+
+#
+# Sign the hash h (as an integer) with the private key secret
+# using the nonce k and return the signature (r, s)
+#
+def signHash(h, secret, k):
+    n = secp256k1.N
+    r, s = secp256k1.sign(h, secret, k)
+    #
+    # Bitcoin expects that the s value is at most half of the order n,
+    # see interpreter.cpp/IsLowDERSignature
+    #
+    if s > n // 2:
+        s = n - s
+    return r, s
+
+
+#
+# Add a signature (r, s) and the public key to a transaction input 
+# which spends the output spentOutput
+#
+def setSignature(txin, spentOutput, r, s, pubKeyHex):
+    #
+    # Create the scriptSig. We need to match its type according
+    # to the type of the output
+    #
+    outputScriptType = spentOutput.getScriptPubKey().getScriptType()
+    if outputScriptType == script.SCRIPTTYPE_P2WPKH:
         #
-        # y should be even
-        # 
-        if 1 == (y % 2):
-            y = (p - y) % p
-    else:
+        # For P2WPKH, the signature script is empty and the
+        # signature goes into the witness
         #
-        # y should be odd
-        # 
-        if 0 == (y % 2):
-            y = (p - y) % p
-    assert(curve.curve.contains_point(x, y))
-    Q = ecdsa.ellipticcurve.Point(curve.curve, x, y)
-    pKey = ecdsa.ecdsa.Public_key(G, Q)
-    signature = ecdsa.ecdsa.Signature(r,s)
-    return pKey.verifies(h, signature)
+        scriptSig = script.scriptSig(scriptType = script.SCRIPTTYPE_P2PKH,
+                                 r = r,
+                                 s = s,
+                                 pubKeyHex = pubKeyHex,
+                                 hashType = 1)
+        txin.setScriptSig(script.scriptSig())
+        txin.setWitness(witnessFromScriptSig(scriptSig))
+        return
+    if outputScriptType == script.SCRIPTTYPE_P2PKH:
+        scriptSig = script.scriptSig(scriptType = script.SCRIPTTYPE_P2PKH,
+                                 r = r,
+                                 s = s,
+                                 pubKeyHex = pubKeyHex,
+                                 hashType = 1)
+    elif outputScriptType == script.SCRIPTTYPE_P2PK:
+        scriptSig = script.scriptSig(scriptType = script.SCRIPTTYPE_P2PK,
+                                 r = r,
+                                 s = s,
+                                 pubKeyHex = None,
+                                 hashType = 1)
+    else:
+        raise ValueError("Cannot sign this type of script")
+    #
+    # Finally plug this scriptSig into the input
+    #
+    txin.setScriptSig(scriptSig)
+
 
 #
 # Sign a transaction. Given the transaction txn,
@@ -565,68 +1141,21 @@ def verifySignature(tx, nInput, spentOutput):
 # a list of corresponding private keys, this function
 # will sign the transaction inputs of txn and add the
 # corresponding signature script to the transaction 
-# which is then returned.
+# which is then returned. By default, the nonces are 
+# deterministic (RFC 6979), so that signing the same 
+# transaction twice gives the same result. If rng is given
+# (for instance random.SystemRandom()), random nonces are 
+# drawn from it instead. To sign many inputs in parallel, 
+# use btc.signing.signTransaction
 #
-def signTransaction(txn, txos, privateKeys):
-    #
-    # Get standard curve and generator
-    #
-    curve = ecdsa.curves.SECP256k1
-    G = curve.generator
-    p = curve.curve.p()
-    n = G.order()
-    #
-    # Now go through all the inputs and sign them
-    #
+def signTransaction(txn, txos, privateKeys, rng = None):
+    hashes = signingHashes(txn, txos)
+    pubKeys = publicKeys(privateKeys[:len(hashes)])
+    nonces = signingNonces(hashes, privateKeys, rng)
     nInput = 0
     for txin in txn.getInputs():
-        #
-        # Get the hash that we will sign
-        #
-        spentOutput = txos[nInput]
-        h = int.from_bytes(script.signatureHash(txn, nInput, spentOutput), "big")
-        #
-        # Get the matching private key - we need a hex representation
-        #
-        secret = privateKeys[nInput]
-        pubkey = ecdsa.ecdsa.Public_key(G, G * secret)
-        pubKeyHex = keys.ecPointCompressHex(pubkey.point.x(), pubkey.point.y())
-        # 
-        # Sign using the ECDSA library 
-        #
-        privkey = ecdsa.ecdsa.Private_key(pubkey, secret)
-        signature = privkey.sign(h, random.SystemRandom().randrange( 1, n ))
-        #
-        # Bitcoin expects that the s value is at most half of the order n,
-        # see interpreter.cpp/IsLowDERSignature
-        #
-        if signature.s > n // 2:
-            signature.s = n - signature.s
-        #
-        # Now create the scriptSig. We need to match its type according
-        # to the type of the output
-        #
-        outputScriptType = spentOutput.getScriptPubKey().getScriptType()
-        if outputScriptType == script.SCRIPTTYPE_P2PKH:
-            scriptSig = script.scriptSig(scriptType = script.SCRIPTTYPE_P2PKH,
-                                     r = signature.r,
-                                     s = signature.s,
-                                     pubKeyHex = pubKeyHex,
-                                     hashType = 1)
-        elif outputScriptType == script.SCRIPTTYPE_P2PK:
-            scriptSig = script.scriptSig(scriptType = script.SCRIPTTYPE_P2PK,
-                                     r = signature.r,
-                                     s = signature.s,
-                                     pubKeyHex = None,
-                                     hashType = 1)
-        else:
-            raise ValueError("Cannot sign this type of script")
-        #
-        # Finally plug this scriptSig into the input
-        #
-        txin.scriptSig = scriptSig
-        txin.scriptSigHex = scriptSig.serialize()
+        r, s = signHash(hashes[nInput], privateKeys[nInput], nonces[nInput])
+        setSignature(txin, txos[nInput], r, s, pubKeys[nInput])
         nInput += 1
-        
     return txn
 
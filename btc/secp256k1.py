@@ -0,0 +1,821 @@
+####################################################
+# 
+# Arithmetic on the elliptic curve secp256k1
+#
+# MIT license
+#
+# Copyright (c) 2018 christianb93
+# Permission is hereby granted, free of charge, to 
+# any person obtaining a copy of this software and 
+# associated documentation files (the "Software"), 
+# to deal in the Software without restriction, 
+# including without limitation the rights to use, 
+# copy, modify, merge, publish, distribute, 
+# sublicense, and/or sell copies of the Software, 
+# and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice 
+# shall be included in all copies or substantial 
+# portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY 
+# OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT 
+# LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. 
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS 
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, 
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, 
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE 
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+####################################################
+
+import functools
+import hashlib
+import hmac
+import mmap
+import os
+import tempfile
+
+#
+# The curve is y**2 = x**3 + 7 over the field with P elements, 
+# see SEC2, section 2.4.1. Points in affine coordinates are 
+# represented as tuples (x, y) of integers, the point at 
+# infinity as None.
+#
+# Internally, we use Jacobian coordinates (X, Y, Z) which 
+# represent the affine point (X / Z**2, Y / Z**3). This allows
+# us to add and double points without a modular inversion,
+# only one inversion is needed at the end to convert back to
+# affine coordinates. The point at infinity is any triple with 
+# Z = 0
+#
+P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+B = 7
+GX = 0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798
+GY = 0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8
+G = (GX, GY)
+
+INFINITY = (1, 1, 0)
+
+#
+# Width of the window used for the NAF representation
+#
+WINDOW = 5
+
+
+#
+# Compute the inverse of x modulo m
+#
+def invert(x, m = P):
+    return pow(x, -1, m)
+
+
+#
+# Invert all numbers in a list modulo m with only one modular
+# inversion (Montgomery's trick). We compute the products
+# c[i] = x[0]*...*x[i], invert c[n-1] and then walk back, using 
+# that 1/x[i] = c[i-1]/c[i] and 1/c[i-1] = x[i]/c[i]. This needs 
+# 3(n-1) multiplications. Zeros have no inverse and are returned 
+# as zeros
+#
+def batchInvert(values, m = P):
+    products = []
+    c = 1
+    for x in values:
+        if x % m:
+            c = c*x % m
+        products.append(c)
+    inverses = [0]*len(values)
+    if len(values) == 0:
+        return inverses
+    cinv = invert(c, m)
+    for i in reversed(range(len(values))):
+        x = values[i]
+        if x % m == 0:
+            continue
+        if i > 0:
+            inverses[i] = cinv*products[i - 1] % m
+            cinv = cinv*x % m
+        else:
+            inverses[i] = cinv
+    return inverses
+
+
+#
+# Check whether an affine point is on the curve
+#
+def isOnCurve(point):
+    if point == None:
+        return True
+    x, y = point
+    return (y*y - x*x*x - B) % P == 0
+
+
+#
+# Convert between affine and Jacobian coordinates
+#
+def toJacobian(point):
+    if point == None:
+        return INFINITY
+    return (point[0], point[1], 1)
+
+
+def fromJacobian(point):
+    X, Y, Z = point
+    if Z == 0:
+        return None
+    zinv = invert(Z)
+    zinv2 = zinv*zinv % P
+    return (X*zinv2 % P, Y*zinv2*zinv % P)
+
+
+#
+# Convert a list of points from Jacobian to affine coordinates 
+# with one inversion for all points
+#
+def batchFromJacobian(points):
+    zinvs = batchInvert([Z for X, Y, Z in points])
+    affine = []
+    for (X, Y, Z), zinv in zip(points, zinvs):
+        if Z == 0:
+            affine.append(None)
+        else:
+            zinv2 = zinv*zinv % P
+            affine.append((X*zinv2 % P, Y*zinv2*zinv % P))
+    return affine
+
+
+#
+# Double a point in Jacobian coordinates (dbl-2009-l, 
+# using that the curve parameter a is zero)
+#
+def jacobianDouble(point):
+    X1, Y1, Z1 = point
+    if (Z1 == 0) or (Y1 == 0):
+        return INFINITY
+    YY = Y1*Y1 % P
+    S = 4*X1*YY % P
+    M = 3*X1*X1 % P
+    X3 = (M*M - 2*S) % P
+    Y3 = (M*(S - X3) - 8*YY*YY) % P
+    Z3 = 2*Y1*Z1 % P
+    return (X3, Y3, Z3)
+
+
+#
+# Add two points in Jacobian coordinates (add-2007-bl)
+#
+def jacobianAdd(p1, p2):
+    X1, Y1, Z1 = p1
+    X2, Y2, Z2 = p2
+    if Z1 == 0:
+        return p2
+    if Z2 == 0:
+        return p1
+    Z1Z1 = Z1*Z1 % P
+    Z2Z2 = Z2*Z2 % P
+    U1 = X1*Z2Z2 % P
+    U2 = X2*Z1Z1 % P
+    S1 = Y1*Z2*Z2Z2 % P
+    S2 = Y2*Z1*Z1Z1 % P
+    if U1 == U2:
+        if S1 != S2:
+            return INFINITY
+        return jacobianDouble(p1)
+    H = U2 - U1
+    R = S2 - S1
+    HH = H*H % P
+    HHH = H*HH % P
+    V = U1*HH % P
+    X3 = (R*R - HHH - 2*V) % P
+    Y3 = (R*(V - X3) - S1*HHH) % P
+    Z3 = Z1*Z2*H % P
+    return (X3, Y3, Z3)
+
+
+#
+# Add a point in Jacobian coordinates and a point in affine
+# coordinates (madd). This saves a few multiplications 
+# compared to jacobianAdd as the second point has Z = 1
+#
+def jacobianAddAffine(p1, p2):
+    X1, Y1, Z1 = p1
+    if Z1 == 0:
+        return toJacobian(p2)
+    x2, y2 = p2
+    Z1Z1 = Z1*Z1 % P
+    U2 = x2*Z1Z1 % P
+    S2 = y2*Z1*Z1Z1 % P
+    if X1 == U2:
+        if Y1 != S2:
+            return INFINITY
+        return jacobianDouble(p1)
+    H = U2 - X1
+    R = S2 - Y1
+    HH = H*H % P
+    HHH = H*HH % P
+    V = X1*HH % P
+    X3 = (R*R - HHH - 2*V) % P
+    Y3 = (R*(V - X3) - Y1*HHH) % P
+    Z3 = Z1*H % P
+    return (X3, Y3, Z3)
+
+
+#
+# Negate an affine point
+#
+def negate(point):
+    if point == None:
+        return None
+    return (point[0], P - point[1])
+
+
+#
+# Add two affine points
+#
+def add(p1, p2):
+    return fromJacobian(jacobianAdd(toJacobian(p1), toJacobian(p2)))
+
+
+#
+# Determine the width-w non-adjacent form of k, i.e. a list of
+# digits d, least significant first, such that k = sum d[i]*2**i,
+# every non-zero digit is odd and smaller than 2**(w-1) in absolute
+# value and any w consecutive digits contain at most one non-zero 
+# digit
+#
+def wnaf(k, w = WINDOW):
+    digits = []
+    modulus = 1 << w
+    half = 1 << (w - 1)
+    while k > 0:
+        if k & 1:
+            d = k & (modulus - 1)
+            if d >= half:
+                d -= modulus
+            k -= d
+        else:
+            d = 0
+        digits.append(d)
+        k >>= 1
+    return digits
+
+
+#
+# Return the odd multiples P, 3P, 5P, ..., (2**(w-1) - 1)P
+# of an affine point in affine coordinates
+#
+def oddMultiples(point, w = WINDOW):
+    return batchOddMultiples([point], w)[0]
+
+
+#
+# Return the tables of odd multiples for a list of points,
+# using one inversion for all tables
+#
+def batchOddMultiples(points, w = WINDOW):
+    multiples = []
+    for point in points:
+        double = jacobianDouble(toJacobian(point))
+        current = toJacobian(point)
+        for _ in range((1 << (w - 2)) - 1):
+            current = jacobianAdd(current, double)
+            multiples.append(current)
+    multiples = batchFromJacobian(multiples)
+    size = (1 << (w - 2)) - 1
+    return [[points[i]] + multiples[i*size:(i + 1)*size] for i in range(len(points))]
+
+
+#
+# The curve has an efficiently computable endomorphism 
+# (x, y) -> (BETA*x, y), which is multiplication by LAMBDA. 
+# Any scalar k can be written as k = k1 + k2*LAMBDA mod N with
+# k1 and k2 of about 128 bits, so that k*P = k1*P + k2*(LAMBDA*P)
+# can be computed as a joint multiplication with half the number
+# of doublings (GLV method, see "Guide to Elliptic Curve 
+# Cryptography", section 3.5). A1, B1, A2, B2 are short vectors 
+# (a, b) with a + b*LAMBDA = 0 mod N used for this decomposition
+#
+BETA = 0x7AE96A2B657C07106E64479EAC3434E99CF0497512F58995C1396C28719501EE
+LAMBDA = 0x5363AD4CC05C30E0A5261C028812645A122E22EA20816678DF02967C1B23BD72
+A1 = 0x3086D221A7D46BCDE86C90E49284EB15
+B1 = -0xE4437ED6010E88286F547FA90ABFE4C3
+A2 = 0x114CA50F7A8E2F3F657C1108D9D44CFD8
+B2 = A1
+
+
+#
+# Apply the endomorphism to an affine point
+#
+def endomorphism(point):
+    if point == None:
+        return None
+    return (BETA*point[0] % P, point[1])
+
+
+#
+# Split a scalar 0 <= k < N into (k1, k2) with k = k1 + k2*LAMBDA mod N.
+# Note that k1 and k2 can be negative
+#
+def glvSplit(k):
+    c1 = (B2*k + N // 2) // N
+    c2 = (-B1*k + N // 2) // N
+    k1 = k - c1*A1 - c2*A2
+    k2 = -c1*B1 - c2*B2
+    return k1, k2
+
+
+#
+# The odd multiples of the generator are needed for every
+# signature and every verification, so we compute them
+# only once
+#
+G_TABLE = None
+
+def generatorTable():
+    global G_TABLE
+    if G_TABLE == None:
+        G_TABLE = oddMultiples(G, WINDOW)
+    return G_TABLE
+
+
+#
+# Multiply an affine point by a scalar k and return the result 
+# in Jacobian coordinates. Multiples of the generator are taken 
+# from the fixed-base table unless fixedBase is False
+#
+def jacobianMultiply(k, point, w = WINDOW, glv = True, fixedBase = True):
+    if fixedBase and (point == G):
+        return getFixedBaseTable().jacobianMultiply(k)
+    return jacobianMultiplySum([(k, point)], w, glv)
+
+
+#
+# A table of multiples of the generator for fixed-base 
+# multiplication. We split a scalar k into 32 bytes 
+# k = sum k[i]*2**(8*i) and store all points j*2**(8*i)*G for 
+# j = 1..255, so that k*G is the sum of 32 points from the 
+# table and no doubling is needed
+#
+# The points are stored in affine coordinates as 64 bytes (x and 
+# y in big endian) in a bytes-like object. This can be the content 
+# of a file which is memory mapped, so that several processes 
+# can share the same table. In the file, the table is followed by 
+# its SHA256 hash, so that a truncated or damaged file is detected 
+# when it is loaded
+#
+FIXED_BASE_BITS = 8
+FIXED_BASE_WINDOWS = 256 // FIXED_BASE_BITS
+FIXED_BASE_ENTRIES = (1 << FIXED_BASE_BITS) - 1
+FIXED_BASE_SIZE = 64*FIXED_BASE_WINDOWS*FIXED_BASE_ENTRIES
+FIXED_BASE_FILE_SIZE = FIXED_BASE_SIZE + 32
+
+class fixedBaseTable:
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        if len(data) != FIXED_BASE_SIZE:
+            raise ValueError("Table has wrong size")
+        self.data = data
+        self.check()
+
+    #
+    # Spot-check the table. The first entry needs to be the generator,
+    # and for each window, the last entry plus the first entry is 256 
+    # times the first entry, which in turn is the first entry of the
+    # next window. This catches most errors, but not all, so a table
+    # loaded from a file is also checked against its hash
+    #
+    def check(self):
+        if self.getPoint(0, 1) != G:
+            raise ValueError("Table does not start with the generator")
+        for i in range(FIXED_BASE_WINDOWS):
+            base = self.getPoint(i, 1)
+            last = self.getPoint(i, FIXED_BASE_ENTRIES)
+            if not (isOnCurve(base) and isOnCurve(last)):
+                raise ValueError("Point in table is not on the curve")
+            expected = toJacobian(base)
+            for _ in range(FIXED_BASE_BITS):
+                expected = jacobianDouble(expected)
+            expected = fromJacobian(expected)
+            if fromJacobian(jacobianAddAffine(toJacobian(last), base)) != expected:
+                raise ValueError("Last entry of window %d is wrong" % i)
+            if (i + 1 < FIXED_BASE_WINDOWS) and (self.getPoint(i + 1, 1) != expected):
+                raise ValueError("First entry of window %d is wrong" % (i + 1))
+
+    #
+    # Build the table
+    #
+    @classmethod
+    def build(cls):
+        data = bytearray(FIXED_BASE_SIZE)
+        offset = 0
+        base = toJacobian(G)
+        for i in range(FIXED_BASE_WINDOWS):
+            current = base
+            window = []
+            for j in range(FIXED_BASE_ENTRIES):
+                window.append(current)
+                current = jacobianAdd(current, base)
+            for x, y in batchFromJacobian(window):
+                data[offset:offset + 32] = x.to_bytes(32, "big")
+                data[offset + 32:offset + 64] = y.to_bytes(32, "big")
+                offset += 64
+            #
+            # current is now 256 times the base of this window,
+            # which is the base of the next window
+            #
+            base = current
+        return cls(bytes(data))
+
+    #
+    # Map a table that has been saved to a file into memory
+    #
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as f:
+            if os.fstat(f.fileno()).st_size != FIXED_BASE_FILE_SIZE:
+                raise ValueError("Table file has wrong size")
+            data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        view = memoryview(data)[:FIXED_BASE_SIZE]
+        if hashlib.sha256(view).digest() != data[FIXED_BASE_SIZE:]:
+            view.release()
+            data.close()
+            raise ValueError("Table file is damaged")
+        return cls(view)
+
+    #
+    # Write the table, followed by its hash, to a file. We write to 
+    # a temporary file in the same directory first and then rename it,
+    # so that other processes never see a partially written table
+    #
+    def save(self, filename):
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, tmp = tempfile.mkstemp(dir = directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.data)
+                f.write(hashlib.sha256(self.data).digest())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, filename)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    #
+    # Get the point j*2**(8*i)*G
+    #
+    def getPoint(self, i, j):
+        offset = 64*(i*FIXED_BASE_ENTRIES + j - 1)
+        return (int.from_bytes(self.data[offset:offset + 32], "big"), 
+                int.from_bytes(self.data[offset + 32:offset + 64], "big"))
+
+    #
+    # Multiply the generator by k and return the result in 
+    # Jacobian coordinates
+    #
+    def jacobianMultiply(self, k):
+        k = k % N
+        result = INFINITY
+        i = 0
+        while k:
+            j = k & FIXED_BASE_ENTRIES
+            if j:
+                result = jacobianAddAffine(result, self.getPoint(i, j))
+            k >>= FIXED_BASE_BITS
+            i += 1
+        return result
+
+
+FIXED_BASE_TABLE = None
+
+#
+# The file from which FIXED_BASE_TABLE has been mapped, if any.
+# Worker processes started by btc.pool map the same file
+#
+FIXED_BASE_TABLE_FILE = None
+
+#
+# Get the fixed-base table, building it if this has not 
+# yet been done
+#
+def getFixedBaseTable():
+    global FIXED_BASE_TABLE
+    if FIXED_BASE_TABLE == None:
+        FIXED_BASE_TABLE = fixedBaseTable.build()
+    return FIXED_BASE_TABLE
+
+
+#
+# Use the fixed-base table stored in a file. If the file
+# does not exist or is damaged, build the table and save it 
+# first. If the file cannot be written, we fall back to the
+# table in memory. Call this at startup (before creating any 
+# worker processes) to avoid building the table in each process
+#
+def loadFixedBaseTable(filename):
+    global FIXED_BASE_TABLE, FIXED_BASE_TABLE_FILE
+    try:
+        table = fixedBaseTable.load(filename)
+    except (OSError, ValueError):
+        try:
+            getFixedBaseTable().save(filename)
+            table = fixedBaseTable.load(filename)
+        except OSError:
+            return getFixedBaseTable()
+    FIXED_BASE_TABLE = table
+    FIXED_BASE_TABLE_FILE = filename
+    return FIXED_BASE_TABLE
+
+
+#
+# Compute k1*P1 + k2*P2 + ... for a list of pairs (k, P) and return 
+# the result in Jacobian coordinates. Instead of multiplying each 
+# point separately, we walk through the wNAF representations of all
+# scalars at the same time (Strauss-Shamir), so that the doublings 
+# are shared. If glv is True, each term is first split into two terms
+# with scalars of half the length using the endomorphism. The tables
+# of odd multiples of the points can be passed as oddTables, for 
+# instance when they have been computed with batchOddMultiples
+#
+def jacobianMultiplySum(terms, w = WINDOW, glv = True, oddTables = None):
+    digits = []
+    tables = []
+    for n in range(len(terms)):
+        k, point = terms[n]
+        k = k % N
+        if (k == 0) or (point == None):
+            continue
+        if oddTables != None:
+            table = oddTables[n]
+        elif (point == G) and (w == WINDOW):
+            table = generatorTable()
+        else:
+            table = oddMultiples(point, w)
+        if glv:
+            #
+            # The odd multiples of LAMBDA*P are the images of the 
+            # odd multiples of P under the endomorphism
+            #
+            k1, k2 = glvSplit(k)
+            parts = [(k1, table), (k2, [endomorphism(_) for _ in table])]
+        else:
+            parts = [(k, table)]
+        for _k, _table in parts:
+            if _k == 0:
+                continue
+            negTable = [negate(_) for _ in _table]
+            if _k < 0:
+                _k = -_k
+                _table, negTable = negTable, _table
+            digits.append(wnaf(_k, w))
+            tables.append((_table, negTable))
+    if len(digits) == 0:
+        return INFINITY
+    result = INFINITY
+    for i in reversed(range(max(len(_) for _ in digits))):
+        result = jacobianDouble(result)
+        for j in range(len(digits)):
+            if i < len(digits[j]):
+                d = digits[j][i]
+                if d > 0:
+                    result = jacobianAddAffine(result, tables[j][0][d >> 1])
+                elif d < 0:
+                    result = jacobianAddAffine(result, tables[j][1][(-d) >> 1])
+    return result
+
+
+#
+# Multiply an affine point by a scalar and return an
+# affine point
+#
+def multiply(k, point = G, glv = True, fixedBase = True):
+    return fromJacobian(jacobianMultiply(k, point, glv = glv, fixedBase = fixedBase))
+
+
+#
+# Multiply an affine point by each scalar in a list, for instance
+# to derive the public keys for many private keys. The results 
+# are converted to affine points with a single inversion
+#
+def batchMultiply(scalars, point = G, glv = True, fixedBase = True):
+    return batchFromJacobian([jacobianMultiply(k, point, glv = glv, fixedBase = fixedBase) 
+                              for k in scalars])
+
+
+#
+# Convert a public key, given as bytes in compressed (33 bytes) or
+# uncompressed (65 bytes) SEC1 format, into an affine point
+#
+def decodePoint(b):
+    if (len(b) == 33) and ((b[0] == 0x02) or (b[0] == 0x03)):
+        x = int.from_bytes(b[1:], "big")
+        if x >= P:
+            raise ValueError("Invalid x coordinate")
+        #
+        # As P = 3 mod 4, a square root of a is a**((P+1)/4)
+        #
+        y2 = (x*x*x + B) % P
+        y = pow(y2, (P + 1) // 4, P)
+        if y*y % P != y2:
+            raise ValueError("Point not on curve")
+        if (y & 1) != (b[0] & 1):
+            y = P - y
+        return (x, y)
+    if (len(b) == 65) and (b[0] == 0x04):
+        point = (int.from_bytes(b[1:33], "big"), int.from_bytes(b[33:], "big"))
+        #
+        # The coordinates need to be field elements, as otherwise
+        # the same point would have several encodings
+        #
+        if (point[0] >= P) or (point[1] >= P):
+            raise ValueError("Coordinate out of range")
+        if not isOnCurve(point):
+            raise ValueError("Point not on curve")
+        return point
+    raise ValueError("Invalid encoding of point")
+
+
+#
+# Decoding a compressed public key requires a square root, i.e. a
+# modular exponentiation. As the same keys tend to show up again 
+# and again, we keep the most recently used decoded keys in a cache
+#
+PUBKEY_CACHE_SIZE = 4096
+
+PUBKEY_CACHE = functools.lru_cache(maxsize = PUBKEY_CACHE_SIZE)(decodePoint)
+
+#
+# Same as decodePoint, but using the cache
+#
+def decodePointCached(b):
+    return PUBKEY_CACHE(bytes(b))
+
+
+#
+# Decode a list of public keys, for instance all keys used in 
+# a block, at once. Every distinct key is only decoded once. 
+# Invalid keys are returned as None
+#
+def decodePoints(keys):
+    points = {}
+    for b in keys:
+        b = bytes(b)
+        if b not in points:
+            try:
+                points[b] = PUBKEY_CACHE(b)
+            except ValueError:
+                points[b] = None
+    return [points[bytes(b)] for b in keys]
+
+
+#
+# Get the statistics of the cache as a named tuple with
+# the fields hits, misses, maxsize and currsize
+#
+def pubKeyCacheInfo():
+    return PUBKEY_CACHE.cache_info()
+
+
+#
+# Clear the cache and resize it
+#
+def resetPubKeyCache(size = PUBKEY_CACHE_SIZE):
+    global PUBKEY_CACHE
+    PUBKEY_CACHE = functools.lru_cache(maxsize = size)(decodePoint)
+
+
+#
+# Convert an affine point into SEC1 format
+#
+def encodePoint(point, compressed = True):
+    x, y = point
+    if compressed:
+        return bytes([2 + (y & 1)]) + x.to_bytes(32, "big")
+    return b'\x04' + x.to_bytes(32, "big") + y.to_bytes(32, "big")
+
+
+#
+# Deterministic nonces according to RFC 6979, section 3.2, with 
+# HMAC-SHA256. The nonce is derived from the private key x and the 
+# hash h1 using HMAC_DRBG. The first step computes 
+# K = HMAC_K(V || 0x00 || x || h1) with the initial values 
+# K = 0x00...00 and V = 0x01...01, so that everything up to x is the
+# same for all hashes signed with one key. We feed this into an HMAC 
+# object once per key and copy it for each hash
+#
+class nonceGenerator:
+
+    __slots__ = ("x", "prefix")
+
+    def __init__(self, secret):
+        if (secret <= 0) or (secret >= N):
+            raise ValueError("Private key out of range")
+        self.x = secret.to_bytes(32, "big")
+        self.prefix = hmac.new(bytes(32), b'\x01'*32 + b'\x00' + self.x, hashlib.sha256)
+
+    #
+    # Get the nonce for the hash h (as an integer). As the hash
+    # has as many bits as N, bits2octets is a reduction mod N
+    #
+    def nonce(self, h):
+        h1 = (h % N).to_bytes(32, "big")
+        mac = self.prefix.copy()
+        mac.update(h1)
+        K = mac.digest()
+        V = hmac.digest(K, b'\x01'*32, "sha256")
+        K = hmac.digest(K, V + b'\x01' + self.x + h1, "sha256")
+        V = hmac.digest(K, V, "sha256")
+        while True:
+            V = hmac.digest(K, V, "sha256")
+            k = int.from_bytes(V, "big")
+            if (k >= 1) and (k < N):
+                return k
+            K = hmac.digest(K, V + b'\x00', "sha256")
+            V = hmac.digest(K, V, "sha256")
+
+
+#
+# Create an ECDSA signature (r, s) for the hash h (as an integer)
+# with the private key secret, using the nonce k. See SEC1, 
+# section 4.1.3
+#
+def sign(h, secret, k):
+    if (k <= 0) or (k >= N):
+        raise ValueError("Nonce out of range")
+    R = multiply(k, G)
+    r = R[0] % N
+    if r == 0:
+        raise ValueError("Invalid nonce")
+    s = invert(k, N)*(h + r*secret) % N
+    if s == 0:
+        raise ValueError("Invalid nonce")
+    return r, s
+
+
+#
+# Verify an ECDSA signature (r, s) for the hash h (as an integer)
+# and the public key Q (an affine point). See SEC1, section 4.1.4
+#
+def verify(h, r, s, Q, glv = True):
+    if (r < 1) or (r >= N) or (s < 1) or (s >= N):
+        return False
+    w = invert(s, N)
+    u1 = h*w % N
+    u2 = r*w % N
+    return matchesR(jacobianMultiplySum([(u1, G), (u2, Q)], glv = glv), r)
+
+
+#
+# Verify a list of signatures, given as tuples (h, r, s, Q), and 
+# return a list of booleans. The inverses of all s and the tables
+# of odd multiples of all public keys are computed with one inversion
+# each, so that no inversion per signature is needed
+#
+def batchVerify(signatures, glv = True):
+    results = [False]*len(signatures)
+    valid = [i for i in range(len(signatures)) 
+             if (1 <= signatures[i][1] < N) and (1 <= signatures[i][2] < N)]
+    ws = batchInvert([signatures[i][2] for i in valid], N)
+    #
+    # Compute the table of odd multiples only once for
+    # each distinct public key
+    #
+    keys = {}
+    for i in valid:
+        keys.setdefault(signatures[i][3], len(keys))
+    keyTables = batchOddMultiples(list(keys))
+    for i, w in zip(valid, ws):
+        h, r, s, Q = signatures[i]
+        u1 = h*w % N
+        u2 = r*w % N
+        R = jacobianMultiplySum([(u1, G), (u2, Q)], glv = glv, 
+                                oddTables = [generatorTable(), keyTables[keys[Q]]])
+        results[i] = matchesR(R, r)
+    return results
+
+
+#
+# Check whether the x coordinate of the point R, given in
+# Jacobian coordinates, is r modulo N
+#
+def matchesR(R, r):
+    X, Y, Z = R
+    if Z == 0:
+        return False
+    #
+    # Instead of converting back to affine coordinates, we
+    # check whether X = x*Z**2 for x = r or (if this is
+    # smaller than P) x = r + N
+    #
+    ZZ = Z*Z % P
+    if X == r*ZZ % P:
+        return True
+    if (r + N < P) and (X == (r + N)*ZZ % P):
+        return True
+    return False
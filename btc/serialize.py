@@ -33,6 +33,413 @@
 ####################################################
 
 import binascii
+import struct
+
+
+####################################################
+# Precompiled codecs for the fixed width integers
+# and the 80 byte block header. All numbers are 
+# little endian
+####################################################
+
+UINT8 = struct.Struct("<B")
+UINT16 = struct.Struct("<H")
+UINT32 = struct.Struct("<I")
+UINT64 = struct.Struct("<Q")
+
+#
+# version, previous block hash, Merkle root, time, bits, nonce
+# The hashes are in their raw (little endian) byte order
+#
+BLOCKHEADER = struct.Struct("<I32s32sIII")
+
+#
+# Codecs by width in bytes
+#
+NUMBER_CODECS = {1 : UINT8, 2 : UINT16, 4 : UINT32, 8 : UINT64}
+
+
+#
+# Decode a varInt starting at the given offset in a buffer
+# Returns:
+# - the value
+# - the offset of the first byte after the varInt
+#
+def unpackVarInt(buffer, offset):
+    i = buffer[offset]
+    if i < 253:
+        return i, offset + 1
+    if i == 253:
+        return UINT16.unpack_from(buffer, offset + 1)[0], offset + 3
+    if i == 254:
+        return UINT32.unpack_from(buffer, offset + 1)[0], offset + 5
+    return UINT64.unpack_from(buffer, offset + 1)[0], offset + 9
+
+#
+# Get the number of bytes needed to encode x as a varInt
+#
+def varIntSize(x):
+    if x < 253:
+        return 1
+    if x <= 0xFFFF:
+        return 3
+    if x <= 0xFFFFFFFF:
+        return 5
+    if x <= 0xFFFFFFFFFFFFFFFF:
+        return 9
+    raise ValueError("Out of range for a varInt")
+
+#
+# Encode a varInt at the given offset in a buffer that
+# needs to be large enough. Returns the offset of the
+# first byte after the varInt
+#
+def packVarInt(buffer, offset, x):
+    if x < 253:
+        UINT8.pack_into(buffer, offset, x)
+        return offset + 1
+    if x <= 0xFFFF:
+        buffer[offset] = 0xfd
+        UINT16.pack_into(buffer, offset + 1, x)
+        return offset + 3
+    if x <= 0xFFFFFFFF:
+        buffer[offset] = 0xfe
+        UINT32.pack_into(buffer, offset + 1, x)
+        return offset + 5
+    if x <= 0xFFFFFFFFFFFFFFFF:
+        buffer[offset] = 0xff
+        UINT64.pack_into(buffer, offset + 1, x)
+        return offset + 9
+    raise ValueError("Out of range for a varInt")
+
+
+#
+# A reader that walks through a sequence of bytes
+# and keeps track of the current position. In contrast
+# to the functions below which work on hex strings and
+# return a copy of the remaining string, reading from
+# this object only advances an offset, so that a large
+# block can be decoded without copying the remaining
+# payload over and over again
+#
+class ByteReader:
+
+    def __init__(self, data, offset = 0):
+        self.buffer = memoryview(data)
+        self.offset = offset
+
+    #
+    # Get the current position
+    #
+    def getOffset(self):
+        return self.offset
+
+    #
+    # Get the number of bytes not yet consumed
+    #
+    def remaining(self):
+        return len(self.buffer) - self.offset
+
+    #
+    # Return the next l bytes as a memoryview into
+    # the underlying buffer and advance the position
+    #
+    def readBytes(self, l):
+        start = self.offset
+        end = start + l
+        if end > len(self.buffer):
+            raise TypeError("Input string too short")
+        self.offset = end
+        return self.buffer[start:end]
+
+    #
+    # Decode a structure described by a precompiled
+    # struct.Struct and return the tuple of values
+    #
+    def readStruct(self, codec):
+        offset = self.offset
+        if offset + codec.size > len(self.buffer):
+            raise TypeError("Input string too short")
+        self.offset = offset + codec.size
+        return codec.unpack_from(self.buffer, offset)
+
+    #
+    # Decode a number of l bytes in little endian
+    #
+    def readNumber(self, l):
+        codec = NUMBER_CODECS.get(l)
+        if codec != None:
+            return self.readStruct(codec)[0]
+        return int.from_bytes(self.readBytes(l), 'little')
+
+    def readChar(self):
+        return self.readStruct(UINT8)[0]
+
+    def readUint32(self):
+        return self.readStruct(UINT32)[0]
+
+    def readUint64(self):
+        return self.readStruct(UINT64)[0]
+
+    #
+    # Decode a varInt, see deserializeVarInt
+    #
+    def readVarInt(self):
+        try:
+            x, offset = unpackVarInt(self.buffer, self.offset)
+        except (IndexError, struct.error):
+            raise TypeError("Input string too short")
+        self.offset = offset
+        return x
+
+    #
+    # Read l bytes and return them as a hex string
+    # in reversed order, see deserializeString
+    #
+    def readString(self, l):
+        return bytes(self.readBytes(l))[::-1].hex()
+
+    #
+    # Start to record the bytes that are read. Returns
+    # a token that needs to be passed to endCapture
+    #
+    def beginCapture(self):
+        return self.offset
+
+    #
+    # Return a copy of all bytes read since the
+    # corresponding call of beginCapture
+    #
+    def endCapture(self, token):
+        return bytes(self.buffer[token:self.offset])
+
+    #
+    # Return everything that has not yet been consumed
+    # as a hex string
+    #
+    def getRemainingHex(self):
+        return self.buffer[self.offset:].hex()
+
+
+#
+# A reader with the same interface as the ByteReader that 
+# reads incrementally from a binary file-like object, for
+# instance a file opened in mode "rb" or a socket wrapped
+# by makefile("rb"). Each field is read with readinto into
+# a scratch buffer that is reused, so the memory needed does
+# not depend on the size of the data, but only on the largest
+# single field. We never read ahead, so that the stream is 
+# positioned right after the object when we are done and
+# the next object can be read from the same stream
+#
+class StreamReader:
+
+    def __init__(self, stream, size = 1024):
+        self.stream = stream
+        self.buffer = bytearray(size)
+        self.offset = 0
+        self.capture = None
+        self.captureDepth = 0
+
+    #
+    # Get the number of bytes consumed so far
+    #
+    def getOffset(self):
+        return self.offset
+
+    #
+    # Read the next l bytes into the start of the buffer
+    #
+    def fill(self, l):
+        if l > len(self.buffer):
+            self.buffer.extend(bytes(l - len(self.buffer)))
+        view = memoryview(self.buffer)
+        n = 0
+        while n < l:
+            r = self.stream.readinto(view[n:l])
+            if not r:
+                raise TypeError("Input string too short")
+            n += r
+        self.offset += l
+        if self.capture != None:
+            self.capture += view[0:l]
+
+    #
+    # Start to record the bytes that are read. As we do
+    # not keep the data, we need to copy it while reading.
+    # Captures can be nested, the token is the position
+    # in the recorded data where this capture starts
+    #
+    def beginCapture(self):
+        if self.capture == None:
+            self.capture = bytearray()
+        self.captureDepth += 1
+        return len(self.capture)
+
+    #
+    # Return all bytes read since the corresponding 
+    # call of beginCapture
+    #
+    def endCapture(self, token):
+        data = bytes(self.capture[token:])
+        self.captureDepth -= 1
+        if self.captureDepth == 0:
+            self.capture = None
+        return data
+
+    #
+    # Return the next l bytes. As the buffer is reused,
+    # this is a copy
+    #
+    def readBytes(self, l):
+        self.fill(l)
+        return bytes(self.buffer[0:l])
+
+    def readStruct(self, codec):
+        self.fill(codec.size)
+        return codec.unpack_from(self.buffer, 0)
+
+    def readNumber(self, l):
+        codec = NUMBER_CODECS.get(l)
+        if codec != None:
+            return self.readStruct(codec)[0]
+        return int.from_bytes(self.readBytes(l), 'little')
+
+    def readChar(self):
+        return self.readStruct(UINT8)[0]
+
+    def readUint32(self):
+        return self.readStruct(UINT32)[0]
+
+    def readUint64(self):
+        return self.readStruct(UINT64)[0]
+
+    def readVarInt(self):
+        i = self.readChar()
+        if i < 253:
+            return i
+        if i == 253:
+            return self.readStruct(UINT16)[0]
+        if i == 254:
+            return self.readUint32()
+        return self.readUint64()
+
+    def readString(self, l):
+        return self.readBytes(l)[::-1].hex()
+
+
+#
+# The counterpart of the ByteReader - a writer that
+# collects serialized data in a single buffer. The buffer
+# is allocated upfront and doubled when it is full, and 
+# all numbers are packed in place at the current offset
+#
+class ByteWriter:
+
+    def __init__(self, size = 256):
+        self.buffer = bytearray(size)
+        self.offset = 0
+
+    #
+    # Make sure that there is room for at least
+    # l more bytes
+    #
+    def reserve(self, l):
+        needed = self.offset + l
+        if needed > len(self.buffer):
+            self.buffer.extend(bytes(max(needed, 2*len(self.buffer)) - len(self.buffer)))
+
+    #
+    # Append a sequence of bytes
+    #
+    def writeBytes(self, b):
+        l = len(b)
+        self.reserve(l)
+        self.buffer[self.offset:self.offset + l] = b
+        self.offset += l
+
+    #
+    # Encode values described by a precompiled 
+    # struct.Struct
+    #
+    def writeStruct(self, codec, *values):
+        self.reserve(codec.size)
+        codec.pack_into(self.buffer, self.offset, *values)
+        self.offset += codec.size
+
+    #
+    # Encode a number of l bytes in little endian
+    #
+    def writeNumber(self, n, l):
+        codec = NUMBER_CODECS.get(l)
+        if codec != None:
+            self.writeStruct(codec, n)
+        else:
+            self.writeBytes(n.to_bytes(l, 'little'))
+
+    def writeChar(self, x):
+        self.writeStruct(UINT8, x)
+
+    def writeUint32(self, x):
+        self.writeStruct(UINT32, x)
+
+    def writeUint64(self, x):
+        self.writeStruct(UINT64, x)
+
+    #
+    # Encode a varInt, see serializeVarInt
+    #
+    def writeVarInt(self, x):
+        self.reserve(9)
+        self.offset = packVarInt(self.buffer, self.offset, x)
+
+    #
+    # Encode a hex string of l bytes in reversed order, 
+    # see serializeString
+    #
+    def writeString(self, s, l):
+        self.writeBytes(bytes.fromhex(s[:2*l])[::-1])
+
+    #
+    # Get the number of bytes written so far
+    #
+    def getLength(self):
+        return self.offset
+
+    #
+    # Get the result as bytes
+    #
+    def getBytes(self):
+        return bytes(memoryview(self.buffer)[:self.offset])
+
+    #
+    # Get the result as a hex string
+    #
+    def getHex(self):
+        return memoryview(self.buffer)[:self.offset].hex()
+
+
+#
+# Turn the input of a deserialize method into a reader. The 
+# input can either be a hex string, a sequence of bytes or
+# a reader (ByteReader or StreamReader)
+#
+def getReader(s):
+    if isinstance(s, str):
+        return ByteReader(bytes.fromhex(s))
+    if isinstance(s, (bytes, bytearray, memoryview)):
+        return ByteReader(s)
+    return s
+
+#
+# Build the return value of a deserialize method. If the
+# caller has provided a hex string, this is the remaining
+# part of the string, otherwise this is the reader
+#
+def getRemainder(s, reader):
+    if isinstance(s, str):
+        return reader.getRemainingHex()
+    return reader
 
 #
 # Decode a number and return the stream with 
@@ -41,7 +448,11 @@ import binascii
 def deserializeNumber(s, l):
     if len(s) < 2*l:
         raise TypeError("Input string too short")
-    i = int.from_bytes(bytes.fromhex(s[0:2*l]), 'little') 
+    codec = NUMBER_CODECS.get(l)
+    if codec != None:
+        i = codec.unpack(bytes.fromhex(s[0:2*l]))[0]
+    else:
+        i = int.from_bytes(bytes.fromhex(s[0:2*l]), 'little') 
     s = s[2*l:]
     return i,s
 
@@ -57,21 +468,11 @@ def deserializeVarInt(s):
     #
     if len(s) < 2:
         raise TypeError("Input string too short")
-    i, s = deserializeNumber(s, 1)
-    if i < 253:
-        return i, s
-    if i == 253:
-        #
-        # Read two extra bytes
-        #
-        b, s = deserializeNumber(s, 2)
-    elif i == 254:
-        b, s = deserializeNumber(s,4)
-    elif i == 255:
-        b, s = deserializeNumber(s, 8)
-    else:
-        raise TypeError("Invalid first byte (",i,") for varInt")
-    return b, s
+    try:
+        x, l = unpackVarInt(bytes.fromhex(s[0:18]), 0)
+    except struct.error:
+        raise TypeError("Input string too short")
+    return x, s[2*l:]
 
 
 #
@@ -108,11 +509,7 @@ def deserializeUint64(s):
 # - the remaining string
 #
 def deserializeString(s, len):
-    r = ""
-    for _ in range(len):
-        r = s[0:2] + r
-        s = s[2:]
-    return r, s
+    return reverseHex(s[0:2*len]), s[2*len:]
     
     
     
@@ -122,6 +519,8 @@ def deserializeString(s, len):
 def serializeNumber(n, l = None, order="little"):
     if l == None:
         l = (n.bit_length() + 7) // 8
+    if order == "little" and l in NUMBER_CODECS:
+        return NUMBER_CODECS[l].pack(n).hex()
     n = n.to_bytes(l, order)
     return binascii.hexlify(n).decode('ascii')
     
@@ -130,40 +529,15 @@ def serializeNumber(n, l = None, order="little"):
 # Encode a hex string of len bytes
 #
 def serializeString(s, len):
-    r = ""
-    for _ in range(len):
-        r = s[0:2] + r
-        s = s[2:]
-    return r
+    return reverseHex(s[0:2*len])
 
 #
 # Serialize a varInt
 #
 def serializeVarInt(x):
-    if x < 253:
-        return serializeNumber(x, 1)
-    else:
-        if x > (2**16 - 1):
-            #
-            # Need at least four bytes. Find out whether
-            # four bytes will do
-            #
-            if x > (2**32 - 1):
-                if (x > (2**64 - 1)):
-                    raise ValueError("Out of range for a varInt")
-                #
-                # No - need all eight bytes
-                #
-                s = "ff" + serializeNumber(x,8)    
-            #
-            # Can do it with four bytes
-            # 
-            else:
-                s = "fe" + serializeNumber(x,4)
-        else:
-            # can do it with two bytes
-            s = "fd" + serializeNumber(x,2)
-        return s
+    buffer = bytearray(9)
+    l = packVarInt(buffer, 0, x)
+    return buffer[:l].hex()
 
 #
 # Encode a char
@@ -175,12 +549,56 @@ def serializeChar(x):
 # Encode a long int
 #
 def serializeUint32(x):
-    return serializeNumber(x, 4)
+    return UINT32.pack(x).hex()
 
 #
 # Encode a long long
 #
 def serializeUint64(x):
-    return serializeNumber(x, 8)
+    return UINT64.pack(x).hex()
 
 
+
+
+####################################################
+# Byte order conversions. Hashes like transaction 
+# IDs are serialized in little endian, but usually
+# displayed in big endian, so we need to reverse 
+# them bytewise
+####################################################
+
+#
+# Reverse a sequence of bytes
+#
+def reverseBytes(b):
+    return bytes(b)[::-1]
+
+#
+# Reverse a hex string bytewise
+#
+def reverseHex(s):
+    return bytes.fromhex(s)[::-1].hex()
+
+#
+# Reverse each hash in a list bytewise and return the results as
+# hex strings, for instance to convert a list of transaction IDs 
+# from little endian to big endian. The hashes can be given as hex 
+# strings or as bytes, for instance txin.prevTxidBytes. We convert 
+# and reverse all of them in one go and then cut the result into 
+# pieces again - as the entire sequence is reversed, the last 
+# element comes first
+#
+def reverseHexList(l):
+    if (len(l) > 0) and isinstance(l[0], str):
+        r = bytes.fromhex("".join(l))[::-1].hex()
+        lengths = [len(s) for s in l]
+    else:
+        r = b''.join(l)[::-1].hex()
+        lengths = [2*len(b) for b in l]
+    result = []
+    end = len(r)
+    for length in lengths:
+        start = end - length
+        result.append(r[start:end])
+        end = start
+    return result
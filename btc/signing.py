@@ -0,0 +1,103 @@
+####################################################
+# 
+# Signing transactions with many inputs
+#
+# MIT license
+#
+# Copyright (c) 2018 christianb93
+# Permission is hereby granted, free of charge, to 
+# any person obtaining a copy of this software and 
+# associated documentation files (the "Software"), 
+# to deal in the Software without restriction, 
+# including without limitation the rights to use, 
+# copy, modify, merge, publish, distribute, 
+# sublicense, and/or sell copies of the Software, 
+# and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice 
+# shall be included in all copies or substantial 
+# portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY 
+# OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT 
+# LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. 
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS 
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, 
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, 
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE 
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+####################################################
+
+from . import pool
+from . import script
+
+
+#
+# The functions in this module sign the inputs of a transaction in
+# a pool of worker processes. The signature hashes and the public keys
+# are computed in the calling process, each public key only once, and
+# the nonces are determined there as well, so that the result is the 
+# same as with script.signTransaction. 
+#
+# Each worker needs the fixed-base table of secp256k1. If 
+# secp256k1.loadFixedBaseTable has been called at startup, the 
+# workers of btc.pool map the same file instead of building it
+#
+
+
+#
+# Sign a list of tasks (h, secret, k). This runs in the worker 
+# processes
+#
+def signTasks(tasks):
+    return [script.signHash(h, secret, k) for h, secret, k in tasks]
+
+
+#
+# Below this number of inputs, we sign in the calling process as 
+# a round trip through the pool takes about as long as signing 
+# a few inputs
+#
+PARALLEL_THRESHOLD = 8
+
+
+#
+# Run a list of tasks and return the list of signatures (r, s). 
+# Parameters:
+# - tasks - a list of tuples (h, secret, k)
+# - workers - the number of worker processes, defaults to the number of CPUs.
+#             If this is 1 or if there are less than PARALLEL_THRESHOLD
+#             tasks, everything is done in the calling process
+# - executor - an existing concurrent.futures.Executor to use instead of 
+#              the pool of btc.pool
+#
+def runTasks(tasks, workers = None, executor = None):
+    if (executor == None) and (len(tasks) < PARALLEL_THRESHOLD):
+        return signTasks(tasks)
+    return pool.runChunks(signTasks, tasks, workers, executor)
+
+
+#
+# Sign a transaction. Given the transaction tx, a list of unspent 
+# transaction outputs txos and a list of corresponding private keys, 
+# this function will sign the transaction inputs of tx, add the 
+# signature scripts or witnesses to the transaction and return it.
+# The nonces are deterministic (RFC 6979) unless rng is given, see 
+# script.signingNonces. See runTasks for the other parameters
+#
+def signTransaction(tx, txos, privateKeys, workers = None, executor = None, rng = None):
+    hashes = script.signingHashes(tx, txos)
+    pubKeys = script.publicKeys(privateKeys[:len(hashes)])
+    nonces = script.signingNonces(hashes, privateKeys, rng)
+    tasks = [(hashes[nInput], privateKeys[nInput], nonces[nInput]) 
+             for nInput in range(len(hashes))]
+    signatures = runTasks(tasks, workers, executor)
+    nInput = 0
+    for txin in tx.getInputs():
+        r, s = signatures[nInput]
+        script.setSignature(txin, txos[nInput], r, s, pubKeys[nInput])
+        nInput += 1
+    return tx
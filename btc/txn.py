@@ -34,7 +34,7 @@
 from . import serialize
 from . import script
 from . import utils
-import binascii
+import hashlib
 
 #
 # A transaction input. This is the part of a transaction that
@@ -42,21 +42,167 @@ import binascii
 #
 # see primitives/transaction.h in the reference implementation
 #
+# To keep the memory footprint small, we use slots and store the
+# previous transaction ID and the signature script only once, as
+# raw bytes in the order in which they are serialized
+#
+# For segregated witness transactions (BIP141), an input also has 
+# a witness, i.e. a stack of byte sequences. This is not part of the
+# serialized input, but is serialized separately after all outputs,
+# see txn.deserialize. We keep the serialized witness as raw bytes 
+# and only split it into its items when getWitness is called
+#
+# The fields that end up in the serialized transaction are properties.
+# Assigning to them tells the transaction to which the input belongs
+# to drop its cached serialization and ID
+#
 class txin:
+
+    __slots__ = ("_prevTxidBytes", "_vout", "_scriptSigBytes", "_scriptSig", "_sequence", 
+                 "_witnessBytes", "witness", "owner")
 	
     def __init__(self, prevTxid = None, vout = 0, scriptSig = None, sequence = 0xfffffffe):
-        self.prevTxid = prevTxid
-        self.vout = vout
-        self.scriptSigHex = None
-        self.scriptSig = scriptSig
-        self.sequence = sequence	
         #
-        # if possible fill the hex representation 
-        # 	
+        # The transaction to which this input belongs, see
+        # txn.addInput
+        #
+        self.owner = None
+        self._prevTxidBytes = None
+        self._vout = vout
+        self._scriptSigBytes = None
+        self._scriptSig = None
+        self._sequence = sequence	
+        self._witnessBytes = None
+        self.witness = None
+        if prevTxid != None:
+            self.prevTxid = prevTxid
+        if scriptSig != None:
+            self.scriptSig = scriptSig
+
+    #
+    # The previous transaction ID as raw bytes in little endian
+    #
+    @property
+    def prevTxidBytes(self):
+        return self._prevTxidBytes
+
+    @prevTxidBytes.setter
+    def prevTxidBytes(self, prevTxidBytes):
+        self._prevTxidBytes = prevTxidBytes
+        self.invalidate()
+
+    #
+    # The index of the spent output in the previous transaction
+    #
+    @property
+    def vout(self):
+        return self._vout
+
+    @vout.setter
+    def vout(self, vout):
+        self._vout = vout
+        self.invalidate()
+
+    #
+    # The sequence number
+    #
+    @property
+    def sequence(self):
+        return self._sequence
+
+    @sequence.setter
+    def sequence(self, sequence):
+        self._sequence = sequence
+        self.invalidate()
+
+    #
+    # The signature script as raw bytes. Setting this drops
+    # the parsed script
+    #
+    @property
+    def scriptSigBytes(self):
+        return self._scriptSigBytes
+
+    @scriptSigBytes.setter
+    def scriptSigBytes(self, scriptSigBytes):
+        self._scriptSigBytes = scriptSigBytes
+        self._scriptSig = None
+        self.invalidate()
+
+    #
+    # The signature script as an object, parsed from the raw 
+    # representation on first access. Assigning a script 
+    # also fills the raw representation and makes this input
+    # the owner of the script, so that data pushed later
+    # ends up in the raw script as well
+    #
+    @property
+    def scriptSig(self):
+        return self.getScriptSig()
+
+    @scriptSig.setter
+    def scriptSig(self, scriptSig):
         if scriptSig != None:
-            if scriptSig.getScriptType() != script.SCRIPTTYPE_OTHER:
-                self.scriptSigHex = scriptSig.serialize()
+            self._scriptSigBytes = bytes.fromhex(scriptSig.serialize())
+            scriptSig.owner = self
+        self._scriptSig = scriptSig
+        self.invalidate()
+
+    #
+    # The serialized witness. Setting this drops the 
+    # witness items that we have split off
+    #
+    @property
+    def witnessBytes(self):
+        return self._witnessBytes
+
+    @witnessBytes.setter
+    def witnessBytes(self, witnessBytes):
+        self._witnessBytes = witnessBytes
+        self.witness = None
+        self.invalidate()
+
+    #
+    # The previous transaction ID as a hex string in 
+    # big endian, converted from and to the raw bytes
+    #
+    @property
+    def prevTxid(self):
+        if self.prevTxidBytes == None:
+            return None
+        return self.prevTxidBytes[::-1].hex()
+
+    @prevTxid.setter
+    def prevTxid(self, prevTxid):
+        if prevTxid == None:
+            self.prevTxidBytes = None
+        else:
+            self.prevTxidBytes = bytes.fromhex(prevTxid)[::-1]
+
+    #
+    # The signature script as a hex string
+    #
+    @property
+    def scriptSigHex(self):
+        if self.scriptSigBytes == None:
+            return None
+        return self.scriptSigBytes.hex()
+
+    @scriptSigHex.setter
+    def scriptSigHex(self, scriptSigHex):
+        if scriptSigHex == None:
+            self.scriptSigBytes = None
+        else:
+            self.scriptSigBytes = bytes.fromhex(scriptSigHex)
     
+    #
+    # Called by a signature script owned by this input when
+    # data has been pushed onto it
+    #
+    def scriptSigChanged(self, scriptSig):
+        if scriptSig is self._scriptSig:
+            self.scriptSig = scriptSig
+
     #
     # Get the id (hash value) of the previous transaction
     #
@@ -76,10 +222,35 @@ class txin:
         return self.scriptSigHex
 
     #
-    # Get the signature script as an object
+    # Get the signature script as an object. When the input
+    # has been deserialized, we only keep the raw script and
+    # parse it when it is requested for the first time. The
+    # parsed script is owned by this input like an assigned one
     #
     def getScriptSig(self):
-        return self.scriptSig
+        if (self._scriptSig == None) and (self._scriptSigBytes != None):
+            self._scriptSig = script.scriptSig()
+            self._scriptSig.deserialize(self._scriptSigBytes)
+            self._scriptSig.owner = self
+        return self._scriptSig
+
+    #
+    # Parse the signature scripts of a list of inputs, for instance 
+    # of all inputs of a block, that have not been parsed yet. The 
+    # signatures are decoded in one batch by utils.decodeDERSignatures,
+    # directly from the raw scripts
+    #
+    @classmethod
+    def parseScriptSigs(cls, txins):
+        pending = [_txin for _txin in txins if (_txin._scriptSig == None) and (_txin._scriptSigBytes != None)]
+        lengths = [script.pushedSignatureLength(_txin._scriptSigBytes) for _txin in pending]
+        decoded = utils.decodeDERSignatures([(_txin._scriptSigBytes, 1, sigLength) 
+                                             for _txin, sigLength in zip(pending, lengths)])
+        for _txin, sigLength, signature in zip(pending, lengths, decoded):
+            _scriptSig = script.scriptSig()
+            _scriptSig.deserializeDecoded(_txin._scriptSigBytes, sigLength, signature)
+            _scriptSig.owner = _txin
+            _txin._scriptSig = _scriptSig
 
 
     #
@@ -87,93 +258,201 @@ class txin:
     #
     def getSequence(self):
         return self.sequence
+
+    #
+    # Get the witness as a list of byte sequences. The list
+    # is empty if there is no witness
+    #
+    def getWitness(self):
+        if self.witness == None:
+            self.witness = []
+            if self.witnessBytes != None:
+                reader = serialize.ByteReader(self.witnessBytes)
+                for _ in range(reader.readVarInt()):
+                    self.witness.append(bytes(reader.readBytes(reader.readVarInt())))
+        return self.witness
+
+    #
+    # Does this input have a non-empty witness?
+    #
+    def hasWitness(self):
+        if self.witnessBytes == None:
+            return False
+        return self.witnessBytes != b'\x00'
+
+    #
+    # Setters. These are equivalent to assigning to the 
+    # corresponding properties
+    #
+    def setPrevTxId(self, prevTxid):
+        self.prevTxid = prevTxid
+
+    def setVout(self, vout):
+        self.vout = vout
+
+    def setScriptSig(self, scriptSig):
+        self.scriptSig = scriptSig
+
+    def setSequence(self, sequence):
+        self.sequence = sequence
+
+    #
+    # Set the witness, given as a list of byte sequences
+    #
+    def setWitness(self, witness):
+        writer = serialize.ByteWriter()
+        writer.writeVarInt(len(witness))
+        for item in witness:
+            writer.writeVarInt(len(item))
+            writer.writeBytes(item)
+        self.witnessBytes = writer.getBytes()
+        self.witness = [bytes(item) for item in witness]
+
+    #
+    # Tell the owning transaction that we have changed
+    #
+    def invalidate(self):
+        if self.owner != None:
+            self.owner.invalidate()
     
     
     #
     # Deserialize a string and initalize the
-    # transaction input accordingly
+    # transaction input accordingly. The input can
+    # be a hex string or a serialize.ByteReader
     #
     # see TxIn::SerializeOp in the reference implementation
     #
     def deserialize(self, s):
+        reader = serialize.getReader(s)
         #
         # Read the previous transaction ID first. The transaction
-        # ID is a 32 byte hex string
+        # ID is a 32 byte hash
         #
-        self.prevTxid, s = serialize.deserializeString(s, 32)
+        self._prevTxidBytes = bytes(reader.readBytes(32))
         #
         #
         # Next there is the index of the txout in the
         # previous transaction that we refer to
         #  
-        self.vout, s = serialize.deserializeUint32(s)   
+        self._vout = reader.readUint32()
         #
         #
         # Then there is the signature script, first
-        # the length in bytes, then the hex representation
-        # of the script itself
+        # the length in bytes, then the script itself
         #
-        script_len, s = serialize.deserializeVarInt(s)
-        self.scriptSigHex = s[0:2*script_len]
-        self.scriptSig = script.scriptSig()
-        self.scriptSig.deserialize(self.scriptSigHex)
-        s = s[2*script_len:]   
+        script_len = reader.readVarInt()
+        self._scriptSigBytes = bytes(reader.readBytes(script_len))
+        self._scriptSig = None
         #
         # finally the sequence field
         #
-        self.sequence, s = serialize.deserializeUint32(s)
-        return s
+        self._sequence = reader.readUint32()
+        self.invalidate()
+        return serialize.getRemainder(s, reader)
+
+    #
+    # Read the witness of this input from a reader. We 
+    # only need to find the end of the witness and keep
+    # the raw data. This is only called by txn.deserialize
+    # which takes care of the cached serialization
+    #
+    def deserializeWitness(self, reader):
+        capture = reader.beginCapture()
+        for _ in range(reader.readVarInt()):
+            reader.readBytes(reader.readVarInt())
+        self._witnessBytes = reader.endCapture(capture)
+        self.witness = None
+
+    #
+    # Write the witness of this input into a 
+    # serialize.ByteWriter
+    #
+    def serializeWitnessInto(self, writer):
+        if self.witnessBytes == None:
+            writer.writeVarInt(0)
+        else:
+            writer.writeBytes(self.witnessBytes)
         
         
     # 
     # Is this a coinbase transaction?
     #
     def isCoinbase(self):
-        if self.prevTxid != "00"*32:
+        if self.prevTxidBytes != bytes(32):
             return False
         if self.vout != 0xFFFFFFFF:
             return False
         return True
+
+    #
+    # Get the size of the serialized input in bytes,
+    # not including the witness
+    #
+    def getSize(self):
+        scriptSigBytes = self.scriptSigBytes
+        if scriptSigBytes == None:
+            if self._scriptSig == None:
+                return 0
+            scriptSigBytes = bytes.fromhex(self._scriptSig.serialize())
+        return 40 + serialize.varIntSize(len(scriptSigBytes)) + len(scriptSigBytes)
+
+    #
+    # Get the size of the serialized witness in bytes
+    #
+    def getWitnessSize(self):
+        if self.witnessBytes == None:
+            return 1
+        return len(self.witnessBytes)
         
     #
-    # Serialize the transaction input
+    # Serialize the transaction input into a serialize.ByteWriter
     #
     # see TxIn::SerializeOp in the reference implementation
     #
-    def serialize(self):
-        if self.prevTxid == None:
+    def serializeInto(self, writer):
+        if self.prevTxidBytes == None:
             raise ValueError("No previous transaction ID set")
-        if len(self.prevTxid) != 64:
+        if len(self.prevTxidBytes) != 32:
             raise ValueError("Invalid previous transaction id - wrong length")
-        s = ""
+        if (self._scriptSig == None) and (self.scriptSigBytes == None):
+            return
         #
         #  Previous transaction id
         #
-        s = s + serialize.serializeString(self.prevTxid, 32)
+        writer.writeBytes(self.prevTxidBytes)
         #
         # and its index
         # 
-        s = s + serialize.serializeUint32(self.vout)
+        writer.writeUint32(self.vout)
         #
         #  
         # Then there is the signature script, first
-        # the length in bytes, then the hex representation
-        # of the script itself
-        if self.scriptSig == None:
-            return ""
-        if self.scriptSig.getScriptType() != script.SCRIPTTYPE_OTHER:
-            scriptSigHex = self.scriptSig.serialize()
-        elif self.scriptSigHex != None:
-            scriptSigHex = self.scriptSigHex
-        else:
-            scriptSigHex = self.scriptSig.serialize()
-        s = s + serialize.serializeVarInt(int(len(scriptSigHex) / 2))
-        s = s + scriptSigHex
+        # the length in bytes, then the script itself
+        #
+        scriptSigBytes = self.scriptSigBytes
+        if scriptSigBytes == None:
+            scriptSigBytes = bytes.fromhex(self._scriptSig.serialize())
+        writer.writeVarInt(len(scriptSigBytes))
+        writer.writeBytes(scriptSigBytes)
         #
         # Finally the locktime
         #
-        s = s + serialize.serializeUint32(self.sequence)
-        return s
+        writer.writeUint32(self.sequence)
+
+    #
+    # Serialize the transaction input and return bytes
+    #
+    def serializeBytes(self):
+        writer = serialize.ByteWriter()
+        self.serializeInto(writer)
+        return writer.getBytes()
+
+    #
+    # Serialize the transaction input and return a hex string
+    #
+    def serialize(self):
+        return self.serializeBytes().hex()
 
 
         
@@ -186,34 +465,102 @@ class txin:
 #
 class txout:
 
+    __slots__ = ("_value", "_scriptPubKeyBytes", "_scriptPubKey", "owner")
+
     def __init__(self, value = None, scriptPubKey = None):
-        self.value = value
-        self.scriptPubKeyHex = None
-        self.scriptPubKey = scriptPubKey
+        self.owner = None
+        self._value = value
+        self._scriptPubKeyBytes = None
+        self._scriptPubKey = None
         if scriptPubKey != None:
-            if scriptPubKey.getScriptType() != script.SCRIPTTYPE_OTHER:
-                self.scriptPubKeyHex = scriptPubKey.serialize()
+            self.scriptPubKey = scriptPubKey
+
+    #
+    # The value in satoshi. As for txin, assigning to this
+    # and the following properties invalidates the owning
+    # transaction
+    #
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        self.invalidate()
+
+    #
+    # The public key script as raw bytes
+    #
+    @property
+    def scriptPubKeyBytes(self):
+        return self._scriptPubKeyBytes
+
+    @scriptPubKeyBytes.setter
+    def scriptPubKeyBytes(self, scriptPubKeyBytes):
+        self._scriptPubKeyBytes = scriptPubKeyBytes
+        self._scriptPubKey = None
+        self.invalidate()
+
+    #
+    # The public key script as an object. We can only fill
+    # the raw representation for a standard script. For any 
+    # other script, the raw representation is cleared so that
+    # serializing raises an error instead of writing the previous
+    # script - unless this is the script that has been parsed 
+    # from the raw representation
+    #
+    @property
+    def scriptPubKey(self):
+        return self._scriptPubKey
+
+    @scriptPubKey.setter
+    def scriptPubKey(self, scriptPubKey):
+        if (scriptPubKey != None) and (scriptPubKey.getScriptType() != script.SCRIPTTYPE_OTHER):
+            self._scriptPubKeyBytes = bytes.fromhex(scriptPubKey.serialize())
+        elif (scriptPubKey is None) or (scriptPubKey is not self._scriptPubKey):
+            self._scriptPubKeyBytes = None
+        self._scriptPubKey = scriptPubKey
+        self.invalidate()
+
+    #
+    # The public key script as a hex string
+    #
+    @property
+    def scriptPubKeyHex(self):
+        if self.scriptPubKeyBytes == None:
+            return None
+        return self.scriptPubKeyBytes.hex()
+
+    @scriptPubKeyHex.setter
+    def scriptPubKeyHex(self, scriptPubKeyHex):
+        if scriptPubKeyHex == None:
+            self.scriptPubKeyBytes = None
+        else:
+            self.scriptPubKeyBytes = bytes.fromhex(scriptPubKeyHex)
 
     #
     # Deserialize a string and initalize the
-    # transaction output accordingly
+    # transaction output accordingly. The input can
+    # be a hex string or a serialize.ByteReader
     #
     # see TxOut::SerializeOp 
     #
     def deserialize(self, s):    
+        reader = serialize.getReader(s)
         # 
         # First eight bytes are the value in Satoshi
         # 
-        self.value, s = serialize.deserializeUint64(s)
+        self._value = reader.readUint64()
         #
         # Then there is the public key script - length
-        # and hex representation
+        # and the script itself
         #
-        script_len, s = serialize.deserializeVarInt(s)
-        self.scriptPubKeyHex = s[0:2*script_len]
-        self.scriptPubKey = script.scriptPubKey()
-        self.scriptPubKey.deserialize(self.scriptPubKeyHex)
-        return s[2*script_len:]
+        script_len = reader.readVarInt()
+        self._scriptPubKeyBytes = bytes(reader.readBytes(script_len))
+        self._scriptPubKey = None
+        self.invalidate()
+        return serialize.getRemainder(s, reader)
      
     
     #
@@ -222,6 +569,17 @@ class txout:
     def getValue(self):
         return self.value
 
+    #
+    # Get the size of the serialized output in bytes
+    #
+    def getSize(self):
+        scriptPubKeyBytes = self.scriptPubKeyBytes
+        if scriptPubKeyBytes == None:
+            if (self.value == None) or (self.scriptPubKey == None):
+                return 0
+            scriptPubKeyBytes = bytes.fromhex(self.scriptPubKey.serialize())
+        return 8 + serialize.varIntSize(len(scriptPubKeyBytes)) + len(scriptPubKeyBytes)
+
     
     #
     # Get the public key script as a hex string
@@ -231,48 +589,202 @@ class txout:
     
     
     #
-    # Get the public key script
+    # Get the public key script. As for the signature script
+    # of an input, this is parsed on first access
     #
     def getScriptPubKey(self):
-        return self.scriptPubKey
+        if (self._scriptPubKey == None) and (self._scriptPubKeyBytes != None):
+            self._scriptPubKey = script.scriptPubKey()
+            self._scriptPubKey.deserialize(self._scriptPubKeyBytes)
+        return self._scriptPubKey
+
+    #
+    # Setters - see the corresponding comment for txin
+    #
+    def setValue(self, value):
+        self.value = value
+
+    def setScriptPubKey(self, scriptPubKey):
+        self.scriptPubKey = scriptPubKey
+
+    def invalidate(self):
+        if self.owner != None:
+            self.owner.invalidate()
         
     #
-    # Serialize
+    # Serialize into a serialize.ByteWriter
     #
-    def serialize(self):
+    def serializeInto(self, writer):
+        if (self.value == None) or ((self.scriptPubKey == None) and (self.scriptPubKeyBytes == None)):
+            return
+        scriptPubKeyBytes = self.scriptPubKeyBytes
+        if scriptPubKeyBytes == None:
+            if self.scriptPubKey.getScriptType() == script.SCRIPTTYPE_OTHER:
+                raise ValueError("Could not determine hex representation of script")
+            scriptPubKeyBytes = bytes.fromhex(self.scriptPubKey.serialize())
         # 
         # Each txout starts with the amount, which is a 64 bit
-        # integer (i.e. 8 bytes, 16 characters) which
-        # specifies the amount in satoshis
+        # integer (i.e. 8 bytes) which specifies the amount 
+        # in satoshis
         #
-        if self.value == None:
-            return ""
-        s = serialize.serializeUint64(self.value)
+        writer.writeUint64(self.value)
         #
         # Next there is the scriptPubKey, preceeded by its length
         #   
-        if self.scriptPubKey == None:
-            return ""
-        if self.scriptPubKey.getScriptType() != script.SCRIPTTYPE_OTHER:
-            scriptPubKeyHex = self.scriptPubKey.serialize()
-        elif self.scriptPubKeyHex != None:
-            scriptPubKeyHex = self.scriptPubKeyHex
-        else:
-            raise ValueError("Could not determine hex representation of script")
-        s = s + serialize.serializeVarInt(int(len(scriptPubKeyHex) / 2))
-        s = s + scriptPubKeyHex
-        return s
+        writer.writeVarInt(len(scriptPubKeyBytes))
+        writer.writeBytes(scriptPubKeyBytes)
+
+    #
+    # Serialize and return bytes
+    #
+    def serializeBytes(self):
+        writer = serialize.ByteWriter()
+        self.serializeInto(writer)
+        return writer.getBytes()
+
+    #
+    # Serialize and return a hex string
+    #
+    def serialize(self):
+        return self.serializeBytes().hex()
     
+#
+# The list of inputs or outputs of a transaction. Changing the 
+# list makes the transaction the owner of the new items and 
+# drops its cached serialization
+#
+class memberList(list):
+
+    __slots__ = ("owner",)
+
+    def __init__(self, owner, items = ()):
+        list.__init__(self, items)
+        self.owner = owner
+        for item in self:
+            item.owner = owner
+
+    def changed(self, items = ()):
+        for item in items:
+            item.owner = self.owner
+        self.owner.invalidate()
+
+    def append(self, item):
+        list.append(self, item)
+        self.changed((item,))
+
+    def insert(self, index, item):
+        list.insert(self, index, item)
+        self.changed((item,))
+
+    def extend(self, items):
+        items = list(items)
+        list.extend(self, items)
+        self.changed(items)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def __setitem__(self, index, item):
+        list.__setitem__(self, index, item)
+        if isinstance(index, slice):
+            self.changed(self[index])
+        else:
+            self.changed((item,))
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self.changed()
+
+    def pop(self, index = -1):
+        item = list.pop(self, index)
+        self.changed()
+        return item
+
+    def remove(self, item):
+        list.remove(self, item)
+        self.changed()
+
+    def clear(self):
+        list.clear(self)
+        self.changed()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self.changed()
+
+    def reverse(self):
+        list.reverse(self)
+        self.changed()
+
 #
 # A transaction 
 #
 class txn:
+
+    __slots__ = ("_version", "_inputs", "_outputs", "_locktime", "raw", "txid", "witnessOffset")
     
     def __init__(self, version = 2, locktime = 0):
-        self.version = version
-        self.inputs = []
-        self.outputs = []
-        self.locktime = locktime
+        self._version = version
+        self._inputs = memberList(self)
+        self._outputs = memberList(self)
+        self._locktime = locktime
+        #
+        # The raw serialized transaction and the transaction ID
+        # (as bytes in little endian). These are filled when
+        # we deserialize or when they are first needed and are
+        # reset when the transaction changes
+        #
+        self.raw = None
+        self.txid = None
+        #
+        # For a segregated witness transaction, this is
+        # the position in the raw data at which the witnesses
+        # start, otherwise None
+        #
+        self.witnessOffset = None
+
+    #
+    # The version, the locktime and the lists of inputs and 
+    # outputs. Assigning to any of them drops the cached
+    # serialization, and assigned lists are wrapped so that 
+    # later changes to them do the same
+    #
+    @property
+    def version(self):
+        return self._version
+
+    @version.setter
+    def version(self, version):
+        self._version = version
+        self.invalidate()
+
+    @property
+    def locktime(self):
+        return self._locktime
+
+    @locktime.setter
+    def locktime(self, locktime):
+        self._locktime = locktime
+        self.invalidate()
+
+    @property
+    def inputs(self):
+        return self._inputs
+
+    @inputs.setter
+    def inputs(self, inputs):
+        self._inputs = memberList(self, inputs)
+        self.invalidate()
+
+    @property
+    def outputs(self):
+        return self._outputs
+
+    @outputs.setter
+    def outputs(self, outputs):
+        self._outputs = memberList(self, outputs)
+        self.invalidate()
 
     #
     # Get the version
@@ -299,6 +811,39 @@ class txn:
     def getLocktime(self):
         return self.locktime
 
+    #
+    # Set the version
+    #
+    def setVersion(self, version):
+        self.version = version
+
+    #
+    # Set the locktime
+    #
+    def setLocktime(self, locktime):
+        self.locktime = locktime
+
+    #
+    # Drop the cached serialization and transaction ID. 
+    # This is called by the properties above and by the 
+    # inputs and outputs when they are changed
+    #
+    def invalidate(self):
+        self.raw = None
+        self.txid = None
+        self.witnessOffset = None
+
+    #
+    # Does any of the inputs have a witness? If yes, 
+    # the transaction is serialized in the extended
+    # format defined in BIP144
+    #
+    def hasWitness(self):
+        for _txin in self.inputs:
+            if _txin.hasWitness():
+                return True
+        return False
+
     
     #
     # Is this a coinbase transaction
@@ -307,62 +852,210 @@ class txn:
         if 1 == len(self.inputs):
             return self.inputs[0].isCoinbase()
         return False
+
+    #
+    # Get the size of the transaction in bytes without
+    # the witnesses, i.e. the size of the serialization
+    # used for the transaction ID. If we have the raw data,
+    # we can derive this from the position of the 
+    # witnesses, otherwise we add up the sizes of 
+    # inputs and outputs
+    #
+    def getStrippedSize(self):
+        if self.raw != None:
+            if self.witnessOffset == None:
+                return len(self.raw)
+            return self.witnessOffset + 2
+        size = 8 + serialize.varIntSize(len(self.inputs)) + serialize.varIntSize(len(self.outputs))
+        for _txin in self.inputs:
+            size += _txin.getSize()
+        for _txout in self.outputs:
+            size += _txout.getSize()
+        return size
+
+    #
+    # Get the size of the transaction in bytes, including
+    # marker, flag and witnesses
+    #
+    def getSize(self):
+        if self.raw != None:
+            return len(self.raw)
+        size = self.getStrippedSize()
+        if self.hasWitness():
+            size += 2
+            for _txin in self.inputs:
+                size += _txin.getWitnessSize()
+        return size
+
+    #
+    # Get the weight of the transaction as defined in BIP141,
+    # i.e. three times the stripped size plus the total size
+    #
+    def getWeight(self):
+        return 3*self.getStrippedSize() + self.getSize()
+
+    #
+    # Get the virtual size, i.e. the weight divided by four,
+    # rounded up
+    #
+    def getVsize(self):
+        return (self.getWeight() + 3) // 4
     
     #
     # Build the transaction from a string. See the function
     # SerializeTransaction in primitives/transaction.h
+    # The input can be a hex string or a serialize.ByteReader
+    #
+    # A segregated witness transaction has a marker byte 0x00
+    # (where we would otherwise expect the number of inputs)
+    # and a flag 0x01 after the version and the witnesses 
+    # of all inputs between the outputs and the locktime. 
+    # We only determine where the witnesses are and do
+    # not parse them
     #
     def deserialize(self, s):
+        reader = serialize.getReader(s)
+        start = reader.getOffset()
+        capture = reader.beginCapture()
         #
         # The first four bytes are the version number
         #
-        version, vin_str = serialize.deserializeUint32(s)
+        version = reader.readUint32()
         if ((version != 1) and (version != 2)):
             raise ValueError("Unknown version number")
-        self.version = version
+        self._version = version
         #
         # Next there is the number of input transactions, followed
         # by the input transactions themselves
         #
-        self.inputs =  []
-        no_in, vin_str = serialize.deserializeVarInt(vin_str)
+        inputs =  []
+        no_in = reader.readVarInt()
+        segwit = False
         if no_in == 0:
-            raise ValueError("This looks like a segregated witness transaction - not supported!")
+            if reader.readChar() != 1:
+                raise ValueError("Unknown flag in extended transaction format")
+            segwit = True
+            no_in = reader.readVarInt()
         for i in range(no_in):
             vin = txin()
-            vin_str = vin.deserialize(vin_str)
-            self.inputs.append(vin)
+            vin.deserialize(reader)
+            inputs.append(vin)
+        self._inputs = memberList(self, inputs)
         #
         # do the same for the outgoing transactions
         #
-        no_out, vout_str = serialize.deserializeVarInt(vin_str)    
-            
-        self.outputs = []
+        no_out = reader.readVarInt()
+        outputs = []
         for i in range(no_out):
             vout = txout()
-            vout_str = vout.deserialize(vout_str)
-            self.outputs.append(vout)
-        
+            vout.deserialize(reader)
+            outputs.append(vout)
+        self._outputs = memberList(self, outputs)
+        #
+        # If this is a segregated witness transaction, the 
+        # witnesses come next, one for each input
+        #
+        self.witnessOffset = None
+        if segwit:
+            self.witnessOffset = reader.getOffset() - start
+            for vin in inputs:
+                vin.deserializeWitness(reader)
         #
         # Last field is the locktime
         #
-        self.locktime, vout_str = serialize.deserializeUint32(vout_str)
-        return vout_str
+        self._locktime = reader.readUint32()
+        #
+        # Keep the raw data so that we do not need
+        # to serialize again to get the transaction ID
+        #
+        self.raw = reader.endCapture(capture)
+        self.txid = None
+        return serialize.getRemainder(s, reader)
         
         
     #
-    # Serialize the transaction
+    # Create a transaction by reading it from a binary 
+    # file-like object
     #
-    def serialize(self):
-        s = serialize.serializeUint32(self.version)
-        s = s + serialize.serializeVarInt(len(self.inputs))
+    @classmethod
+    def fromStream(cls, f):
+        tx = cls()
+        tx.deserialize(serialize.StreamReader(f))
+        return tx
+        
+        
+    #
+    # Serialize the transaction into a serialize.ByteWriter.
+    # If witness is False, the witnesses are left out, i.e.
+    # we get the serialization that is used for the transaction
+    # ID
+    #
+    def serializeInto(self, writer, witness = True):
+        if self.raw != None:
+            if (self.witnessOffset == None) or witness:
+                writer.writeBytes(self.raw)
+            else:
+                for part in self.strippedParts():
+                    writer.writeBytes(part)
+            return
+        segwit = witness and self.hasWitness()
+        writer.writeUint32(self.version)
+        if segwit:
+            writer.writeChar(0)
+            writer.writeChar(1)
+        writer.writeVarInt(len(self.inputs))
         for txin in self.inputs:
-            s = s + txin.serialize()
-        s = s + serialize.serializeVarInt(len(self.outputs))
+            txin.serializeInto(writer)
+        writer.writeVarInt(len(self.outputs))
         for txout in self.outputs:
-            s = s + txout.serialize()
-        s = s + serialize.serializeUint32(self.locktime)
-        return s
+            txout.serializeInto(writer)
+        if segwit:
+            for txin in self.inputs:
+                txin.serializeWitnessInto(writer)
+        writer.writeUint32(self.locktime)
+
+    #
+    # Serialize the transaction including the witnesses and
+    # return bytes. The result is cached until the transaction 
+    # is changed
+    #
+    def serializeBytes(self):
+        if self.raw == None:
+            writer = serialize.ByteWriter()
+            self.serializeInto(writer)
+            raw = writer.getBytes()
+            #
+            # The witnesses are followed only by the locktime
+            #
+            if self.hasWitness():
+                witnessLength = 0
+                for txin in self.inputs:
+                    if txin.witnessBytes == None:
+                        witnessLength += 1
+                    else:
+                        witnessLength += len(txin.witnessBytes)
+                self.witnessOffset = len(raw) - 4 - witnessLength
+            else:
+                self.witnessOffset = None
+            self.raw = raw
+        return self.raw
+
+    #
+    # Serialize the transaction and return a hex string
+    #
+    def serialize(self):
+        return self.serializeBytes().hex()
+
+    #
+    # Return the parts of the raw serialized transaction
+    # that make up the serialization without witnesses,
+    # i.e. everything except marker, flag and witnesses
+    #
+    def strippedParts(self):
+        raw = memoryview(self.serializeBytes())
+        if self.witnessOffset == None:
+            return [raw]
+        return [raw[:4], raw[6:self.witnessOffset], raw[-4:]]
         
     #
     # Derive the transaction ID
@@ -375,20 +1068,58 @@ class txn:
     # displayed. 
     #
     def getTxnId(self, byteorder="big"):
-        h = utils.hash256(bytes.fromhex(self.serialize()))
-        s = binascii.hexlify(h).decode('ascii')
+        h = self.getTxnIdBytes()
         #
         # Reverse bytewise if big endian encoding
         # is requested
         # 
         if byteorder == "big":
-            return serialize.serializeString(s, 32)
+            return serialize.reverseBytes(h).hex()
         elif byteorder == "little":
-            return s
+            return h.hex()
         else:
             raise ValueError("Invalid byte order")
         
         
+    #
+    # Get the transaction ID as raw bytes in little
+    # endian, i.e. as it is used in the Merkle tree.
+    # The transaction ID does not cover the witnesses, 
+    # so we hash the raw data piecewise, skipping them
+    #
+    def getTxnIdBytes(self):
+        if self.txid == None:
+            h = hashlib.sha256()
+            for part in self.strippedParts():
+                h.update(part)
+            self.txid = hashlib.sha256(h.digest()).digest()
+        return self.txid
+
+    #
+    # Get the witness transaction ID (BIP141), i.e. the hash 
+    # of the full serialization including the witnesses. For 
+    # transactions without witnesses, this is the transaction
+    # ID
+    #
+    def getWtxid(self, byteorder="big"):
+        h = self.getWtxidBytes()
+        if byteorder == "big":
+            return serialize.reverseBytes(h).hex()
+        elif byteorder == "little":
+            return h.hex()
+        else:
+            raise ValueError("Invalid byte order")
+
+    #
+    # Get the witness transaction ID as raw bytes in 
+    # little endian
+    #
+    def getWtxidBytes(self):
+        if not self.hasWitness():
+            return self.getTxnIdBytes()
+        return utils.hash256(self.serializeBytes())
+        
+        
     #
     # Add an input
     #
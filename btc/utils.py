@@ -34,7 +34,6 @@
 
 import hashlib
 import requests
-import binascii
 
 BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
 
@@ -136,48 +135,37 @@ def base58Decode(s):
 ###############################################
 
 #
-# Validate a DER signature according to the rules
-# defined in the reference implementation in 
-# script/integer.cpp, IsValidSignatureEncoding
+# Decode a DER signature followed by the hash type, as it 
+# appears in a script, and check it against the rules defined 
+# in the reference implementation in script/interpreter.cpp,
+# IsValidSignatureEncoding (BIP66). The signature is given by
+# the n bytes at offset start of a buffer (bytes or memoryview),
+# so that signatures can be decoded where they are, for instance
+# in a raw script, without copying them. Returns a tuple 
+# (r, s, hashType) or None if the signature is not strictly 
+# DER encoded
 #
-def isValidDERSignature(s):
-    b = bytes.fromhex(s)
-    if len(b) < 9:
-        return False
-    if len(b) > 73:
-        return False
-    #
-    # A signature is a DER sequence, so it should 
-    # start with the type code 0x30
-    #    
-    if b[0] != 0x30:
-        return False
-    # 
-    # Next field should be the length, not including the
+def decodeDERSignatureAt(buffer, start, n):
+    if (n < 9) or (n > 73):
+        return None
+    #
+    # A signature is a DER sequence, so it should start with the 
+    # type code 0x30, followed by the length, not including the
     # last byte (hashtype) and the two initial bytes
-    # 
-    if b[1] != (len(b) - 3):
-        return False
+    #
+    if (buffer[start] != 0x30) or (buffer[start + 1] != n - 3):
+        return None
     #
     # R and S are encoded as integers, both starting 
     # with the type code 0x02 followed by the length
     # in bytes
     #
-    lenR = b[3]
-    lenS = b[5 + lenR]
-
-    if (5 + lenR >= len(b)):
-        return False;
-
-    if (lenR + lenS + 7) != len(b):
-        return False        
-
-    if b[2] != 0x02:
-        return False
-
-    if b[lenR + 4] != 0x02: 
-        return False
-
+    lenR = buffer[start + 3]
+    if (buffer[start + 2] != 0x02) or (lenR == 0) or (5 + lenR >= n):
+        return None
+    lenS = buffer[start + lenR + 5]
+    if (lenS == 0) or (lenR + lenS + 7 != n) or (buffer[start + lenR + 4] != 0x02):
+        return None
     #
     # For both R and S, the first byte should not
     # have its most significant bit set (as this
@@ -185,19 +173,72 @@ def isValidDERSignature(s):
     # the leading byte should be zero in this case
     # - and in fact only in this case
     #
-    if (b[4] & 0x80): 
-        return False    
-    if lenR > 1:
-        if (b[4] == 0x00) and not (b[5] & 0x80):
-            return False
+    first = buffer[start + 4]
+    if (first & 0x80) or ((lenR > 1) and (first == 0x00) and not (buffer[start + 5] & 0x80)):
+        return None
+    first = buffer[start + lenR + 6]
+    if (first & 0x80) or ((lenS > 1) and (first == 0x00) and not (buffer[start + lenR + 7] & 0x80)):
+        return None
+    r = int.from_bytes(buffer[start + 4:start + 4 + lenR], "big")
+    s = int.from_bytes(buffer[start + lenR + 6:start + n - 1], "big")
+    return r, s, buffer[start + n - 1]
+
+
+#
+# Decode a DER signature followed by the hash type, given as 
+# bytes or as a hex string. Returns a tuple (r, s, hashType) or 
+# None if the signature is not strictly DER encoded
+#
+def decodeDERSignature(sig):
+    if isinstance(sig, str):
+        sig = bytes.fromhex(sig)
+    return decodeDERSignatureAt(sig, 0, len(sig))
+
+
+#
+# Decode a batch of signatures, for instance all signatures in a
+# block, in one pass. Each signature is given by a tuple 
+# (buffer, start, n) as for decodeDERSignatureAt, and several 
+# signatures can share the same buffer. The signatures are not 
+# copied into a common buffer but decoded where they are. Returns 
+# a list which contains a tuple (r, s, hashType) or None for 
+# each signature
+#
+def decodeDERSignatures(spans):
+    return [decodeDERSignatureAt(buffer, start, n) for buffer, start, n in spans]
+
+
+#
+# Same as decodeDERSignatures, but only return a list 
+# of booleans
+#
+def validateDERSignatures(spans):
+    return [decoded != None for decoded in decodeDERSignatures(spans)]
+
 
-    if (b[lenR + 6] & 0x80):
-        return False
-    if lenS > 1:
-        if (b[lenR + 6] == 0x00) and not (b[lenR + 7] & 0x80):
-            return False
+#
+# Validate a DER signature (given as hex string or bytes) 
+# followed by the hash type
+#
+def isValidDERSignature(s):
+    return decodeDERSignature(s) != None
 
-    return True
+
+#
+# Encode a signature (r, s) in DER format and append the
+# hash type. R and S are both represented by 02 - the DER code
+# for an integer - followed by their length and their values in 
+# big endian encoding. DER requires that the first byte has its
+# highest bit not set, as otherwise this would be interpreted as 
+# a negative integer, so we add a leading zero byte in this case.
+# The sequence (type code 0x30) of both does not include the
+# hash type
+#
+def encodeDERSignature(r, s, hashType):
+    rBytes = r.to_bytes((r.bit_length() + 8) // 8, "big")
+    sBytes = s.to_bytes((s.bit_length() + 8) // 8, "big")
+    return (bytes([0x30, 4 + len(rBytes) + len(sBytes), 0x02, len(rBytes)]) + rBytes 
+            + bytes([0x02, len(sBytes)]) + sBytes + bytes([hashType]))
     
     
 #################################################
@@ -268,44 +309,47 @@ def rpcCall(method, params = None, port=18332, host="localhost", user="user", pa
         
 
 #
-# Calculate the Merkle root given the leaves as a list. This
-# implementation is probably not the most efficient one,
-# but simple. Be careful - the list will be changed
+# Calculate the Merkle root given the leaves as a list of 
+# hex strings. Returns the Merkle root as a hex string
 #
 def merkleRoot(leaves):
     if 0 == len(leaves):
         raise ValueError("Should not be called with an empty list")
-    #
-    # If there is only one leave, we are done
-    #
-    if 1 == len(leaves):
-        return leaves[0]
-    #
-    # If the number of leaves is odd, append the last element again
-    #
-    if 1 == (len(leaves) % 2):
-        leaves.append(leaves[-1])
-    n = []
-    for i in range(len(leaves) // 2):
-        x = leaves[2*i] + leaves[2*i+1]
-        x = bytes.fromhex(x)
-        h = hash256(x)
-        n.append(binascii.hexlify(h).decode('ascii'))
-    return merkleRoot(n)
-    
-    
+    return merkleRootBytes([bytes.fromhex(_) for _ in leaves]).hex()
+
+
+#
+# Calculate the Merkle root given the leaves as a list
+# of bytes. Returns the Merkle root as bytes
+#
+def merkleRootBytes(leaves):
+    if 0 == len(leaves):
+        raise ValueError("Should not be called with an empty list")
+    level = leaves
+    while len(level) > 1:
+        #
+        # If the number of nodes is odd, use the last 
+        # element twice
+        #
+        if 1 == (len(level) % 2):
+            level = level + [level[-1]]
+        level = [hash256(level[i] + level[i+1]) for i in range(0, len(level), 2)]
+    return level[0]
     
     
 #
 # Get the Merkle root in little endian format for a given block
 #
 def blockMerkleRoot(block):
-    leaves = []
-    for tx in block.getTx():
-        leaves.append(tx.getTxnId(byteorder = "little"))
-    return merkleRoot(leaves)
-    
-    
+    leaves = [tx.getTxnIdBytes() for tx in block.getTx()]
+    return merkleRootBytes(leaves).hex()
 
-    
 
+#
+# Get the root of the Merkle tree built from the witness
+# transaction IDs (BIP141) in little endian format. The
+# coinbase transaction is represented by zeros
+#
+def blockWitnessMerkleRoot(block):
+    leaves = [bytes(32)] + [tx.getWtxidBytes() for tx in block.getTx()[1:]]
+    return merkleRootBytes(leaves).hex()
@@ -0,0 +1,271 @@
+####################################################
+# 
+# Verification of transactions and blocks
+#
+# MIT license
+#
+# Copyright (c) 2018 christianb93
+# Permission is hereby granted, free of charge, to 
+# any person obtaining a copy of this software and 
+# associated documentation files (the "Software"), 
+# to deal in the Software without restriction, 
+# including without limitation the rights to use, 
+# copy, modify, merge, publish, distribute, 
+# sublicense, and/or sell copies of the Software, 
+# and to permit persons to whom the Software is 
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice 
+# shall be included in all copies or substantial 
+# portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY 
+# OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT 
+# LIMITED TO THE WARRANTIES OF MERCHANTABILITY, 
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. 
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS 
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, 
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, 
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE 
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+####################################################
+
+from . import interpreter
+from . import pool
+from . import script
+from . import secp256k1
+from . import serialize
+from . import txn
+
+
+#
+# The functions in this module verify the signatures of all inputs
+# of a transaction or a block. The signature hashes are computed 
+# in the calling process, only the ECDSA verifications are
+# distributed across a pool of worker processes. 
+#
+# The result for each input is True if the signature is valid, 
+# False if it is not and None if the input has not been checked 
+# because an invalid input was found before. 
+#
+# Successful checks are remembered in script.SIGNATURE_CACHE. When
+# a transaction has been verified with verifyTransaction, its 
+# signatures are therefore not verified again by verifyBlock. As a
+# block is only seen once, verifyBlock does not add to the cache
+#
+
+
+#
+# Verify a list of checks as returned by script.signatureCheck, with
+# the public keys decoded by decodeKeys. This runs in the worker 
+# processes. All checks are verified as one batch, so that only two 
+# modular inversions are needed for the whole list. Results after 
+# the first invalid signature are reported as None
+#
+def verifyChecks(checks):
+    results = secp256k1.batchVerify(checks)
+    if False in results:
+        first = results.index(False)
+        results[first + 1:] = [None]*(len(results) - first - 1)
+    return results
+
+
+#
+# Prepare the check for an input. Returns False if the
+# input can be rejected without verifying a signature. Inputs
+# that do not follow one of the standard patterns are verified
+# right away with the interpreter, the result is then True 
+# or False. If store is False, the interpreter does not add
+# to the signature cache
+#
+def prepareCheck(tx, nInput, spentOutput, context, store = True):
+    if spentOutput == None:
+        return False
+    try:
+        check = script.signatureCheck(tx, nInput, spentOutput, context)
+    except (TypeError, ValueError):
+        return False
+    if check == None:
+        return interpreter.verifyInput(tx, nInput, spentOutput, context, store)
+    return check
+
+
+#
+# Decode the public keys of all checks at once, so that 
+# each distinct key is only decoded once and the workers 
+# receive the points. A check with an invalid key is 
+# replaced by False
+#
+def decodeKeys(checks):
+    valid = [check for check in checks if check != False]
+    points = iter(secp256k1.decodePoints([bytes.fromhex(check[3]) for check in valid]))
+    decoded = []
+    for check in checks:
+        if check == False:
+            decoded.append(False)
+            continue
+        point = next(points)
+        if point == None:
+            decoded.append(False)
+        else:
+            decoded.append((check[0], check[1], check[2], point))
+    return decoded
+
+
+#
+# Run a list of checks and return the results. Parameters:
+# - checks - a list of checks, where an entry False marks an input
+#            that is already known to be invalid
+# - workers - the number of worker processes, defaults to the number of CPUs.
+#             If this is 1 or if there are less than PARALLEL_THRESHOLD
+#             checks, everything is done in the calling process
+# - executor - an existing concurrent.futures.Executor to use instead of 
+#              the pool of btc.pool
+# - store - add successful checks to the signature cache
+# Checks that are found in the signature cache are not run again, their
+# result is True. The same applies to entries True, which mark inputs 
+# that have already been verified by the interpreter
+#
+def runChecks(checks, workers = None, executor = None, store = True):
+    cache = script.SIGNATURE_CACHE
+    results = [None]*len(checks)
+    pending = []
+    cached = []
+    for i in range(len(checks)):
+        if checks[i] is True:
+            results[i] = True
+            cached.append(i)
+        elif (checks[i] != False) and cache.contains(checks[i]):
+            results[i] = True
+            cached.append(i)
+        else:
+            pending.append(i)
+    if len(pending) == 0:
+        return results
+    pendingResults = dispatchChecks([checks[i] for i in pending], workers, executor)
+    for i, result in zip(pending, pendingResults):
+        results[i] = result
+        if result and store:
+            cache.add(checks[i])
+    #
+    # As without the cache, we do not report results
+    # after the first invalid input
+    #
+    if False in results:
+        first = results.index(False)
+        for i in cached:
+            if i > first:
+                results[i] = None
+    return results
+
+
+#
+# Below this number of checks, we verify in the calling process 
+# as sending the checks to the workers would take longer than 
+# verifying them
+#
+PARALLEL_THRESHOLD = 16
+
+
+#
+# Verify the checks that are not cached. Keys are decoded first, 
+# and an invalid key marks the input as invalid. As for verifyChecks, 
+# the result of every input before the first invalid input is 
+# determined, and the results after it are None
+#
+def dispatchChecks(checks, workers, executor):
+    checks = decodeKeys(checks)
+    if False in checks:
+        first = checks.index(False)
+        results = verifyDecoded(checks[:first], workers, executor)
+        if False not in results:
+            results.append(False)
+        return results + [None]*(len(checks) - len(results))
+    return verifyDecoded(checks, workers, executor)
+
+
+#
+# Distribute decoded checks across the workers, unless there are 
+# only a few of them
+#
+def verifyDecoded(checks, workers, executor):
+    if len(checks) == 0:
+        return []
+    if (executor == None) and (len(checks) < PARALLEL_THRESHOLD):
+        return verifyChecks(checks)
+    return pool.runChunks(verifyChecks, checks, workers, executor, 
+                          chunksPerWorker = 4, stopOnFalse = True)
+
+
+#
+# Verify all inputs of a transaction, given the list of outputs 
+# spent by the inputs (in the same order). Returns the list of
+# results, one per input
+#
+def verifyTransaction(tx, spentOutputs, workers = None, executor = None):
+    if not isinstance(tx, txn.txn):
+        raise TypeError("Expecting transaction")
+    if len(spentOutputs) != len(tx.getInputs()):
+        raise ValueError("Need one spent output per input")
+    context = script.sighashContext(tx)
+    checks = [prepareCheck(tx, nInput, spentOutputs[nInput], context) 
+              for nInput in range(len(tx.getInputs()))]
+    return runChecks(checks, workers, executor)
+
+
+#
+# Verify all inputs of all transactions in a block. The spent
+# outputs are looked up in utxoView, which can be any object with 
+# a method get (for instance a dictionary) that maps a pair 
+# (transaction ID in big endian, index) to a txn.txout. Outputs 
+# created by earlier transactions in the same block can be spent
+# as well. Returns a list which contains, for each transaction, 
+# the list of results for its inputs. The coinbase transaction
+# is not verified, its list is empty
+#
+# Note that this only checks the scripts of the inputs and is not 
+# a full validation of the block. Amounts, lock times of the 
+# transactions (BIP68 and nLockTime itself), the merkle root and 
+# the proof of work are not checked, and taproot spends are accepted
+# without checking them, see the comments in interpreter.py
+#
+def verifyBlock(block, utxoView, workers = None, executor = None):
+    created = {}
+    checks = []
+    counts = []
+    #
+    # Convert the transaction IDs and the IDs of the spent
+    # transactions to big endian and decode the signatures 
+    # in the signature scripts for the whole block at once
+    #
+    inputs = [txin for tx in block.getTx() if not tx.isCoinbase() for txin in tx.getInputs()]
+    txids = serialize.reverseHexList([tx.getTxnIdBytes() for tx in block.getTx()])
+    prevTxids = iter(serialize.reverseHexList([txin.prevTxidBytes for txin in inputs]))
+    txn.txin.parseScriptSigs(inputs)
+    for tx, txid in zip(block.getTx(), txids):
+        if tx.isCoinbase():
+            counts.append(0)
+        else:
+            context = script.sighashContext(tx)
+            nInput = 0
+            for txin in tx.getInputs():
+                key = (next(prevTxids), txin.getVout())
+                spentOutput = created.get(key)
+                if spentOutput == None:
+                    spentOutput = utxoView.get(key)
+                checks.append(prepareCheck(tx, nInput, spentOutput, context, store = False))
+                nInput += 1
+            counts.append(nInput)
+        for i in range(len(tx.getOutputs())):
+            created[(txid, i)] = tx.getOutputs()[i]
+    results = runChecks(checks, workers, executor, store = False)
+    #
+    # Split the results per transaction
+    #
+    blockResults = []
+    start = 0
+    for count in counts:
+        blockResults.append(results[start:start + count])
+        start += count
+    return blockResults
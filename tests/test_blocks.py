@@ -1,5 +1,7 @@
 import btc.block
 
+import io
+
 #
 # Compare two strings and return the first charqcte where they
 # differ or minus 1
@@ -149,3 +151,80 @@ def test_tc7():
     #
     assert(block.getBlockHeader().getMerkleRoot() == merkleRoot)
     
+
+
+#
+# Deserialize a block from a byte reader
+#
+def test_tc8():
+    raw = '000000208b04e3a08be31c35257492f18bfac10c5ead328b5a4012473ef20a903cd49850bd11c56cf26bf256e4cdd00cd21b68c37f3b71d9614e9630226f5fa09b4104c1d7a1bf5affff7f20020000000202000000010000000000000000000000000000000000000000000000000000000000000000ffffffff04016c0101ffffffff02a803062a01000000232102a2f9ed878030526366b30093c00e32934f3c04a884f2844af2883ee453f0228dac0000000000000000266a24aa21a9ede8d2abc7618be366fa6688272429dac8512666a1610a72c6a72527c4698ccafc000000000200000001a88649b2ec24cb6fa07011acb68749461d7c438e8b89ddbcea3f5bac89e3ad2b010000006b483045022100ca652e20c2a0ceae370a2c037d8bbce09498c883a7a98a541e8f9fcea294d8c902207a16331540cd8a892186926646f99220489de0a9a9713f870b1c6989cf22948c012103f9fa8e3fba8af74b6c8ba4bd530000df4cc62bf0a50aeff58b6462888f79a5cefeffffff0280d1f008000000001976a914625d8e5d40a1b797b47cb66eee958724a668d8d288acd87adfa9000000001976a914731a59d04408789756ae353eeba6eefc975bfe7688ac1f000000'
+    reader = btc.serialize.ByteReader(bytes.fromhex(raw))
+    block = btc.block.block()
+    block.deserialize(reader)
+    assert(0 == reader.remaining())
+    tx = block.getTx()
+    assert(2 == len(tx))
+    assert(tx[1].getTxnId(byteorder="big") == 'b257a1ff6503d2d93fd5c8fc49c91c3cfc14f38f34788217320b32e4a30e9b40')
+    assert(block.serialize() == raw)
+
+
+#
+# A stream that returns at most a few bytes per call
+#
+class slowStream:
+
+    def __init__(self, data, chunk = 7):
+        self.stream = io.BytesIO(data)
+        self.chunk = chunk
+
+    def readinto(self, b):
+        return self.stream.readinto(memoryview(b)[:self.chunk])
+
+
+#
+# Read two blocks in a row from a stream
+#
+def test_tc9():
+    raw = '000000208b04e3a08be31c35257492f18bfac10c5ead328b5a4012473ef20a903cd49850bd11c56cf26bf256e4cdd00cd21b68c37f3b71d9614e9630226f5fa09b4104c1d7a1bf5affff7f20020000000202000000010000000000000000000000000000000000000000000000000000000000000000ffffffff04016c0101ffffffff02a803062a01000000232102a2f9ed878030526366b30093c00e32934f3c04a884f2844af2883ee453f0228dac0000000000000000266a24aa21a9ede8d2abc7618be366fa6688272429dac8512666a1610a72c6a72527c4698ccafc000000000200000001a88649b2ec24cb6fa07011acb68749461d7c438e8b89ddbcea3f5bac89e3ad2b010000006b483045022100ca652e20c2a0ceae370a2c037d8bbce09498c883a7a98a541e8f9fcea294d8c902207a16331540cd8a892186926646f99220489de0a9a9713f870b1c6989cf22948c012103f9fa8e3fba8af74b6c8ba4bd530000df4cc62bf0a50aeff58b6462888f79a5cefeffffff0280d1f008000000001976a914625d8e5d40a1b797b47cb66eee958724a668d8d288acd87adfa9000000001976a914731a59d04408789756ae353eeba6eefc975bfe7688ac1f000000'
+    f = slowStream(bytes.fromhex(raw + raw))
+    for _ in range(2):
+        block = btc.block.block.fromStream(f)
+        assert(2 == len(block.getTx()))
+        assert(block.serialize() == raw)
+    #
+    # The stream should now be exhausted
+    #
+    try:
+        btc.block.blockHeader.fromStream(f)
+        assert(False)
+    except TypeError:
+        pass
+
+
+
+#
+# Size and weight of a block without witnesses
+#
+def test_tc10():
+    raw = '000000208b04e3a08be31c35257492f18bfac10c5ead328b5a4012473ef20a903cd49850bd11c56cf26bf256e4cdd00cd21b68c37f3b71d9614e9630226f5fa09b4104c1d7a1bf5affff7f20020000000202000000010000000000000000000000000000000000000000000000000000000000000000ffffffff04016c0101ffffffff02a803062a01000000232102a2f9ed878030526366b30093c00e32934f3c04a884f2844af2883ee453f0228dac0000000000000000266a24aa21a9ede8d2abc7618be366fa6688272429dac8512666a1610a72c6a72527c4698ccafc000000000200000001a88649b2ec24cb6fa07011acb68749461d7c438e8b89ddbcea3f5bac89e3ad2b010000006b483045022100ca652e20c2a0ceae370a2c037d8bbce09498c883a7a98a541e8f9fcea294d8c902207a16331540cd8a892186926646f99220489de0a9a9713f870b1c6989cf22948c012103f9fa8e3fba8af74b6c8ba4bd530000df4cc62bf0a50aeff58b6462888f79a5cefeffffff0280d1f008000000001976a914625d8e5d40a1b797b47cb66eee958724a668d8d288acd87adfa9000000001976a914731a59d04408789756ae353eeba6eefc975bfe7688ac1f000000'
+    block = btc.block.block()
+    block.deserialize(raw)
+    assert(block.getSize() == len(raw) // 2)
+    assert(block.getWeight() == 4*block.getSize())
+
+
+#
+# Hashes with the wrong length are not padded or 
+# truncated when a header is serialized
+#
+def test_tc11():
+    header = btc.block.blockHeader(prevBlockId = "00"*32, merkleRoot = "11"*32)
+    assert(len(header.serializeBytes()) == 80)
+    for prevBlockId, merkleRoot in [("00"*31, "11"*32), ("00"*32, "11"*33), (None, "11"*32)]:
+        header = btc.block.blockHeader(prevBlockId = prevBlockId, merkleRoot = merkleRoot)
+        for f in [header.serializeBytes, header.serialize, header.getBlockHash]:
+            try:
+                f()
+                assert(False)
+            except ValueError:
+                pass
@@ -0,0 +1,326 @@
+import btc.interpreter
+import btc.mining
+import btc.script
+import btc.secp256k1
+import btc.txn
+import btc.utils
+import btc.verify
+
+import hashlib
+import time
+
+
+PUBKEYS = ["0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798",
+           "02c6047f9441ed7d6d3045406e95c07cd85c778e4b8cef3ca7abac09b95c709ee5",
+           "02f9308a019258c31049344f85f89d5229b531c845836f99b08601f113bce036f9"]
+
+PREV_TXID = "13619b505d99bc5ee353a8e4a707164d54320134ccdb0795d89f5002e32e63a3"
+
+#
+# A 2-of-3 multisig script for the private keys 1, 2 and 3
+#
+MULTISIG = (bytes([btc.interpreter.OP_1 + 1]) 
+            + b''.join(btc.interpreter.pushBytes(bytes.fromhex(k)) for k in PUBKEYS)
+            + bytes([btc.interpreter.OP_1 + 2, btc.interpreter.OP_CHECKMULTISIG]))
+
+
+#
+# Run a script without signatures and return True if it succeeds
+#
+def run(code):
+    return btc.interpreter.verifyScript(b'', code, [], None)
+
+
+#
+# Create an output with a raw public key script
+#
+def createOutput(code, value = 100000):
+    txo = btc.txn.txout()
+    txo.deserialize(value.to_bytes(8, "little") + bytes([len(code)]) + code)
+    return txo
+
+
+#
+# Create a transaction with one input for each spent output
+#
+def createTxn(txos):
+    tx = btc.txn.txn()
+    for i in range(len(txos)):
+        tx.addInput(btc.txn.txin(prevTxid = PREV_TXID, vout = i))
+    tx.addOutput(btc.txn.txout(value = 10000, 
+                               scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2PK, 
+                                                                      pubKeyHex = PUBKEYS[0])))
+    return tx
+
+
+#
+# Sign a hash and return the DER signature with hash type
+#
+def sign(h, secret, hashType = btc.script.SIGHASHTYPE_ALL):
+    h = int.from_bytes(h, "big")
+    r, s = btc.script.signHash(h, secret, btc.secp256k1.nonceGenerator(secret).nonce(h))
+    der = btc.script.scriptSig(scriptType = btc.script.SCRIPTTYPE_P2PK, r = r, s = s, hashType = hashType).serialize()
+    return bytes.fromhex(der)[1:]
+
+
+#
+# Numbers and booleans
+#
+def test_tc1():
+    for n in [0, 1, -1, 127, 128, -128, 255, 256, -32768, 2**31 - 1, -(2**31 - 1)]:
+        assert(btc.interpreter.decodeNumber(btc.interpreter.encodeNumber(n)) == n)
+    assert(btc.interpreter.encodeNumber(-1) == b'\x81')
+    assert(btc.interpreter.encodeNumber(128) == b'\x80\x00')
+    assert(btc.interpreter.encodeNumber(-128) == b'\x80\x80')
+    assert(not btc.interpreter.castToBool(b''))
+    assert(not btc.interpreter.castToBool(b'\x00\x00'))
+    assert(not btc.interpreter.castToBool(b'\x00\x80'))
+    assert(btc.interpreter.castToBool(b'\x80\x00'))
+    try:
+        btc.interpreter.decodeNumber(b'\x01'*5)
+        assert(False)
+    except ValueError:
+        pass
+
+
+#
+# Arithmetic, stack operations and flow control
+#
+def test_tc2():
+    I = btc.interpreter
+    assert(run(bytes([I.OP_1 + 1, I.OP_1 + 2, I.OP_ADD, I.OP_1 + 4, I.OP_EQUAL])))
+    assert(not run(bytes([I.OP_1 + 1, I.OP_1 + 2, I.OP_ADD, I.OP_1 + 5, I.OP_EQUAL])))
+    assert(run(bytes([I.OP_1, I.OP_1 + 1, I.OP_SWAP, I.OP_SUB, I.OP_1, I.OP_NUMEQUAL])))
+    assert(run(bytes([I.OP_1 + 2, I.OP_1 + 1, I.OP_1 + 4, I.OP_WITHIN])))
+    assert(run(bytes([I.OP_1, I.OP_1 + 1, I.OP_1 + 2, I.OP_ROT, I.OP_1, I.OP_EQUALVERIFY, I.OP_2DROP, I.OP_1])))
+    assert(run(bytes([I.OP_1, I.OP_1 + 1, I.OP_1 + 2, I.OP_1 + 1, I.OP_PICK, I.OP_1, I.OP_EQUAL])))
+    assert(run(bytes([I.OP_0, I.OP_IF, I.OP_0, I.OP_ELSE, I.OP_1, I.OP_ENDIF])))
+    assert(not run(bytes([I.OP_1, I.OP_IF, I.OP_0, I.OP_ELSE, I.OP_1, I.OP_ENDIF])))
+    assert(run(bytes([I.OP_1, I.OP_NOTIF, I.OP_RETURN, I.OP_ENDIF, I.OP_1])))
+    assert(run(bytes([I.OP_1, I.OP_TOALTSTACK, I.OP_DEPTH, I.OP_NOT, I.OP_VERIFY, I.OP_FROMALTSTACK])))
+    assert(run(b'\x03abc' + bytes([I.OP_SIZE, I.OP_1 + 2, I.OP_EQUALVERIFY, I.OP_SHA256]) 
+               + I.pushBytes(hashlib.sha256(b'abc').digest()) + bytes([I.OP_EQUAL])))
+    #
+    # Invalid scripts
+    #
+    assert(not run(bytes([I.OP_1, I.OP_RETURN])))
+    assert(not run(bytes([I.OP_1, I.OP_IF, I.OP_1])))
+    assert(not run(bytes([I.OP_1, I.OP_ENDIF])))
+    assert(not run(bytes([I.OP_1, I.OP_0, I.OP_IF, I.OP_CAT, I.OP_ENDIF])))
+    assert(not run(bytes([I.OP_1, I.OP_0, I.OP_IF, I.OP_VERIF, I.OP_ENDIF])))
+    assert(run(bytes([I.OP_1, I.OP_0, I.OP_IF, 0xba, I.OP_ENDIF])))
+    assert(not run(bytes([I.OP_1, 0xba])))
+    assert(not run(bytes([I.OP_PUSHDATA1, 5, 1, 2])))
+    assert(not run(bytes([I.OP_DROP, I.OP_1])))
+    assert(not run(bytes([I.OP_1] + [I.OP_NOP]*202)))
+    assert(run(bytes([I.OP_1] + [I.OP_NOP]*201)))
+    assert(I.isPushOnly(b'\x00\x02ab' + bytes([I.OP_16])))
+    assert(not I.isPushOnly(bytes([I.OP_1, I.OP_NOP])))
+
+
+#
+# The standard scripts
+#
+def test_tc3():
+    txos = [btc.txn.txout(value = 100000, 
+                          scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2PK, pubKeyHex = PUBKEYS[0])),
+            btc.txn.txout(value = 200000,
+                          scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2PKH, 
+                                                                 pubKeyHash = btc.utils.hash160(bytes.fromhex(PUBKEYS[1])).hex())),
+            btc.txn.txout(value = 300000,
+                          scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2WPKH, 
+                                                                 pubKeyHash = btc.utils.hash160(bytes.fromhex(PUBKEYS[2])).hex()))]
+    tx = createTxn(txos)
+    btc.script.signTransaction(tx, txos, [1, 2, 3])
+    for i in range(3):
+        assert(btc.interpreter.verifyInput(tx, i, txos[i]))
+    #
+    # Signatures do not match the outputs
+    #
+    assert(not btc.interpreter.verifyInput(tx, 0, txos[1]))
+    assert(not btc.interpreter.verifyInput(tx, 1, txos[2]))
+    assert(not btc.interpreter.verifyInput(tx, 2, txos[0]))
+    txos[2].setValue(300001)
+    assert(not btc.interpreter.verifyInput(tx, 2, txos[2]))
+
+
+#
+# P2SH and bare multisig
+#
+def test_tc4():
+    P2SH = bytes([btc.interpreter.OP_HASH160, 20]) + btc.utils.hash160(MULTISIG) + bytes([btc.interpreter.OP_EQUAL])
+    txos = [createOutput(P2SH), createOutput(MULTISIG)]
+    tx = createTxn(txos)
+    context = btc.script.sighashContext(tx)
+    sigs = [[sign(context.signatureHash(i, MULTISIG), secret) for secret in [1, 2, 3]] for i in range(2)]
+    push = btc.interpreter.pushBytes
+    tx.getInputs()[0].scriptSigHex = (b'\x00' + push(sigs[0][0]) + push(sigs[0][2]) + push(MULTISIG)).hex()
+    tx.getInputs()[1].scriptSigHex = (b'\x00' + push(sigs[1][1]) + push(sigs[1][2])).hex()
+    assert(btc.interpreter.verifyInput(tx, 0, txos[0]))
+    assert(btc.interpreter.verifyInput(tx, 1, txos[1]))
+    assert(btc.script.verifySignature(tx, 0, txos[0]))
+    assert(btc.verify.verifyTransaction(tx, txos, workers = 1) == [True, True])
+    #
+    # Signatures in the wrong order, not enough signatures, 
+    # a non-empty dummy element and a wrong redeem script
+    #
+    tx.getInputs()[1].scriptSigHex = (b'\x00' + push(sigs[1][2]) + push(sigs[1][1])).hex()
+    assert(not btc.interpreter.verifyInput(tx, 1, txos[1]))
+    tx.getInputs()[1].scriptSigHex = (b'\x00' + push(sigs[1][2]) + push(sigs[1][2])).hex()
+    assert(not btc.interpreter.verifyInput(tx, 1, txos[1]))
+    tx.getInputs()[1].scriptSigHex = (b'\x51' + push(sigs[1][1]) + push(sigs[1][2])).hex()
+    assert(not btc.interpreter.verifyInput(tx, 1, txos[1]))
+    tx.getInputs()[0].scriptSigHex = (b'\x00' + push(sigs[0][0]) + push(sigs[0][2]) + push(MULTISIG + b'\x51')).hex()
+    assert(not btc.interpreter.verifyInput(tx, 0, txos[0]))
+    #
+    # The signature script for P2SH needs to be push only
+    #
+    tx.getInputs()[0].scriptSigHex = (b'\x00' + push(sigs[0][0]) + push(sigs[0][2]) + b'\x61' + push(MULTISIG)).hex()
+    assert(not btc.interpreter.verifyInput(tx, 0, txos[0]))
+
+
+#
+# P2WSH and OP_RETURN
+#
+def test_tc5():
+    P2WSH = bytes([btc.interpreter.OP_0, 32]) + hashlib.sha256(MULTISIG).digest()
+    RETURN = bytes([btc.interpreter.OP_RETURN]) + btc.interpreter.pushBytes(b'data')
+    txos = [createOutput(P2WSH, 500000), createOutput(RETURN)]
+    tx = createTxn(txos)
+    context = btc.script.sighashContext(tx)
+    h = context.witnessSignatureHash(0, MULTISIG, 500000)
+    tx.getInputs()[0].setWitness([b'', sign(h, 1), sign(h, 2), MULTISIG])
+    assert(btc.interpreter.verifyInput(tx, 0, txos[0]))
+    assert(not btc.interpreter.verifyInput(tx, 0, createOutput(P2WSH, 500001)))
+    tx.getInputs()[0].setWitness([b'', sign(h, 1), sign(h, 2), MULTISIG + b'\x51'])
+    assert(not btc.interpreter.verifyInput(tx, 0, txos[0]))
+    #
+    # Outputs with OP_RETURN can not be spent
+    #
+    tx.getInputs()[1].scriptSigHex = "51"
+    assert(not btc.interpreter.verifyInput(tx, 1, txos[1]))
+    assert(not btc.script.verifySignature(tx, 1, txos[1]))
+
+
+#
+# Witness programs with an unknown version succeed (BIP141), 
+# version 0 programs need to have a valid length
+#
+def test_tc6():
+    for version in [1, 2, 16]:
+        program = bytes([btc.interpreter.OP_1 + version - 1, 32]) + b'\x01'*32
+        assert(btc.interpreter.verifyScript(b'', program, [b'\x01'], None))
+    assert(not btc.interpreter.verifyScript(b'', bytes([btc.interpreter.OP_0, 24]) + b'\x01'*24, [b'\x01'], None))
+    #
+    # The signature script still needs to be empty
+    #
+    assert(not btc.interpreter.verifyScript(b'\x51', bytes([btc.interpreter.OP_1, 32]) + b'\x01'*32, [], None))
+
+
+#
+# Signature hash types other than SIGHASH_ALL
+#
+def test_tc7():
+    P2PK = btc.interpreter.pushBytes(bytes.fromhex(PUBKEYS[0])) + bytes([btc.interpreter.OP_CHECKSIG])
+    P2WPKH = bytes([btc.interpreter.OP_0, 20]) + btc.utils.hash160(bytes.fromhex(PUBKEYS[0]))
+    P2PKH = (bytes([btc.interpreter.OP_DUP, btc.interpreter.OP_HASH160, 20]) + btc.utils.hash160(bytes.fromhex(PUBKEYS[0])) 
+             + bytes([btc.interpreter.OP_EQUALVERIFY, btc.interpreter.OP_CHECKSIG]))
+    NONE = btc.script.SIGHASHTYPE_NONE
+    SINGLE = btc.script.SIGHASHTYPE_SINGLE
+    ANYONECANPAY = btc.script.SIGHASHTYPE_ANYONECANPAY
+    for hashType in [NONE, SINGLE, NONE | ANYONECANPAY, SINGLE | ANYONECANPAY, btc.script.SIGHASHTYPE_ALL | ANYONECANPAY]:
+        txos = [createOutput(P2PK), createOutput(P2WPKH, 200000)]
+        tx = createTxn(txos)
+        tx.addOutput(btc.txn.txout(value = 20000, scriptPubKey = tx.getOutputs()[0].getScriptPubKey()))
+        context = btc.script.sighashContext(tx)
+        legacySig = sign(context.signatureHash(0, P2PK, hashType), 1, hashType)
+        witnessSig = sign(context.witnessSignatureHash(1, P2PKH, 200000, hashType), 1, hashType)
+        tx.getInputs()[0].scriptSigHex = btc.interpreter.pushBytes(legacySig).hex()
+        tx.getInputs()[1].setWitness([witnessSig, bytes.fromhex(PUBKEYS[0])])
+        assert(btc.interpreter.verifyInput(tx, 0, txos[0]))
+        assert(btc.interpreter.verifyInput(tx, 1, txos[1]))
+        #
+        # Changing the value of the last output only breaks 
+        # signatures which cover all outputs
+        #
+        tx.getOutputs()[1].value = 30000
+        assert(btc.interpreter.verifyInput(tx, 0, txos[0]) == ((hashType & 0x1f) != btc.script.SIGHASHTYPE_ALL))
+        assert(btc.interpreter.verifyInput(tx, 1, txos[1]) == ((hashType & 0x1f) == NONE))
+        #
+        # None of these hash types covers the sequence number
+        # of the other input
+        #
+        tx.getOutputs()[1].value = 20000
+        tx.getInputs()[1].sequence = 0
+        assert(btc.interpreter.verifyInput(tx, 0, txos[0]))
+    #
+    # SIGHASH_SINGLE for an input without a corresponding output 
+    # signs the number one
+    #
+    context = btc.script.sighashContext(createTxn([createOutput(P2PK)]*2))
+    assert(context.signatureHash(1, P2PK, SINGLE) == b'\x01' + bytes(31))
+
+
+#
+# OP_CHECKLOCKTIMEVERIFY and OP_CHECKSEQUENCEVERIFY
+#
+def test_tc8():
+    def lockScript(n, opcode):
+        return btc.interpreter.pushBytes(btc.interpreter.encodeNumber(n)) + bytes([opcode, btc.interpreter.OP_DROP, btc.interpreter.OP_1])
+    CLTV = btc.interpreter.OP_CHECKLOCKTIMEVERIFY
+    CSV = btc.interpreter.OP_CHECKSEQUENCEVERIFY
+    txo = createOutput(lockScript(1000, CLTV))
+    tx = createTxn([txo])
+    tx.getInputs()[0].sequence = 0xfffffffe
+    for locktime, valid in [(999, False), (1000, True), (2000, True), (600000000, False)]:
+        tx.locktime = locktime
+        assert(btc.interpreter.verifyInput(tx, 0, txo) == valid)
+    #
+    # A final input disables the lock time
+    #
+    tx.getInputs()[0].sequence = 0xffffffff
+    assert(not btc.interpreter.verifyInput(tx, 0, txo))
+    assert(not btc.interpreter.verifyInput(tx, 0, createOutput(lockScript(-1, CLTV))))
+    #
+    # Relative lock times, in blocks and in units of 512 seconds
+    #
+    txo = createOutput(lockScript(10, CSV))
+    for version, sequence, valid in [(2, 10, True), (2, 9, False), (2, 11, True), (1, 10, False),
+                                     (2, 10 | (1 << 22), False), (2, (1 << 31) | 10, False)]:
+        tx = createTxn([txo])
+        tx.version = version
+        tx.getInputs()[0].sequence = sequence
+        assert(btc.interpreter.verifyInput(tx, 0, txo) == valid)
+    #
+    # With the disable flag, OP_CHECKSEQUENCEVERIFY is a NOP
+    #
+    tx.getInputs()[0].sequence = 0
+    assert(btc.interpreter.verifyInput(tx, 0, createOutput(lockScript(1 << 31, CSV))))
+
+
+#
+# Inputs verified by the interpreter as part of a block are
+# not added to the signature cache
+#
+def test_tc9():
+    txos = [createOutput(MULTISIG)]
+    tx = createTxn(txos)
+    context = btc.script.sighashContext(tx)
+    sigs = [sign(context.signatureHash(0, MULTISIG), secret) for secret in [1, 2]]
+    push = btc.interpreter.pushBytes
+    tx.getInputs()[0].scriptSigHex = (b'\x00' + push(sigs[0]) + push(sigs[1])).hex()
+    btc.script.resetSignatureCache()
+    assert(btc.interpreter.verifyInput(tx, 0, txos[0], store = False))
+    assert(len(btc.script.SIGNATURE_CACHE) == 0)
+    block = btc.mining.createNewBlock(address = "mhjfPZW5gTHetzzmSwpEqhvZC9TZ1sCAdu", 
+                                    currentLastBlockHash = "40fd433db35e43c9997e702fb0f11bbe171712675651e03461fabb98fbc29598", 
+                                    currentHeight = 109, 
+                                    coinbasevalue = 50*10**8, 
+                                    bits = int("207fffff",16), tx = [tx],
+                                    mintime = int(time.time()))
+    utxoView = {(tx.getInputs()[0].getPrevTxId(), 0) : txos[0]}
+    assert(btc.verify.verifyBlock(block, utxoView, workers = 1) == [[], [True]])
+    assert(len(btc.script.SIGNATURE_CACHE) == 0)
+    assert(btc.verify.verifyTransaction(tx, txos, workers = 1) == [True])
+    assert(len(btc.script.SIGNATURE_CACHE) == 2)
+    btc.script.resetSignatureCache()
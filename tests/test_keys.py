@@ -54,3 +54,22 @@ def test_tc6():
     hex_compressed = "02e054ae47f44530f83edb73fe6c5b76b42f3ffab24e2cc12cdc4a77126831324e"
     assert("mx5zVKcjohqsu4G8KJ83esVxN52XiMvGTY" == btc.keys.ecAddress(hex_compressed, version=239))
     
+
+
+#
+# Derive a public key from a private key
+#
+def test_tc7():
+    assert(btc.keys.ecPublicKeyHex(1) == "0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798")
+    secret = btc.keys.wifToPayload("cVDUgUEahS1swavidSk1zdSHQpCy1Ac9XSQHkaxmZKcTTfEA5vTY")
+    pubKeyHex = btc.keys.ecPublicKeyHex(secret)
+    assert(pubKeyHex == "02e054ae47f44530f83edb73fe6c5b76b42f3ffab24e2cc12cdc4a77126831324e")
+    assert(btc.keys.ecAddress(pubKeyHex, 239) == "mx5zVKcjohqsu4G8KJ83esVxN52XiMvGTY")
+
+
+#
+# Derive several public keys at once
+#
+def test_tc8():
+    secrets = [1, 2, 3, 103028256105408389446438916672504271192164767440296751065327418112299269382535]
+    assert(btc.keys.ecPublicKeysHex(secrets) == [btc.keys.ecPublicKeyHex(secret) for secret in secrets])
@@ -99,3 +99,31 @@ def test_tc4():
     # Check block
     #
     assert(btc.mining.checkBlock(block, currentLastBlock = "40fd433db35e43c9997e702fb0f11bbe171712675651e03461fabb98fbc29598"))
+
+
+#
+# Create a new block containing a segregated witness transaction.
+# The coinbase transaction needs to commit to the witnesses
+#
+def test_tc5():
+    tx = btc.txn.txn()
+    tx.deserialize("01000000000102fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f00000000494830450221008b9d1dc26ba6a9cb62127b02742fa9d754cd3bebf337f7a55d114c8e5cdd30be022040529b194ba3f9281a99f2b1c0a19c0489bc22ede944ccf4ecbab4cc618ef3ed01eeffffffef51e1b804cc89d182d279655c3aa89e815b1b309fe287d9b2b55d57b90ec68a0100000000ffffffff02202cb206000000001976a9148280b37df378db99f66f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac000247304402203609e17b84f6a7d30c80bfa610b5b4542f32a8a0d5447a12fb1366d7f01cc44a0220573a954c4518331561406f90300e8f3358f51928d43c212a8caed02de67eebee0121025476c2e83188368da1ff3e292e7acafcdb3566bb0ad253f62fc70f07aeee635711000000")
+    block = btc.mining.createNewBlock(address = "mhjfPZW5gTHetzzmSwpEqhvZC9TZ1sCAdu", 
+                                    currentLastBlockHash = "40fd433db35e43c9997e702fb0f11bbe171712675651e03461fabb98fbc29598", 
+                                    currentHeight = 109, 
+                                    coinbasevalue = 50*10**8, 
+                                    bits = int("207fffff",16), tx = [tx],
+                                    mintime = int(time.time()))
+    coinbase = block.getTx()[0]
+    assert(coinbase.getInputs()[0].getWitness() == [bytes(32)])
+    commitment = coinbase.getOutputs()[-1]
+    assert(0 == commitment.getValue())
+    witnessRoot = btc.utils.merkleRootBytes([bytes(32), tx.getWtxidBytes()])
+    assert(commitment.scriptPubKeyHex == "6a24aa21a9ed" + btc.utils.hash256(witnessRoot + bytes(32)).hex())
+    assert(btc.mining.checkBlock(block, currentLastBlock = "40fd433db35e43c9997e702fb0f11bbe171712675651e03461fabb98fbc29598"))
+    #
+    # The block can be serialized and read again
+    #
+    _block = btc.block.block()
+    _block.deserialize(block.serialize())
+    assert(_block.serialize() == block.serialize())
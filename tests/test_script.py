@@ -271,3 +271,191 @@ def test_tc45():
     scriptSig.pushData("ff")
     s = scriptSig.serialize()
     assert(s == "040506070801ff")
+
+
+#
+# The signature hashes obtained from a sighashContext are the 
+# same as those obtained by hashing serializeForSigning, in any
+# order
+#
+def test_tc46():
+    s = "0200000003620f7bc1087b0111f76978ef747001e3ae0a12f254cbfb858f028f891c40e5f6010000006a47304402207f5dfc2f7f7329b7cc731df605c83aa6f48ec2218495324bb4ab43376f313b840220020c769655e4bfcc54e55104f6adc723867d9d819266d27e755e098f646f689d0121038c2d1cbe4d731c69e67d16c52682e01cb70b046ead63e90bf793f52f541dafbdfefffffff15fe7d9e0815853738ce47deadee69339e027a1dfcfb6fa887cce3a72626e7b010000006a47304402203202e6c640c063989623fc782ac1c9dc3c6fcaed996d852ec876749ba63db63b02207ef86e262ad4b4bc9cebfadb609f52c35b0105e15d58a5ecbecc5e536d3a8cd8012103dc526ca188418ab128d998bf80942d66f1b3be585d0c89bd61c533bddbdaa729feffffff84e6431db86833897bab333d844486c183dd01e69862edea442e480c2d8cb549010000006a47304402200320bc83f35ceab4a7ef0f8181eedb5f54e3f617626826cc49c8c86efc9be0b302203705889d6aed50f716b81b0f3f5769d72d1b8a6b59d1b0b73bcf94245c283b8001210263591c21ce8ee0d96a617108d7c278e2e715ac6d8afd3fcd158bee472c590068feffffff02ca780a00000000001976a914811fb695e46e2386501bcd70e5c869fe6c0bb33988ac10f59600000000001976a9140f2408a811f6d24ab1833924d98d884c44ecee8888ac6fce0700"
+    txn = btc.txn.txn()
+    txn.deserialize(s)
+    spentOutput = btc.txn.txout()
+    spentOutput.deserialize("00e1f505000000001976a914625d8e5d40a1b797b47cb66eee958724a668d8d288ac")
+    scriptPubKey = spentOutput.getScriptPubKey()
+    context = btc.script.sighashContext(txn)
+    for nInput in [0, 1, 2, 2, 1, 0, 2]:
+        h = btc.utils.hash256(btc.script.serializeForSigningBytes(txn, nInput, scriptPubKey))
+        assert(context.signatureHash(nInput, spentOutput.scriptPubKeyBytes) == h)
+        assert(btc.script.signatureHash(txn, nInput, spentOutput) == h)
+    try:
+        context.signatureHash(3, spentOutput.scriptPubKeyBytes)
+        assert(False)
+    except ValueError:
+        pass
+
+
+#
+# Sign a transaction with several inputs and verify 
+# the signatures
+#
+def test_tc47():
+    pubKeys = ["0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798",
+               "02c6047f9441ed7d6d3045406e95c07cd85c778e4b8cef3ca7abac09b95c709ee5",
+               "02f9308a019258c31049344f85f89d5229b531c845836f99b08601f113bce036f9"]
+    txn = btc.txn.txn()
+    txos = []
+    for i in range(3):
+        txn.addInput(btc.txn.txin(prevTxid = "13619b505d99bc5ee353a8e4a707164d54320134ccdb0795d89f5002e32e63a3", vout = i))
+        txos.append(btc.txn.txout(value = 100000, 
+                                  scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2PK, 
+                                                                         pubKeyHex = pubKeys[i])))
+    txn.addOutput(btc.txn.txout(value = 250000, scriptPubKey = txos[0].getScriptPubKey()))
+    btc.script.signTransaction(txn, txos, [1, 2, 3])
+    context = btc.script.sighashContext(txn)
+    for i in range(3):
+        assert(btc.script.verifySignature(txn, i, txos[i], context))
+    assert(not btc.script.verifySignature(txn, 0, txos[1], context))
+
+
+#
+# BIP143 signature hash for a P2WPKH input. This is the 
+# native P2WPKH example from BIP143
+#
+def test_tc48():
+    unsigned = "0100000002fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f0000000000eeffffffef51e1b804cc89d182d279655c3aa89e815b1b309fe287d9b2b55d57b90ec68a0100000000ffffffff02202cb206000000001976a9148280b37df378db99f66f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac11000000"
+    txn = btc.txn.txn()
+    txn.deserialize(unsigned)
+    spentOutput = btc.txn.txout()
+    spentOutput.deserialize("0046c32300000000160014" + "1d0f172a0ecb48aee1be1f2687d2963ae33f71a1")
+    assert(spentOutput.getValue() == 600000000)
+    assert(spentOutput.getScriptPubKey().getScriptType() == btc.script.SCRIPTTYPE_P2WPKH)
+    assert(spentOutput.getScriptPubKey().getPubKeyHash() == "1d0f172a0ecb48aee1be1f2687d2963ae33f71a1")
+    assert(spentOutput.getScriptPubKey().serialize() == "00141d0f172a0ecb48aee1be1f2687d2963ae33f71a1")
+    h = btc.script.signatureHash(txn, 1, spentOutput)
+    assert(h.hex() == "c37af31116d1b27caf68aae9e3ac82f1477929014d5b917657d0eb49478cb670")
+    #
+    # Now verify the signed transaction
+    #
+    signed = "01000000000102fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f00000000494830450221008b9d1dc26ba6a9cb62127b02742fa9d754cd3bebf337f7a55d114c8e5cdd30be022040529b194ba3f9281a99f2b1c0a19c0489bc22ede944ccf4ecbab4cc618ef3ed01eeffffffef51e1b804cc89d182d279655c3aa89e815b1b309fe287d9b2b55d57b90ec68a0100000000ffffffff02202cb206000000001976a9148280b37df378db99f66f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac000247304402203609e17b84f6a7d30c80bfa610b5b4542f32a8a0d5447a12fb1366d7f01cc44a0220573a954c4518331561406f90300e8f3358f51928d43c212a8caed02de67eebee0121025476c2e83188368da1ff3e292e7acafcdb3566bb0ad253f62fc70f07aeee635711000000"
+    txn = btc.txn.txn()
+    txn.deserialize(signed)
+    assert(btc.script.verifySignature(txn, 1, spentOutput))
+    #
+    # The first input spends a P2PK output
+    #
+    spentOutput0 = btc.txn.txout()
+    spentOutput0.deserialize("000000000000000023" + "2103c9f4836b9a4f77fc0d81f7bcb01b7f1b35916864b9476c241ce9fc198bd25432ac")
+    context = btc.script.sighashContext(txn)
+    assert(btc.script.verifySignature(txn, 0, spentOutput0, context))
+    assert(btc.script.verifySignature(txn, 1, spentOutput, context))
+    #
+    # A different amount gives a different hash
+    #
+    spentOutput.setValue(600000001)
+    assert(not btc.script.verifySignature(txn, 1, spentOutput))
+
+
+#
+# Sign a transaction spending P2WPKH outputs
+#
+def test_tc49():
+    secret = int("619c335025c7f4012e556c2a58b2506e30b8511b53ade95ea316fd8c3286feb9", 16)
+    txn = btc.txn.txn()
+    txos = []
+    for i in range(2):
+        txn.addInput(btc.txn.txin(prevTxid = "13619b505d99bc5ee353a8e4a707164d54320134ccdb0795d89f5002e32e63a3", vout = i))
+        txos.append(btc.txn.txout(value = 100000 + i, 
+                                  scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2WPKH, 
+                                                                         pubKeyHash = "1d0f172a0ecb48aee1be1f2687d2963ae33f71a1")))
+    txn.addOutput(btc.txn.txout(value = 150000, scriptPubKey = txos[0].getScriptPubKey()))
+    btc.script.signTransaction(txn, txos, [secret, secret])
+    assert(txn.hasWitness())
+    assert(txn.getInputs()[0].getScriptSigHex() == "")
+    assert(txn.getTxnId() != txn.getWtxid())
+    assert(txn.getInputs()[0].getWitness()[1].hex() == "025476c2e83188368da1ff3e292e7acafcdb3566bb0ad253f62fc70f07aeee6357")
+    _txn = btc.txn.txn()
+    _txn.deserialize(txn.serialize())
+    for i in range(2):
+        assert(btc.script.verifySignature(_txn, i, txos[i]))
+    assert(not btc.script.verifySignature(_txn, 0, txos[1]))
+
+
+#
+# The signature cache is bounded and evicts random entries
+#
+def test_tc50():
+    pubKey = "0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798"
+    cache = btc.script.signatureCache(maxBytes = 10*btc.script.signatureCache.ENTRY_SIZE)
+    assert(cache.getMaxBytes() == 8*btc.script.signatureCache.ENTRY_SIZE)
+    assert(len(cache.table) == cache.getMaxBytes())
+    checks = [(h, 1, 2, pubKey) for h in range(25)]
+    for check in checks:
+        cache.add(check)
+        assert(cache.contains(check))
+    assert(len(cache) <= 8)
+    assert(len([check for check in checks if cache.contains(check)]) == len(cache))
+    assert(cache.contains(checks[-1]))
+    #
+    # Entries depend on the salt, so that another cache has different entries
+    #
+    other = btc.script.signatureCache()
+    other.add(checks[0])
+    assert(other.entry(checks[0]) != cache.entry(checks[0]))
+    assert(other.contains(checks[0]))
+    assert(not cache.contains((1, 2, 3, "zz")))
+    #
+    # A cache without room for a single bucket stores nothing
+    #
+    empty = btc.script.signatureCache(maxBytes = 64)
+    empty.add(checks[0])
+    assert(not empty.contains(checks[0]))
+    assert(len(empty) == 0)
+
+
+#
+# Classify public key scripts
+#
+def test_tc51():
+    scripts = [("76a914250ed017660abdd723ed28a427fda68a6eb0a3f888ac", btc.script.SCRIPTTYPE_P2PKH, "250ed017660abdd723ed28a427fda68a6eb0a3f8"),
+               ("a914748284390f9e263a4b766a75d0633c50426eb87587", btc.script.SCRIPTTYPE_P2SH, "748284390f9e263a4b766a75d0633c50426eb875"),
+               ("0014751e76e8199196d454941c45d1b3a323f1433bd6", btc.script.SCRIPTTYPE_P2WPKH, "751e76e8199196d454941c45d1b3a323f1433bd6"),
+               ("00201863143c14c5166804bd19203356da136c985678cd4d27a1b8c6329604903262", btc.script.SCRIPTTYPE_P2WSH, 
+                "1863143c14c5166804bd19203356da136c985678cd4d27a1b8c6329604903262"),
+               ("5120a60869f0dbcf1dc659c9cecbaf8050135ea9e8cdc487053f1dc6880949dc684c", btc.script.SCRIPTTYPE_P2TR,
+                "a60869f0dbcf1dc659c9cecbaf8050135ea9e8cdc487053f1dc6880949dc684c"),
+               ("210279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798ac", btc.script.SCRIPTTYPE_P2PK,
+                "0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798"),
+               ("410479be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8ac", 
+                btc.script.SCRIPTTYPE_P2PK,
+                "0479be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8"),
+               ("6a0568656c6c6f", btc.script.SCRIPTTYPE_NULLDATA, "0568656c6c6f"),
+               ("6a", btc.script.SCRIPTTYPE_NULLDATA, "")]
+    for raw, scriptType, payload in scripts:
+        assert(btc.script.classifyScript(bytes.fromhex(raw)) == (scriptType, bytes.fromhex(payload)))
+        thisScript = btc.script.scriptPubKey()
+        thisScript.deserialize(raw)
+        assert(thisScript.getScriptType() == scriptType)
+        assert(thisScript.serialize() == raw)
+    thisScript = btc.script.scriptPubKey()
+    thisScript.deserialize(bytes.fromhex(scripts[1][0]))
+    assert(thisScript.getData() == scripts[1][2])
+    assert(btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2TR, data = scripts[4][2]).serialize() == scripts[4][0])
+    #
+    # Scripts that only almost match a template
+    #
+    for raw in ["76a914250ed017660abdd723ed28a427fda68a6eb0a3f888ad",
+                "76a914250ed017660abdd723ed28a427fda68a6eb0a3f888ac00",
+                "a914748284390f9e263a4b766a75d0633c50426eb87588",
+                "5220a60869f0dbcf1dc659c9cecbaf8050135ea9e8cdc487053f1dc6880949dc684c",
+                "210579be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798ac",
+                "6a0568656c6c6f61", "6a05", ""]:
+        assert(btc.script.classifyScript(bytes.fromhex(raw)) == (btc.script.SCRIPTTYPE_OTHER, None))
+    #
+    # Results are cached
+    #
+    hits = btc.script.CLASSIFY_CACHE.cache_info().hits
+    btc.script.classifyScript(bytearray.fromhex(scripts[0][0]))
+    assert(btc.script.CLASSIFY_CACHE.cache_info().hits == hits + 1)
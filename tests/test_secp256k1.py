@@ -0,0 +1,385 @@
+import btc.secp256k1
+
+import ecdsa
+import hashlib
+import os
+import random
+import tempfile
+
+#
+# The ecdsa package serves as reference implementation
+#
+CURVE = ecdsa.curves.SECP256k1
+G = CURVE.generator
+
+
+#
+# Curve parameters
+#
+def test_tc1():
+    assert(btc.secp256k1.P == CURVE.curve.p())
+    assert(btc.secp256k1.N == G.order())
+    assert(btc.secp256k1.G == (G.x(), G.y()))
+    assert(btc.secp256k1.isOnCurve(btc.secp256k1.G))
+    assert(not btc.secp256k1.isOnCurve((btc.secp256k1.GX, btc.secp256k1.GY + 1)))
+
+
+#
+# Adding and doubling points in Jacobian coordinates
+#
+def test_tc2():
+    G2 = G.double()
+    J = btc.secp256k1.toJacobian(btc.secp256k1.G)
+    assert(btc.secp256k1.fromJacobian(btc.secp256k1.jacobianDouble(J)) == (G2.x(), G2.y()))
+    assert(btc.secp256k1.fromJacobian(btc.secp256k1.jacobianAdd(J, J)) == (G2.x(), G2.y()))
+    J3 = btc.secp256k1.jacobianAddAffine(btc.secp256k1.jacobianDouble(J), btc.secp256k1.G)
+    G3 = G2 + G
+    assert(btc.secp256k1.fromJacobian(J3) == (G3.x(), G3.y()))
+    #
+    # P + (-P) is the point at infinity
+    #
+    minusG = btc.secp256k1.negate(btc.secp256k1.G)
+    assert(btc.secp256k1.add(btc.secp256k1.G, minusG) == None)
+    assert(btc.secp256k1.add(btc.secp256k1.G, None) == btc.secp256k1.G)
+
+
+#
+# Width-w NAF
+#
+def test_tc3():
+    for k in [1, 7, 255, 0xdeadbeef, btc.secp256k1.N - 1]:
+        digits = btc.secp256k1.wnaf(k, 5)
+        assert(sum(d << i for i, d in enumerate(digits)) == k)
+        for i, d in enumerate(digits):
+            if d != 0:
+                assert(d % 2 == 1)
+                assert(abs(d) < 16)
+                assert(all(_ == 0 for _ in digits[i+1:i+5]))
+
+
+#
+# Scalar multiplication
+#
+def test_tc4():
+    rng = random.Random(17)
+    for _ in range(10):
+        k = rng.randrange(1, btc.secp256k1.N)
+        Q = G * k
+        assert(btc.secp256k1.multiply(k) == (Q.x(), Q.y()))
+        m = rng.randrange(1, btc.secp256k1.N)
+        R = Q * m
+        assert(btc.secp256k1.multiply(m, (Q.x(), Q.y())) == (R.x(), R.y()))
+    assert(btc.secp256k1.multiply(0) == None)
+    assert(btc.secp256k1.multiply(btc.secp256k1.N) == None)
+    assert(btc.secp256k1.multiply(btc.secp256k1.N + 1) == btc.secp256k1.G)
+
+
+#
+# Encoding and decoding of points
+#
+def test_tc5():
+    point = btc.secp256k1.multiply(3)
+    compressed = btc.secp256k1.encodePoint(point)
+    assert(compressed.hex() == "02f9308a019258c31049344f85f89d5229b531c845836f99b08601f113bce036f9")
+    assert(btc.secp256k1.decodePoint(compressed) == point)
+    uncompressed = btc.secp256k1.encodePoint(point, compressed = False)
+    assert(btc.secp256k1.decodePoint(uncompressed) == point)
+    assert(btc.secp256k1.decodePoint(btc.secp256k1.encodePoint(btc.secp256k1.negate(point))) == btc.secp256k1.negate(point))
+    try:
+        btc.secp256k1.decodePoint(b'\x05' + compressed[1:])
+        assert(False)
+    except ValueError:
+        pass
+
+
+#
+# Sign and verify, cross-checking with the ecdsa package
+#
+def test_tc6():
+    rng = random.Random(5)
+    for _ in range(5):
+        secret = rng.randrange(1, btc.secp256k1.N)
+        h = rng.randrange(0, 2**256)
+        Q = btc.secp256k1.multiply(secret)
+        r, s = btc.secp256k1.sign(h, secret, rng.randrange(1, btc.secp256k1.N))
+        assert(btc.secp256k1.verify(h, r, s, Q))
+        assert(not btc.secp256k1.verify(h + 1, r, s, Q))
+        assert(not btc.secp256k1.verify(h, r, btc.secp256k1.N - s + 1, Q))
+        pubKey = ecdsa.ecdsa.Public_key(G, G * secret)
+        assert(pubKey.verifies(h, ecdsa.ecdsa.Signature(r, s)))
+        #
+        # and the other way around
+        #
+        privKey = ecdsa.ecdsa.Private_key(pubKey, secret)
+        signature = privKey.sign(h, rng.randrange(1, btc.secp256k1.N))
+        assert(btc.secp256k1.verify(h, signature.r, signature.s, Q))
+    assert(not btc.secp256k1.verify(1, 0, 1, btc.secp256k1.G))
+    assert(not btc.secp256k1.verify(1, 1, btc.secp256k1.N, btc.secp256k1.G))
+
+
+#
+# Joint multiplication
+#
+def test_tc7():
+    rng = random.Random(3)
+    Q = btc.secp256k1.multiply(rng.randrange(1, btc.secp256k1.N))
+    R = btc.secp256k1.multiply(rng.randrange(1, btc.secp256k1.N))
+    for _ in range(5):
+        k1 = rng.randrange(1, btc.secp256k1.N)
+        k2 = rng.randrange(1, btc.secp256k1.N)
+        k3 = rng.randrange(1, 2**64)
+        expected = btc.secp256k1.add(btc.secp256k1.multiply(k1), btc.secp256k1.multiply(k2, Q))
+        result = btc.secp256k1.jacobianMultiplySum([(k1, btc.secp256k1.G), (k2, Q)])
+        assert(btc.secp256k1.fromJacobian(result) == expected)
+        expected = btc.secp256k1.add(expected, btc.secp256k1.multiply(k3, R))
+        result = btc.secp256k1.jacobianMultiplySum([(k1, btc.secp256k1.G), (k2, Q), (k3, R)])
+        assert(btc.secp256k1.fromJacobian(result) == expected)
+    #
+    # Terms that cancel each other
+    #
+    k = rng.randrange(1, btc.secp256k1.N)
+    result = btc.secp256k1.jacobianMultiplySum([(k, Q), (btc.secp256k1.N - k, Q)])
+    assert(btc.secp256k1.fromJacobian(result) == None)
+    assert(btc.secp256k1.fromJacobian(btc.secp256k1.jacobianMultiplySum([(0, Q), (1, None)])) == None)
+
+
+#
+# The endomorphism is multiplication by LAMBDA
+#
+def test_tc8():
+    assert(pow(btc.secp256k1.BETA, 3, btc.secp256k1.P) == 1)
+    assert(pow(btc.secp256k1.LAMBDA, 3, btc.secp256k1.N) == 1)
+    Q = G * btc.secp256k1.LAMBDA
+    assert(btc.secp256k1.endomorphism(btc.secp256k1.G) == (Q.x(), Q.y()))
+    point = btc.secp256k1.multiply(12345)
+    assert(btc.secp256k1.endomorphism(point) == btc.secp256k1.multiply(btc.secp256k1.LAMBDA, point, glv = False))
+    assert((btc.secp256k1.A1 + btc.secp256k1.B1*btc.secp256k1.LAMBDA) % btc.secp256k1.N == 0)
+    assert((btc.secp256k1.A2 + btc.secp256k1.B2*btc.secp256k1.LAMBDA) % btc.secp256k1.N == 0)
+
+
+#
+# GLV decomposition of scalars
+#
+def test_tc9():
+    rng = random.Random(11)
+    scalars = [0, 1, 2, btc.secp256k1.LAMBDA, btc.secp256k1.N - 1, btc.secp256k1.N // 2]
+    scalars += [rng.randrange(0, btc.secp256k1.N) for _ in range(200)]
+    for k in scalars:
+        k1, k2 = btc.secp256k1.glvSplit(k)
+        assert((k1 + k2*btc.secp256k1.LAMBDA - k) % btc.secp256k1.N == 0)
+        assert(abs(k1) < 2**129)
+        assert(abs(k2) < 2**129)
+
+
+#
+# Scalar multiplication with and without GLV agrees with 
+# the ecdsa package
+#
+def test_tc10():
+    rng = random.Random(13)
+    Q = G * rng.randrange(1, btc.secp256k1.N)
+    point = (Q.x(), Q.y())
+    scalars = [1, 2, btc.secp256k1.LAMBDA, btc.secp256k1.N - 1] + [rng.randrange(1, btc.secp256k1.N) for _ in range(10)]
+    for k in scalars:
+        R = G * k
+        assert(btc.secp256k1.multiply(k) == (R.x(), R.y()))
+        assert(btc.secp256k1.multiply(k, glv = False) == (R.x(), R.y()))
+        R = Q * k
+        assert(btc.secp256k1.multiply(k, point) == (R.x(), R.y()))
+        assert(btc.secp256k1.multiply(k, point, glv = False) == (R.x(), R.y()))
+    h = rng.randrange(1, btc.secp256k1.N)
+    r, s = btc.secp256k1.sign(h, 5, rng.randrange(1, btc.secp256k1.N))
+    for glv in [True, False]:
+        assert(btc.secp256k1.verify(h, r, s, btc.secp256k1.multiply(5), glv = glv))
+        assert(not btc.secp256k1.verify(h, r, s, btc.secp256k1.multiply(6), glv = glv))
+
+
+#
+# Multiplication of the generator using the fixed-base table
+#
+def test_tc11():
+    table = btc.secp256k1.getFixedBaseTable()
+    assert(table.getPoint(0, 1) == btc.secp256k1.G)
+    assert(table.getPoint(1, 1) == btc.secp256k1.multiply(256, fixedBase = False))
+    rng = random.Random(19)
+    scalars = [1, 255, 256, 2**248, btc.secp256k1.N - 1] + [rng.randrange(1, btc.secp256k1.N) for _ in range(10)]
+    for k in scalars:
+        R = G * k
+        assert(btc.secp256k1.fromJacobian(table.jacobianMultiply(k)) == (R.x(), R.y()))
+        assert(btc.secp256k1.multiply(k) == (R.x(), R.y()))
+    assert(btc.secp256k1.fromJacobian(table.jacobianMultiply(0)) == None)
+
+
+#
+# Save the fixed-base table and map it into memory again
+#
+def test_tc12():
+    table = btc.secp256k1.getFixedBaseTable()
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "table")
+        loaded = btc.secp256k1.loadFixedBaseTable(filename)
+        assert(os.path.getsize(filename) == btc.secp256k1.FIXED_BASE_FILE_SIZE)
+        assert(os.listdir(d) == ["table"])
+        assert(btc.secp256k1.getFixedBaseTable() is loaded)
+        k = 0xdeadbeef*2**200 + 17
+        assert(btc.secp256k1.multiply(k) == btc.secp256k1.multiply(k, fixedBase = False))
+        btc.secp256k1.FIXED_BASE_TABLE = table
+        loaded.data.release()
+        #
+        # A truncated file and a file with a modified entry are rejected
+        #
+        with open(filename, "rb") as f:
+            raw = f.read()
+        with open(filename, "wb") as f:
+            f.write(raw[:-64])
+        try:
+            btc.secp256k1.fixedBaseTable.load(filename)
+            assert(False)
+        except ValueError:
+            pass
+        damaged = bytearray(raw)
+        damaged[64*1000] ^= 1
+        with open(filename, "wb") as f:
+            f.write(damaged)
+        try:
+            btc.secp256k1.fixedBaseTable.load(filename)
+            assert(False)
+        except ValueError:
+            pass
+        #
+        # loadFixedBaseTable replaces a damaged file
+        #
+        loaded = btc.secp256k1.loadFixedBaseTable(filename)
+        with open(filename, "rb") as f:
+            assert(f.read() == raw)
+        assert(btc.secp256k1.FIXED_BASE_TABLE_FILE == filename)
+        btc.secp256k1.FIXED_BASE_TABLE = table
+        btc.secp256k1.FIXED_BASE_TABLE_FILE = None
+        loaded.data.release()
+        #
+        # If the file cannot be written, we use the table in memory
+        #
+        assert(btc.secp256k1.loadFixedBaseTable(os.path.join(d, "missing", "table")) is table)
+        assert(btc.secp256k1.FIXED_BASE_TABLE_FILE == None)
+    #
+    # The spot checks detect a wrong last entry of a window even
+    # without the hash
+    #
+    damaged = bytearray(table.data)
+    damaged[64*(3*btc.secp256k1.FIXED_BASE_ENTRIES) - 1] ^= 1
+    try:
+        btc.secp256k1.fixedBaseTable(bytes(damaged))
+        assert(False)
+    except ValueError:
+        pass
+    btc.secp256k1.FIXED_BASE_TABLE = table
+
+
+#
+# Cache for decoded public keys
+#
+def test_tc13():
+    btc.secp256k1.resetPubKeyCache(size = 2)
+    keys = [btc.secp256k1.encodePoint(btc.secp256k1.multiply(k)) for k in [1, 2, 3]]
+    assert(btc.secp256k1.decodePointCached(keys[0]) == btc.secp256k1.G)
+    assert(btc.secp256k1.decodePointCached(keys[0]) == btc.secp256k1.G)
+    info = btc.secp256k1.pubKeyCacheInfo()
+    assert(info.hits == 1)
+    assert(info.misses == 1)
+    #
+    # The cache is bounded
+    #
+    btc.secp256k1.decodePointCached(keys[1])
+    btc.secp256k1.decodePointCached(keys[2])
+    assert(btc.secp256k1.pubKeyCacheInfo().currsize == 2)
+    btc.secp256k1.decodePointCached(keys[0])
+    assert(btc.secp256k1.pubKeyCacheInfo().misses == 4)
+    #
+    # Decode several keys at once
+    #
+    invalid = b'\x02' + bytes(31) + b'\x05'
+    points = btc.secp256k1.decodePoints([keys[2], invalid, keys[2], keys[1]])
+    assert(points == [btc.secp256k1.multiply(3), None, btc.secp256k1.multiply(3), btc.secp256k1.multiply(2)])
+    btc.secp256k1.resetPubKeyCache()
+    assert(btc.secp256k1.pubKeyCacheInfo().maxsize == btc.secp256k1.PUBKEY_CACHE_SIZE)
+
+
+#
+# Batch inversion, conversion to affine coordinates,
+# multiplication and verification
+#
+def test_tc14():
+    rng = random.Random(14)
+    values = [rng.randrange(1, btc.secp256k1.N) for _ in range(20)] + [0, btc.secp256k1.N]
+    inverses = btc.secp256k1.batchInvert(values, btc.secp256k1.N)
+    for x, xinv in zip(values[:20], inverses[:20]):
+        assert(x*xinv % btc.secp256k1.N == 1)
+    assert(inverses[20:] == [0, 0])
+    assert(btc.secp256k1.batchInvert([]) == [])
+    secrets = [rng.randrange(1, btc.secp256k1.N) for _ in range(10)]
+    points = btc.secp256k1.batchMultiply(secrets)
+    assert(points == [btc.secp256k1.multiply(k) for k in secrets])
+    assert(btc.secp256k1.batchMultiply([0, 1]) == [None, btc.secp256k1.G])
+    assert(btc.secp256k1.batchOddMultiples(points[:2]) == [btc.secp256k1.oddMultiples(Q, 5) for Q in points[:2]])
+    signatures = []
+    for i in range(10):
+        h = rng.randrange(1, btc.secp256k1.N)
+        r, s = btc.secp256k1.sign(h, secrets[i], rng.randrange(1, btc.secp256k1.N))
+        signatures.append((h, r, s, points[i]))
+    assert(btc.secp256k1.batchVerify(signatures) == [True]*10)
+    h, r, s, Q = signatures[3]
+    signatures[3] = (h + 1, r, s, Q)
+    signatures[5] = (h, r, 0, Q)
+    signatures[7] = (h, r, s, points[0])
+    expected = [True]*10
+    expected[3] = expected[5] = expected[7] = False
+    assert(btc.secp256k1.batchVerify(signatures) == expected)
+    assert(btc.secp256k1.batchVerify(signatures, glv = False) == expected)
+
+
+#
+# Deterministic nonces (RFC 6979)
+#
+def test_tc15():
+    h = int.from_bytes(hashlib.sha256(b"Satoshi Nakamoto").digest(), "big")
+    k = btc.secp256k1.nonceGenerator(1).nonce(h)
+    assert(k == 0x8F8A276C19F4149656B280621E358CCE24F5F52542772691EE69063B74F15D15)
+    #
+    # Compare with the implementation in the ecdsa package
+    #
+    rng = random.Random(15)
+    for _ in range(10):
+        secret = rng.randrange(1, btc.secp256k1.N)
+        generator = btc.secp256k1.nonceGenerator(secret)
+        for h in [rng.randrange(1 << 256), btc.secp256k1.N + 5]:
+            expected = ecdsa.rfc6979.generate_k(btc.secp256k1.N, secret, hashlib.sha256, h.to_bytes(32, "big"))
+            assert(generator.nonce(h) == expected)
+    try:
+        btc.secp256k1.nonceGenerator(0)
+        assert(False)
+    except ValueError:
+        pass
+
+
+#
+# Uncompressed points with coordinates that are not reduced 
+# modulo P are rejected, even though the curve equation holds
+#
+def test_tc16():
+    P = btc.secp256k1.P
+    x = 1
+    while True:
+        y2 = (x**3 + 7) % P
+        y = pow(y2, (P + 1) // 4, P)
+        if y*y % P == y2:
+            break
+        x += 1
+    assert(btc.secp256k1.decodePoint(b'\x04' + x.to_bytes(32, "big") + y.to_bytes(32, "big")) == (x, y))
+    encoded = b'\x04' + (x + P).to_bytes(32, "big") + y.to_bytes(32, "big")
+    assert(btc.secp256k1.isOnCurve((x + P, y)))
+    try:
+        btc.secp256k1.decodePoint(encoded)
+        assert(False)
+    except ValueError:
+        pass
+    assert(btc.secp256k1.decodePoints([encoded]) == [None])
@@ -131,3 +131,100 @@ def test_tc16():
     assert(s == btc.serialize.serializeUint32(x))
     
     
+    
+    
+def test_tc17():
+    #
+    # Read from a byte reader
+    #
+    reader = btc.serialize.ByteReader(bytes.fromhex("01020304fd1a03abcdef"))
+    assert(reader.readUint32() == 0x4030201)
+    assert(reader.readVarInt() == 0x31a)
+    assert(reader.getOffset() == 7)
+    assert(reader.readString(2) == "cdab")
+    assert(reader.remaining() == 1)
+    assert(reader.getRemainingHex() == "ef")
+
+
+def test_tc18():
+    #
+    # Reading beyond the end of the buffer
+    #
+    reader = btc.serialize.ByteReader(bytes.fromhex("0102"))
+    try:
+        reader.readUint32()
+        assert(False)
+    except TypeError:
+        pass
+
+
+def test_tc19():
+    #
+    # Write into a byte writer
+    #
+    writer = btc.serialize.ByteWriter()
+    writer.writeUint32(0x4030201)
+    writer.writeVarInt(0x31a)
+    writer.writeVarInt(0x60504030201)
+    writer.writeString("cdab", 2)
+    assert(writer.getLength() == 18)
+    assert(writer.getHex() == "01020304fd1a03ff0102030405060000abcd")
+    assert(writer.getBytes() == bytes.fromhex("01020304fd1a03ff0102030405060000abcd"))
+
+
+def test_tc20():
+    #
+    # Pack and unpack varInts in place
+    #
+    buffer = bytearray(20)
+    offset = btc.serialize.packVarInt(buffer, 0, 0x31a)
+    assert(offset == 3)
+    offset = btc.serialize.packVarInt(buffer, offset, 0x60504030201)
+    assert(offset == 12)
+    assert(buffer[:12] == bytes.fromhex("fd1a03ff0102030405060000"))
+    x, offset = btc.serialize.unpackVarInt(buffer, 0)
+    assert((x, offset) == (0x31a, 3))
+    x, offset = btc.serialize.unpackVarInt(buffer, offset)
+    assert((x, offset) == (0x60504030201, 12))
+    assert(btc.serialize.varIntSize(0x60504030201) == 9)
+
+
+def test_tc21():
+    #
+    # A writer needs to grow its buffer
+    #
+    writer = btc.serialize.ByteWriter(size = 2)
+    for i in range(100):
+        writer.writeUint32(i)
+    writer.writeBytes(b'\x01' * 1000)
+    assert(writer.getLength() == 1400)
+    reader = btc.serialize.ByteReader(writer.getBytes())
+    for i in range(100):
+        assert(reader.readUint32() == i)
+    assert(reader.readStruct(btc.serialize.UINT16)[0] == 0x0101)
+
+
+def test_tc22():
+    #
+    # Reverse bytes and hex strings
+    #
+    assert(btc.serialize.reverseBytes(b'\x01\x02\x03') == b'\x03\x02\x01')
+    assert(btc.serialize.reverseHex("abcdef") == "efcdab")
+    txid = "13619b505d99bc5ee353a8e4a707164d54320134ccdb0795d89f5002e32e63a3"
+    assert(btc.serialize.reverseHex(btc.serialize.reverseHex(txid)) == txid)
+    assert(btc.serialize.serializeString(txid, 32) == btc.serialize.reverseHex(txid))
+
+
+def test_tc23():
+    #
+    # Reverse a list of hex strings in one go
+    #
+    l = ["abcdef", "0102", "13619b505d99bc5ee353a8e4a707164d54320134ccdb0795d89f5002e32e63a3", ""]
+    r = btc.serialize.reverseHexList(l)
+    assert(r == [btc.serialize.reverseHex(_) for _ in l])
+    assert(btc.serialize.reverseHexList([]) == [])
+    #
+    # and the same for bytes
+    #
+    r = btc.serialize.reverseHexList([bytes.fromhex(_) for _ in l])
+    assert(r == [btc.serialize.reverseHex(_) for _ in l])
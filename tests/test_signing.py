@@ -0,0 +1,134 @@
+import btc.signing
+import btc.pool
+import btc.secp256k1
+import btc.script
+import btc.txn
+import btc.verify
+import btc.utils
+
+import concurrent.futures
+import os
+import random
+import tempfile
+
+
+PUBKEYS = ["0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798",
+           "02c6047f9441ed7d6d3045406e95c07cd85c778e4b8cef3ca7abac09b95c709ee5"]
+
+PREV_TXID = "13619b505d99bc5ee353a8e4a707164d54320134ccdb0795d89f5002e32e63a3"
+
+#
+# Create an unsigned transaction with n inputs spending P2PKH,
+# P2PK and P2WPKH outputs that belong to the private keys 1 and 2. 
+# Returns the transaction, the spent outputs and the private keys
+#
+def createTxn(n):
+    tx = btc.txn.txn()
+    txos = []
+    privateKeys = []
+    for i in range(n):
+        tx.addInput(btc.txn.txin(prevTxid = PREV_TXID, vout = i))
+        pubKeyHex = PUBKEYS[i % 2]
+        pubKeyHash = btc.utils.hash160(bytes.fromhex(pubKeyHex)).hex()
+        if i % 3 == 0:
+            scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2PKH, pubKeyHash = pubKeyHash)
+        elif i % 3 == 1:
+            scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2PK, pubKeyHex = pubKeyHex)
+        else:
+            scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2WPKH, pubKeyHash = pubKeyHash)
+        txos.append(btc.txn.txout(value = 100000, scriptPubKey = scriptPubKey))
+        privateKeys.append(1 + i % 2)
+    tx.addOutput(btc.txn.txout(value = 100000*n - 1000, scriptPubKey = txos[0].getScriptPubKey()))
+    return tx, txos, privateKeys
+
+
+#
+# Signing in the calling process and in a pool gives the same 
+# transaction as script.signTransaction with the same nonces
+#
+def test_tc1():
+    tx, txos, privateKeys = createTxn(9)
+    expected = btc.script.signTransaction(tx, txos, privateKeys, rng = random.Random(1)).serialize()
+    tx, txos, privateKeys = createTxn(9)
+    signed = btc.signing.signTransaction(tx, txos, privateKeys, workers = 1, rng = random.Random(1))
+    assert(signed.serialize() == expected)
+    tx, txos, privateKeys = createTxn(9)
+    signed = btc.signing.signTransaction(tx, txos, privateKeys, workers = 3, rng = random.Random(1))
+    assert(signed.serialize() == expected)
+    assert(btc.verify.verifyTransaction(signed, txos, workers = 1) == [True]*9)
+    with concurrent.futures.ProcessPoolExecutor(max_workers = 2) as executor:
+        tx, txos, privateKeys = createTxn(9)
+        signed = btc.signing.signTransaction(tx, txos, privateKeys, executor = executor)
+        assert(btc.verify.verifyTransaction(signed, txos, workers = 1) == [True]*9)
+
+
+#
+# Outputs that we cannot sign are rejected before signing
+#
+def test_tc2():
+    tx, txos, privateKeys = createTxn(2)
+    txos[1] = btc.txn.txout(value = 100000, scriptPubKey = btc.script.scriptPubKey())
+    try:
+        btc.signing.signTransaction(tx, txos, privateKeys, workers = 1)
+        assert(False)
+    except ValueError:
+        pass
+    assert(tx.getInputs()[0].getScriptSig() == None)
+
+
+#
+# Without rng, the nonces are deterministic, so that signing 
+# a transaction again gives the same transaction
+#
+def test_tc3():
+    tx, txos, privateKeys = createTxn(4)
+    expected = btc.script.signTransaction(tx, txos, privateKeys).serialize()
+    tx, txos, privateKeys = createTxn(4)
+    assert(btc.script.signTransaction(tx, txos, privateKeys).serialize() == expected)
+    tx, txos, privateKeys = createTxn(4)
+    signed = btc.signing.signTransaction(tx, txos, privateKeys, workers = 2)
+    assert(signed.serialize() == expected)
+    assert(btc.verify.verifyTransaction(signed, txos, workers = 1) == [True]*4)
+    tx, txos, privateKeys = createTxn(4)
+    signed = btc.signing.signTransaction(tx, txos, privateKeys, workers = 1, rng = random.SystemRandom())
+    assert(signed.serialize() != expected)
+
+
+#
+# When the fixed-base table has been loaded from a file, the
+# workers of the pool map the same file when they start
+#
+def test_tc4():
+    table = btc.secp256k1.getFixedBaseTable()
+    tx, txos, privateKeys = createTxn(8)
+    expected = btc.script.signTransaction(tx, txos, privateKeys).serialize()
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "table")
+        loaded = btc.secp256k1.loadFixedBaseTable(filename)
+        pool = btc.pool.getPool(2)
+        assert(pool._initializer == btc.secp256k1.loadFixedBaseTable)
+        assert(pool._initargs == (filename,))
+        tx, txos, privateKeys = createTxn(8)
+        signed = btc.signing.signTransaction(tx, txos, privateKeys, workers = 2)
+        assert(signed.serialize() == expected)
+        assert(btc.pool.getPool(2) is pool)
+        btc.secp256k1.FIXED_BASE_TABLE = table
+        btc.secp256k1.FIXED_BASE_TABLE_FILE = None
+        loaded.data.release()
+    assert(btc.pool.getPool(2) is not pool)
+
+
+#
+# Transactions with only a few inputs are signed in the 
+# calling process
+#
+def test_tc5():
+    pool = btc.pool.POOL
+    btc.pool.POOL = None
+    try:
+        tx, txos, privateKeys = createTxn(btc.signing.PARALLEL_THRESHOLD - 1)
+        signed = btc.signing.signTransaction(tx, txos, privateKeys, workers = 2)
+        assert(btc.pool.POOL == None)
+        assert(btc.verify.verifyTransaction(signed, txos, workers = 1) == [True]*len(txos))
+    finally:
+        btc.pool.POOL = pool
@@ -1,5 +1,7 @@
 import btc.txn
 
+import io
+
 #
 # Compare two strings and return the first charqcte where they
 # differ or minus 1
@@ -241,3 +243,288 @@ def test_tc33():
     
     
     
+
+
+# Serialize a transaction into bytes
+def test_tc34():
+    s = "01000000017f328ae9b46c631d38a7efb88ec0214519341cd5c0ed250fc88d20b47aa5f9c0010000006b483045022100843d0108b411452da23ce8b9041368300f11a042716a9ae8f3aaa2e5fe39654c022079864ef33971a7cef3aef4658c1d2dec5a5e27b5e7e41c5722fc192dd84472da0121029353adf8364a7fe132ba88267b163fc1e55773a99b06d2ae0a18ee706d73db3affffffff02404b4c00000000001976a9148bdeb16c87bd9f5ffeb24879cb2d61cfc60d5b3488ac4c842a13000000001976a914ff4a0e280823418752a883e0ba7ae8cbec46606a88ac00000000"
+    txn = btc.txn.txn()
+    txn.deserialize(s)
+    b = txn.serializeBytes()
+    assert(b == bytes.fromhex(s))
+    assert(txn.getOutputs()[1].serializeBytes() == bytes.fromhex(txn.getOutputs()[1].serialize()))
+
+
+# Read a transaction from a stream
+def test_tc35():
+    s = "0200000003620f7bc1087b0111f76978ef747001e3ae0a12f254cbfb858f028f891c40e5f6010000006a47304402207f5dfc2f7f7329b7cc731df605c83aa6f48ec2218495324bb4ab43376f313b840220020c769655e4bfcc54e55104f6adc723867d9d819266d27e755e098f646f689d0121038c2d1cbe4d731c69e67d16c52682e01cb70b046ead63e90bf793f52f541dafbdfefffffff15fe7d9e0815853738ce47deadee69339e027a1dfcfb6fa887cce3a72626e7b010000006a47304402203202e6c640c063989623fc782ac1c9dc3c6fcaed996d852ec876749ba63db63b02207ef86e262ad4b4bc9cebfadb609f52c35b0105e15d58a5ecbecc5e536d3a8cd8012103dc526ca188418ab128d998bf80942d66f1b3be585d0c89bd61c533bddbdaa729feffffff84e6431db86833897bab333d844486c183dd01e69862edea442e480c2d8cb549010000006a47304402200320bc83f35ceab4a7ef0f8181eedb5f54e3f617626826cc49c8c86efc9be0b302203705889d6aed50f716b81b0f3f5769d72d1b8a6b59d1b0b73bcf94245c283b8001210263591c21ce8ee0d96a617108d7c278e2e715ac6d8afd3fcd158bee472c590068feffffff02ca780a00000000001976a914811fb695e46e2386501bcd70e5c869fe6c0bb33988ac10f59600000000001976a9140f2408a811f6d24ab1833924d98d884c44ecee8888ac6fce0700"
+    f = io.BytesIO(bytes.fromhex(s) + b'\xff')
+    txn = btc.txn.txn.fromStream(f)
+    assert(txn.getTxnId() == "ed70b8c66a4b064cfe992a097b3406fa81ff09641fe55a709e4266167ef47891")
+    assert(f.read() == b'\xff')
+
+
+# Cached transaction IDs are invalidated when the transaction changes
+def test_tc36():
+    s = "01000000017f328ae9b46c631d38a7efb88ec0214519341cd5c0ed250fc88d20b47aa5f9c0010000006b483045022100843d0108b411452da23ce8b9041368300f11a042716a9ae8f3aaa2e5fe39654c022079864ef33971a7cef3aef4658c1d2dec5a5e27b5e7e41c5722fc192dd84472da0121029353adf8364a7fe132ba88267b163fc1e55773a99b06d2ae0a18ee706d73db3affffffff02404b4c00000000001976a9148bdeb16c87bd9f5ffeb24879cb2d61cfc60d5b3488ac4c842a13000000001976a914ff4a0e280823418752a883e0ba7ae8cbec46606a88ac00000000"
+    txn = btc.txn.txn()
+    txn.deserialize(s)
+    txid = txn.getTxnId()
+    assert(txid == "1d76bfb6d913b6aee62776271b643f9ef353065cbdad3bd9723cd050744ccc13")
+    assert(txn.serializeBytes() is txn.serializeBytes())
+    #
+    # Change the sequence number of the input
+    #
+    txn.getInputs()[0].setSequence(0xfffffffe)
+    assert(txn.getTxnId() != txid)
+    assert(txn.serialize() == s.replace("ffffffff02", "feffffff02"))
+    txn.getInputs()[0].setSequence(0xffffffff)
+    assert(txn.getTxnId() == txid)
+    #
+    # Change an output value and the locktime
+    #
+    txn.getOutputs()[0].setValue(1)
+    assert(txn.getTxnId() != txid)
+    txn.getOutputs()[0].setValue(5000000)
+    txn.setLocktime(1)
+    assert(txn.getTxnId() != txid)
+    txn.setLocktime(0)
+    assert(txn.getTxnId() == txid)
+    #
+    # Adding an output should change the ID as well
+    #
+    txn.addOutput(btc.txn.txout(value = 1, scriptPubKey = txn.getOutputs()[0].getScriptPubKey()))
+    assert(txn.getTxnId() != txid)
+
+
+# Inputs and outputs store hashes and scripts as bytes, but
+# the hex attributes can still be used
+def test_tc37():
+    txin = btc.txn.txin(prevTxid = "13619b505d99bc5ee353a8e4a707164d54320134ccdb0795d89f5002e32e63a3", vout = 1)
+    assert(txin.prevTxidBytes == bytes.fromhex("a3632ee302509fd89507dbcc340132544d1607a7e4a853e35ebc995d509b6113"))
+    assert(txin.getPrevTxId() == "13619b505d99bc5ee353a8e4a707164d54320134ccdb0795d89f5002e32e63a3")
+    assert(not hasattr(txin, "__dict__"))
+    txout = btc.txn.txout()
+    txout.deserialize("00e1f505000000001976a914625d8e5d40a1b797b47cb66eee958724a668d8d288ac")
+    assert(txout.scriptPubKeyBytes == bytes.fromhex("76a914625d8e5d40a1b797b47cb66eee958724a668d8d288ac"))
+    assert(not hasattr(txout, "__dict__"))
+
+
+# Scripts are parsed on first access
+def test_tc38():
+    s = "0200000001a3632ee302509fd89507dbcc340132544d1607a7e4a853e35ebc995d509b6113000000006a47304402203f7d777711a7406424535d96affc8279655918698f727557ad4fcb5aef7a8913022014d213385be262a75d23b1e592f58c702bdc0bc8d8f006d031051ced14dca48b012102de7badda902f573bddeab87d357d6d70f39c058875f0e05d4b52e4a0cc281ebffeffffff0258923f71000000001976a914802da8768a071f707e3d2713568ff4e3bfe6035288ac00e1f505000000001976a914625d8e5d40a1b797b47cb66eee958724a668d8d288ac66000000"
+    txn = btc.txn.txn()
+    txn.deserialize(s)
+    vin = txn.getInputs()[0]
+    vout = txn.getOutputs()[0]
+    assert(vin._scriptSig == None)
+    assert(vout.scriptPubKey == None)
+    assert(vin.scriptSig is vin.getScriptSig())
+    assert(vin.getScriptSig().getPubKeyHex() == "02de7badda902f573bddeab87d357d6d70f39c058875f0e05d4b52e4a0cc281ebf")
+    assert(vin.getScriptSig() is vin.getScriptSig())
+    assert(vout.getScriptPubKey().getPubKeyHash() == "802da8768a071f707e3d2713568ff4e3bfe60352")
+    assert(txn.serialize() == s)
+
+
+SEGWIT_TXN = "01000000000102fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f00000000494830450221008b9d1dc26ba6a9cb62127b02742fa9d754cd3bebf337f7a55d114c8e5cdd30be022040529b194ba3f9281a99f2b1c0a19c0489bc22ede944ccf4ecbab4cc618ef3ed01eeffffffef51e1b804cc89d182d279655c3aa89e815b1b309fe287d9b2b55d57b90ec68a0100000000ffffffff02202cb206000000001976a9148280b37df378db99f66f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac000247304402203609e17b84f6a7d30c80bfa610b5b4542f32a8a0d5447a12fb1366d7f01cc44a0220573a954c4518331561406f90300e8f3358f51928d43c212a8caed02de67eebee0121025476c2e83188368da1ff3e292e7acafcdb3566bb0ad253f62fc70f07aeee635711000000"
+SEGWIT_TXN_STRIPPED = "0100000002fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f00000000494830450221008b9d1dc26ba6a9cb62127b02742fa9d754cd3bebf337f7a55d114c8e5cdd30be022040529b194ba3f9281a99f2b1c0a19c0489bc22ede944ccf4ecbab4cc618ef3ed01eeffffffef51e1b804cc89d182d279655c3aa89e815b1b309fe287d9b2b55d57b90ec68a0100000000ffffffff02202cb206000000001976a9148280b37df378db99f66f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac11000000"
+
+
+# Deserialize a segregated witness transaction (taken from BIP143)
+# and serialize it again
+def test_tc39():
+    txn = btc.txn.txn()
+    txn.deserialize(SEGWIT_TXN)
+    assert(txn.hasWitness())
+    assert(2 == len(txn.getInputs()))
+    assert(2 == len(txn.getOutputs()))
+    assert(0x11 == txn.getLocktime())
+    vin = txn.getInputs()[1]
+    assert(vin.witness == None)
+    assert(vin.getWitness() == [bytes.fromhex("304402203609e17b84f6a7d30c80bfa610b5b4542f32a8a0d5447a12fb1366d7f01cc44a0220573a954c4518331561406f90300e8f3358f51928d43c212a8caed02de67eebee01"), 
+                                bytes.fromhex("025476c2e83188368da1ff3e292e7acafcdb3566bb0ad253f62fc70f07aeee6357")])
+    assert(txn.getInputs()[0].getWitness() == [])
+    assert(txn.serialize() == SEGWIT_TXN)
+    f = io.BytesIO(bytes.fromhex(SEGWIT_TXN) + b'\xff')
+    assert(btc.txn.txn.fromStream(f).serialize() == SEGWIT_TXN)
+    assert(f.read() == b'\xff')
+
+
+# The transaction ID does not cover the witnesses, the 
+# wtxid does
+def test_tc40():
+    txn = btc.txn.txn()
+    txn.deserialize(SEGWIT_TXN)
+    stripped = btc.txn.txn()
+    stripped.deserialize(SEGWIT_TXN_STRIPPED)
+    assert(not stripped.hasWitness())
+    assert(txn.getTxnId() == stripped.getTxnId())
+    assert(stripped.getWtxid() == stripped.getTxnId())
+    assert(txn.getWtxid() == btc.utils.hash256(bytes.fromhex(SEGWIT_TXN))[::-1].hex())
+    assert(txn.getWtxid() != txn.getTxnId())
+    writer = btc.serialize.ByteWriter()
+    txn.serializeInto(writer, witness = False)
+    assert(writer.getHex() == SEGWIT_TXN_STRIPPED)
+
+
+# Adding a witness switches to the extended format
+def test_tc41():
+    txn = btc.txn.txn()
+    txn.deserialize(SEGWIT_TXN_STRIPPED)
+    txid = txn.getTxnId()
+    txn.getInputs()[1].setWitness([bytes.fromhex("304402203609e17b84f6a7d30c80bfa610b5b4542f32a8a0d5447a12fb1366d7f01cc44a0220573a954c4518331561406f90300e8f3358f51928d43c212a8caed02de67eebee01"), 
+                                   bytes.fromhex("025476c2e83188368da1ff3e292e7acafcdb3566bb0ad253f62fc70f07aeee6357")])
+    assert(txn.serialize() == SEGWIT_TXN)
+    assert(txn.getTxnId() == txid)
+    assert(txn.getWtxid() != txid)
+
+
+# An unknown flag is rejected
+def test_tc42():
+    txn = btc.txn.txn()
+    try:
+        txn.deserialize("01000000" + "0002" + SEGWIT_TXN[12:])
+    except ValueError:
+        return
+    assert(False)
+
+
+
+# Size, weight and virtual size of a transaction with witnesses
+def test_tc43():
+    txn = btc.txn.txn()
+    txn.deserialize(SEGWIT_TXN)
+    assert(txn.getSize() == len(SEGWIT_TXN) // 2)
+    assert(txn.getStrippedSize() == len(SEGWIT_TXN_STRIPPED) // 2)
+    assert(txn.getWeight() == 3*len(SEGWIT_TXN_STRIPPED) // 2 + len(SEGWIT_TXN) // 2)
+    assert(txn.getVsize() == (txn.getWeight() + 3) // 4)
+    #
+    # We should get the same result when the sizes are
+    # computed from inputs and outputs
+    #
+    size, weight = txn.getSize(), txn.getWeight()
+    txn.invalidate()
+    assert(txn.getSize() == size)
+    assert(txn.getWeight() == weight)
+    assert(txn.raw == None)
+
+
+# For a transaction without witnesses, weight is four times the size
+def test_tc44():
+    s = "01000000017f328ae9b46c631d38a7efb88ec0214519341cd5c0ed250fc88d20b47aa5f9c0010000006b483045022100843d0108b411452da23ce8b9041368300f11a042716a9ae8f3aaa2e5fe39654c022079864ef33971a7cef3aef4658c1d2dec5a5e27b5e7e41c5722fc192dd84472da0121029353adf8364a7fe132ba88267b163fc1e55773a99b06d2ae0a18ee706d73db3affffffff02404b4c00000000001976a9148bdeb16c87bd9f5ffeb24879cb2d61cfc60d5b3488ac4c842a13000000001976a914ff4a0e280823418752a883e0ba7ae8cbec46606a88ac00000000"
+    txn = btc.txn.txn()
+    txn.deserialize(s)
+    assert(txn.getSize() == len(s) // 2)
+    assert(txn.getWeight() == 4*txn.getSize())
+    assert(txn.getVsize() == txn.getSize())
+    txn.addOutput(btc.txn.txout(value = 1, scriptPubKey = txn.getOutputs()[0].getScriptPubKey()))
+    assert(txn.getSize() == len(txn.serialize()) // 2)
+
+
+# Writing to an attribute directly, changing the lists of inputs 
+# and outputs or pushing data onto an assigned signature script 
+# all invalidate the cached serialization and transaction ID
+def test_tc45():
+    s = "01000000017f328ae9b46c631d38a7efb88ec0214519341cd5c0ed250fc88d20b47aa5f9c0010000006b483045022100843d0108b411452da23ce8b9041368300f11a042716a9ae8f3aaa2e5fe39654c022079864ef33971a7cef3aef4658c1d2dec5a5e27b5e7e41c5722fc192dd84472da0121029353adf8364a7fe132ba88267b163fc1e55773a99b06d2ae0a18ee706d73db3affffffff02404b4c00000000001976a9148bdeb16c87bd9f5ffeb24879cb2d61cfc60d5b3488ac4c842a13000000001976a914ff4a0e280823418752a883e0ba7ae8cbec46606a88ac00000000"
+    txn = btc.txn.txn()
+    txn.deserialize(s)
+    seen = set()
+    def check():
+        txid = txn.getTxnId()
+        assert(txid not in seen)
+        seen.add(txid)
+        fresh = btc.txn.txn()
+        fresh.deserialize(txn.serialize())
+        assert(fresh.getTxnId() == txid)
+    check()
+    txn.getInputs()[0].vout = 3
+    check()
+    txn.getOutputs()[0].value = 7
+    check()
+    txn.getInputs()[0].sequence = 5
+    check()
+    txn.getInputs()[0].scriptSigHex = "51"
+    assert(txn.getInputs()[0].getScriptSig().getScriptType() == btc.script.SCRIPTTYPE_OTHER)
+    check()
+    txn.getOutputs()[1].scriptPubKeyHex = "6a"
+    check()
+    txn.locktime = 10
+    check()
+    scriptSig = btc.script.scriptSig()
+    txn.getInputs().append(btc.txn.txin(prevTxid = 64*"1", vout = 1, scriptSig = scriptSig))
+    check()
+    scriptSig.pushData("aabb")
+    assert(txn.getInputs()[1].getScriptSigHex() == "02aabb")
+    check()
+    del txn.getOutputs()[1]
+    check()
+    txn.outputs = [btc.txn.txout(value = 1, scriptPubKey = txn.getOutputs()[0].getScriptPubKey())]
+    check()
+    txn.getOutputs()[0].value = 2
+    check()
+
+
+# Assigning a non-standard public key script drops the raw script,
+# so that we do not silently serialize the previous one
+def test_tc46():
+    txo = btc.txn.txout()
+    txo.deserialize("404b4c00000000001976a9148bdeb16c87bd9f5ffeb24879cb2d61cfc60d5b3488ac")
+    raw = txo.serialize()
+    txo.setScriptPubKey(txo.getScriptPubKey())
+    assert(txo.serialize() == raw)
+    txo.scriptPubKey = btc.script.scriptPubKey()
+    assert(txo.getScriptPubKeyHex() == None)
+    try:
+        txo.serialize()
+        assert(False)
+    except ValueError:
+        pass
+    txo.scriptPubKeyHex = "6a"
+    assert(txo.serialize() == "404b4c0000000000" + "01" + "6a")
+
+
+# A signature script that has been parsed from a deserialized 
+# transaction is owned by its input, so pushing data onto it
+# changes the raw script and the transaction ID
+def test_tc47():
+    s = "01000000017f328ae9b46c631d38a7efb88ec0214519341cd5c0ed250fc88d20b47aa5f9c0010000006b483045022100843d0108b411452da23ce8b9041368300f11a042716a9ae8f3aaa2e5fe39654c022079864ef33971a7cef3aef4658c1d2dec5a5e27b5e7e41c5722fc192dd84472da0121029353adf8364a7fe132ba88267b163fc1e55773a99b06d2ae0a18ee706d73db3affffffff02404b4c00000000001976a9148bdeb16c87bd9f5ffeb24879cb2d61cfc60d5b3488ac4c842a13000000001976a914ff4a0e280823418752a883e0ba7ae8cbec46606a88ac00000000"
+    txn = btc.txn.txn()
+    txn.deserialize(s)
+    txid = txn.getTxnId()
+    vin = txn.getInputs()[0]
+    vin.scriptSigHex = "51"
+    scriptSig = vin.scriptSig
+    assert(scriptSig.getScriptType() == btc.script.SCRIPTTYPE_OTHER)
+    assert(scriptSig.owner is vin)
+    scriptSig.pushData("aabb")
+    assert(vin.getScriptSigHex() == "5102aabb")
+    assert(txn.getTxnId() != txid)
+    fresh = btc.txn.txn()
+    fresh.deserialize(txn.serialize())
+    assert(fresh.getInputs()[0].getScriptSigHex() == "5102aabb")
+    assert(fresh.getTxnId() == txn.getTxnId())
+
+
+# The signature scripts of many inputs can be parsed at once, 
+# with the same result as parsing them one by one
+def test_tc48():
+    s = "01000000017f328ae9b46c631d38a7efb88ec0214519341cd5c0ed250fc88d20b47aa5f9c0010000006b483045022100843d0108b411452da23ce8b9041368300f11a042716a9ae8f3aaa2e5fe39654c022079864ef33971a7cef3aef4658c1d2dec5a5e27b5e7e41c5722fc192dd84472da0121029353adf8364a7fe132ba88267b163fc1e55773a99b06d2ae0a18ee706d73db3affffffff02404b4c00000000001976a9148bdeb16c87bd9f5ffeb24879cb2d61cfc60d5b3488ac4c842a13000000001976a914ff4a0e280823418752a883e0ba7ae8cbec46606a88ac00000000"
+    txn = btc.txn.txn()
+    txn.deserialize(s)
+    expected = txn.getInputs()[0].getScriptSig()
+    txn.deserialize(s)
+    txn.addInput(btc.txn.txin(prevTxid = 64*"1", vout = 1))
+    txn.getInputs()[1].scriptSigHex = "51"
+    txn.addInput(btc.txn.txin(prevTxid = 64*"1", vout = 2))
+    inputs = txn.getInputs()
+    btc.txn.txin.parseScriptSigs(inputs)
+    scriptSig = inputs[0]._scriptSig
+    assert(scriptSig.getScriptType() == btc.script.SCRIPTTYPE_P2PKH)
+    assert(scriptSig.owner is inputs[0])
+    assert(scriptSig.getSignatureR() == expected.getSignatureR())
+    assert(scriptSig.getSignatureS() == expected.getSignatureS())
+    assert(scriptSig.getPubKeyHex() == expected.getPubKeyHex())
+    assert(inputs[1]._scriptSig.getScriptType() == btc.script.SCRIPTTYPE_OTHER)
+    assert(inputs[1]._scriptSig.serialize() == "51")
+    assert(inputs[2]._scriptSig == None)
+    assert(inputs[0].getScriptSig() is scriptSig)
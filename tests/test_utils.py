@@ -89,3 +89,70 @@ def test_tc11():
     #
     m = btc.serialize.serializeString(m, len(m))
     assert(block.getBlockHeader().getMerkleRoot() == m)
+
+
+#
+# Decode and encode DER signatures
+#
+def test_tc12():
+    s = "3045022100843d0108b411452da23ce8b9041368300f11a042716a9ae8f3aaa2e5fe39654c022079864ef33971a7cef3aef4658c1d2dec5a5e27b5e7e41c5722fc192dd84472da01"
+    r, _s, hashType = btc.utils.decodeDERSignature(s)
+    assert(r == 0x843d0108b411452da23ce8b9041368300f11a042716a9ae8f3aaa2e5fe39654c)
+    assert(_s == 0x79864ef33971a7cef3aef4658c1d2dec5a5e27b5e7e41c5722fc192dd84472da)
+    assert(hashType == 1)
+    assert(btc.utils.encodeDERSignature(r, _s, hashType).hex() == s)
+    assert(btc.utils.decodeDERSignature(bytes.fromhex(s)) == (r, _s, hashType))
+    for r, _s in [(1, 1), (0x7f, 0x80), (0, 2**255), (2**256 - 1, 12345)]:
+        assert(btc.utils.decodeDERSignature(btc.utils.encodeDERSignature(r, _s, 1)) == (r, _s, 1))
+    assert(btc.utils.isValidDERSignature(btc.utils.encodeDERSignature(5, 7, 1)))
+
+
+#
+# Signatures which are not strictly DER encoded (BIP66)
+#
+def test_tc13():
+    valid = "3045022100843d0108b411452da23ce8b9041368300f11a042716a9ae8f3aaa2e5fe39654c022079864ef33971a7cef3aef4658c1d2dec5a5e27b5e7e41c5722fc192dd84472da01"
+    invalid = [
+        # wrong type code for the sequence
+        "31" + valid[2:],
+        # wrong total length
+        "3046" + valid[4:],
+        # trailing byte
+        valid + "01",
+        # negative R
+        "3006020180020101" + "01",
+        # R with unnecessary leading zero
+        "300702020001020101" + "01",
+        # S with unnecessary leading zero
+        "300702010102020001" + "01",
+        # negative S
+        "3006020101020181" + "01",
+        # R of length zero
+        "3006020002020101" + "01",
+        # S of length zero
+        "300602020100020001",
+        # wrong type code for S
+        "3006020101030101" + "01",
+        # too short
+        "3006020101020101",
+        ""]
+    for sig in invalid:
+        assert(btc.utils.decodeDERSignature(sig) == None)
+        assert(not btc.utils.isValidDERSignature(sig))
+    assert(btc.utils.isValidDERSignature("3006020101020101" + "01"))
+    #
+    # Batch validation. The signatures are decoded where they 
+    # are, here at different offsets of one buffer
+    #
+    sigs = [bytes.fromhex(valid)] + [bytes.fromhex(sig) for sig in invalid] + [bytes.fromhex(valid)]
+    buffer = b''.join(bytes([len(sig)]) + sig for sig in sigs)
+    spans = []
+    start = 0
+    for sig in sigs:
+        spans.append((memoryview(buffer), start + 1, len(sig)))
+        start += 1 + len(sig)
+    assert(btc.utils.validateDERSignatures(spans) == [True] + [False]*len(invalid) + [True])
+    decoded = btc.utils.decodeDERSignatures(spans)
+    assert(decoded[0] == decoded[-1] == btc.utils.decodeDERSignature(valid))
+    assert(btc.utils.decodeDERSignatures([(sig, 0, len(sig)) for sig in sigs]) == decoded)
+    assert(btc.utils.decodeDERSignatures([]) == [])
@@ -0,0 +1,167 @@
+import btc.verify
+import btc.pool
+import btc.script
+import btc.txn
+import btc.block
+import btc.mining
+
+import concurrent.futures
+import time
+
+
+PUBKEYS = ["0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798",
+           "02c6047f9441ed7d6d3045406e95c07cd85c778e4b8cef3ca7abac09b95c709ee5",
+           "02f9308a019258c31049344f85f89d5229b531c845836f99b08601f113bce036f9"]
+
+PREV_TXID = "13619b505d99bc5ee353a8e4a707164d54320134ccdb0795d89f5002e32e63a3"
+
+#
+# Create a signed transaction spending the outputs
+# 0, 1 and 2 of PREV_TXID which belong to the private 
+# keys 1, 2 and 3. Returns the transaction and the spent
+# outputs. As signatures are deterministic, we clear the 
+# signature cache so that the tests do not depend on each other
+#
+def createSignedTxn():
+    btc.script.resetSignatureCache()
+    txn = btc.txn.txn()
+    txos = []
+    for i in range(3):
+        txn.addInput(btc.txn.txin(prevTxid = PREV_TXID, vout = i))
+        txos.append(btc.txn.txout(value = 100000, 
+                                  scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2PK, 
+                                                                         pubKeyHex = PUBKEYS[i])))
+    txn.addOutput(btc.txn.txout(value = 250000, scriptPubKey = txos[0].getScriptPubKey()))
+    btc.script.signTransaction(txn, txos, [1, 2, 3])
+    return txn, txos
+
+
+#
+# Verify a transaction in the calling process
+#
+def test_tc1():
+    txn, txos = createSignedTxn()
+    assert(btc.verify.verifyTransaction(txn, txos, workers = 1) == [True, True, True])
+    #
+    # Swap two spent outputs. We stop at the first failure
+    #
+    txos[0], txos[1] = txos[1], txos[0]
+    assert(btc.verify.verifyTransaction(txn, txos, workers = 1) == [False, None, None])
+    #
+    # A missing output is rejected without any signature check
+    #
+    assert(btc.verify.verifyTransaction(txn, [None] + txos[1:], workers = 1) == [False, None, None])
+
+
+#
+# Verify a transaction using a process pool
+#
+def test_tc2():
+    txn, txos = createSignedTxn()
+    assert(btc.verify.verifyTransaction(txn, txos, workers = 2) == [True, True, True])
+    with concurrent.futures.ProcessPoolExecutor(max_workers = 2) as executor:
+        assert(btc.verify.verifyTransaction(txn, txos, executor = executor) == [True, True, True])
+        txos[2] = txos[0]
+        results = btc.verify.verifyTransaction(txn, txos, executor = executor)
+        assert(False in results)
+        assert(results == [True, True, False])
+
+
+#
+# Verify a block. The second transaction spends an
+# output of the first one
+#
+def test_tc3():
+    txn, txos = createSignedTxn()
+    spending = btc.txn.txn()
+    spending.addInput(btc.txn.txin(prevTxid = txn.getTxnId(), vout = 0))
+    spending.addOutput(btc.txn.txout(value = 240000, scriptPubKey = txos[1].getScriptPubKey()))
+    btc.script.signTransaction(spending, [txn.getOutputs()[0]], [1])
+    block = btc.mining.createNewBlock(address = "mhjfPZW5gTHetzzmSwpEqhvZC9TZ1sCAdu", 
+                                    currentLastBlockHash = "40fd433db35e43c9997e702fb0f11bbe171712675651e03461fabb98fbc29598", 
+                                    currentHeight = 109, 
+                                    coinbasevalue = 50*10**8, 
+                                    bits = int("207fffff",16), tx = [txn, spending],
+                                    mintime = int(time.time()))
+    utxoView = {}
+    for i in range(3):
+        utxoView[(PREV_TXID, i)] = txos[i]
+    assert(btc.verify.verifyBlock(block, utxoView, workers = 1) == [[], [True, True, True], [True]])
+    assert(btc.verify.verifyBlock(block, utxoView, workers = 2) == [[], [True, True, True], [True]])
+    #
+    # Without the spent outputs, the block is invalid
+    #
+    del utxoView[(PREV_TXID, 1)]
+    assert(btc.verify.verifyBlock(block, utxoView, workers = 1) == [[], [True, False, None], [None]])
+
+
+#
+# Public keys which are not on the curve are rejected 
+#
+def test_tc4():
+    txn, txos = createSignedTxn()
+    txos[1] = btc.txn.txout(value = 100000, 
+                            scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2PK, 
+                                                                   pubKeyHex = "02" + "00"*31 + "05"))
+    assert(btc.verify.verifyTransaction(txn, txos, workers = 1) == [True, False, None])
+    assert(not btc.script.verifySignature(txn, 1, txos[1]))
+
+
+#
+# Signatures that have been verified with verifyTransaction
+# are taken from the cache when the block is verified
+#
+def test_tc5():
+    btc.script.resetSignatureCache()
+    txn, txos = createSignedTxn()
+    block = btc.mining.createNewBlock(address = "mhjfPZW5gTHetzzmSwpEqhvZC9TZ1sCAdu", 
+                                    currentLastBlockHash = "40fd433db35e43c9997e702fb0f11bbe171712675651e03461fabb98fbc29598", 
+                                    currentHeight = 109, 
+                                    coinbasevalue = 50*10**8, 
+                                    bits = int("207fffff",16), tx = [txn],
+                                    mintime = int(time.time()))
+    utxoView = {}
+    for i in range(3):
+        utxoView[(PREV_TXID, i)] = txos[i]
+    assert(btc.verify.verifyBlock(block, utxoView, workers = 1) == [[], [True, True, True]])
+    assert(len(btc.script.SIGNATURE_CACHE) == 0)
+    assert(btc.verify.verifyTransaction(txn, txos, workers = 1) == [True, True, True])
+    assert(len(btc.script.SIGNATURE_CACHE) == 3)
+    hits = btc.script.SIGNATURE_CACHE.hits
+    assert(btc.verify.verifyBlock(block, utxoView, workers = 2) == [[], [True, True, True]])
+    assert(btc.script.SIGNATURE_CACHE.hits == hits + 3)
+    #
+    # A different spent output gives a different signature hash
+    # which is not in the cache
+    #
+    txos[1] = txos[0]
+    assert(btc.verify.verifyTransaction(txn, txos, workers = 1) == [True, False, None])
+    btc.script.resetSignatureCache()
+
+
+#
+# Transactions with many inputs are verified by the pool of the
+# module, which is kept across calls. All inputs before an invalid
+# input are verified, the results after it are None
+#
+def test_tc6():
+    btc.script.resetSignatureCache()
+    n = 2*btc.verify.PARALLEL_THRESHOLD
+    txn = btc.txn.txn()
+    txos = []
+    pubKeys = btc.script.publicKeys(list(range(1, n + 1)))
+    for i in range(n):
+        txn.addInput(btc.txn.txin(prevTxid = PREV_TXID, vout = i))
+        txos.append(btc.txn.txout(value = 1000, 
+                                  scriptPubKey = btc.script.scriptPubKey(scriptType = btc.script.SCRIPTTYPE_P2PK, 
+                                                                         pubKeyHex = pubKeys[i])))
+    txn.addOutput(btc.txn.txout(value = 1000, scriptPubKey = txos[0].getScriptPubKey()))
+    btc.script.signTransaction(txn, txos, list(range(1, n + 1)))
+    assert(btc.verify.verifyTransaction(txn, txos, workers = 2) == [True]*n)
+    pool = btc.pool.POOL
+    assert(pool != None)
+    btc.script.resetSignatureCache()
+    txos[n - 3] = txos[0]
+    assert(btc.verify.verifyTransaction(txn, txos, workers = 2) == [True]*(n - 3) + [False, None, None])
+    assert(btc.pool.POOL is pool)
+    btc.script.resetSignatureCache()